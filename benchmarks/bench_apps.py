@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Benchmark the applications against a synthetic building dataset.
+
+Usage: python benchmarks/bench_apps.py [options] [APPLICATION ...]
+
+A dataset of DAYS (default 365) days of readings every INTERVAL
+(default 15) minutes is generated in a test database, with a sensor of
+each type required by the applications. Every registered application,
+or each APPLICATION given, is then run with AppWrapper in a child
+process and timed in the stages recorded by openeis.projects.metrics
+(query, merge, execute and output), along with:
+
+    dataset   writing the readings and their rollups (once)
+    total     the whole run, with the input readings as its rows
+
+For each stage the wall time, database queries and rows per second are
+recorded, along with the peak RSS of the process. Results
+are written as JSON to --output and, with --baseline, compared with a
+previous result file; regressions beyond --tolerance are reported and
+make the exit status non-zero.
+'''
+
+import argparse
+import configparser
+import contextlib
+from datetime import datetime, timedelta
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'openeis.server.settings')
+
+from django.db import connection, connections
+from django.utils.timezone import utc
+import numpy as np
+
+
+BUILDING = 'Bench'
+
+DEFINITIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'openeis', 'projects', 'static', 'projects', 'json',
+    'general_definition.json')
+
+# Unit and (base, amplitude) of generated values for each unit type.
+UNITS = {
+    'temperature': ('fahrenheit', (65.0, 15.0)),
+    'power': ('kilowatt', (150.0, 100.0)),
+    'energy': ('kilowatt_hour', (40.0, 25.0)),
+    'pressure': ('inches_of_water', (1.5, 0.5)),
+    'dimensionless': ('percent', (50.0, 40.0)),
+    'tariff': ('dollars_per_kwh', (0.1, 0.02)),
+    'unitless': ('status', (0.5, 0.5)),
+}
+
+# Values of required parameters without defaults; dates are filled in
+# from the dataset.
+PARAMETERS = {
+    'building_sq_ft': 50000.0,
+    'building_area': 50000.0,
+    'electricity_cost': 0.1,
+    'operating_hours': '8,17',
+    'operating_days': '1,2,3,4,5',
+}
+FIRST_HALF = {'pre_start', 'baseline_startdate'}
+MIDDLE = {'pre_end', 'baseline_stopdate', 'post_start', 'savings_startdate'}
+SECOND_HALF = {'post_end', 'savings_stopdate'}
+
+
+def peak_rss():
+    '''Return the peak resident set size of the process in bytes.'''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def make_wrapper(metrics):
+    from openeis.applications.utest_applications.appwrapper import AppWrapper
+    from openeis.projects.metrics import instrument
+
+    class BenchmarkWrapper(AppWrapper):
+        def _make_app(self, klass, db_input, output, kwargs):
+            app = super()._make_app(klass, db_input, output, kwargs)
+            instrument(metrics, db_input, output, app)
+            return app
+
+    return BenchmarkWrapper()
+
+
+def required_sensors(applications):
+    '''Return the sensor types, with counts, required by applications.'''
+    counts = {}
+    for klass in applications.values():
+        for descriptor in klass.required_input().values():
+            count = max(descriptor.count_min or 1, 1)
+            counts[descriptor.sensor_type] = max(
+                    counts.get(descriptor.sensor_type, 0), count)
+    return counts
+
+
+def topic(sensor_type, index):
+    return '{}/{}{}'.format(BUILDING, sensor_type, index or '')
+
+
+def make_dataset(applications, days, interval, seed=0):
+    from openeis.projects import models
+    from openeis.projects.storage.rollups import RollupBuilder
+    with open(DEFINITIONS) as file:
+        definitions = json.load(file)['sensors']
+    rand = np.random.RandomState(seed)
+    user = models.User.objects.create(username='bench')
+    project = models.Project.objects.create(owner=user, name='Benchmark')
+    sensors = {BUILDING: {'level': 'building',
+                          'attributes': {'timezone': 'US/Pacific'}}}
+    kinds = {}
+    for sensor_type, count in sorted(required_sensors(applications).items()):
+        definition = definitions.get(sensor_type, {})
+        unit, shape = UNITS.get(definition.get('unit_type'),
+                                UNITS['dimensionless'])
+        data_type = definition.get('data_type', 'float')
+        for i in range(count):
+            sensors[topic(sensor_type, i)] = {'type': sensor_type,
+                                              'unit': unit}
+            kinds[topic(sensor_type, i)] = data_type, shape
+    datamap = models.DataMap.objects.create(
+        project=project, name='Benchmark',
+        map={'version': 1, 'files': {}, 'sensors': sensors})
+    dataset = models.SensorIngest.objects.create(
+        project=project, name='Benchmark', map=datamap)
+    start = datetime(2014, 1, 1, 8, tzinfo=utc)
+    steps = days * 1440 // interval
+    times = [start + timedelta(minutes=interval * i) for i in range(steps)]
+    hours = np.arange(steps) * interval / 60.0
+    local_hours = (hours - 8) % 24
+    occupied = ((local_hours >= 8) & (local_hours < 18) &
+                ((hours - 8) // 24 % 7 < 5))
+    daily = np.sin((local_hours - 9) / 24 * 2 * np.pi)
+    seasonal = np.cos(hours / (24 * 365) * 2 * np.pi)
+    rollups = RollupBuilder(models.SensorRollup, dataset)
+    rows = 0
+    for name, (data_type, (base, amplitude)) in sorted(kinds.items()):
+        if data_type == 'boolean':
+            values = (occupied ^ (rand.rand(steps) < 0.02)).tolist()
+            sensor_type, cls = models.Sensor.BOOLEAN, models.BooleanSensorData
+        else:
+            values = (base + amplitude * (0.4 * daily - 0.3 * seasonal +
+                                          0.3 * occupied) +
+                      rand.normal(0, amplitude * 0.05, steps))
+            if data_type == 'integer':
+                values = values.round().astype(int)
+                sensor_type, cls = (models.Sensor.INTEGER,
+                                    models.IntegerSensorData)
+            else:
+                sensor_type, cls = models.Sensor.FLOAT, models.FloatSensorData
+            values = values.tolist()
+        sensor = models.Sensor.objects.create(
+                map=datamap, name=name, data_type=sensor_type)
+        cls.objects.bulk_create(
+            [cls(sensor=sensor, ingest=dataset, time=stamp, value=value)
+             for stamp, value in zip(times, values)], batch_size=300)
+        for stamp, value in zip(times, values):
+            rollups.add(sensor, stamp, value)
+        rows += steps
+    rollups.close()
+    return dataset, times[0], times[-1], rows
+
+
+def configure(name, klass, dataset, first, last):
+    config = configparser.ConfigParser()
+    config['global_settings'] = {'application': name,
+                                 'dataset_id': str(dataset.id)}
+    config['inputs'] = {
+        group: ' '.join(topic(descriptor.sensor_type, i)
+                        for i in range(max(descriptor.count_min or 1, 1)))
+        for group, descriptor in klass.required_input().items()}
+    middle = first + (last - first) / 2
+    dates = dict.fromkeys(FIRST_HALF, first)
+    dates.update(dict.fromkeys(MIDDLE, middle))
+    dates.update(dict.fromkeys(SECOND_HALF, last))
+    parameters = {}
+    for name, descriptor in klass.get_config_parameters().items():
+        if name in PARAMETERS:
+            value = PARAMETERS[name]
+        elif name in dates:
+            value = dates[name].date().isoformat()
+        elif descriptor.value_default is not None:
+            value = descriptor.value_default
+        elif descriptor.value_list:
+            value = descriptor.value_list[0]
+        elif descriptor.optional:
+            continue
+        elif descriptor.value_min is not None:
+            value = descriptor.value_min
+        else:
+            value = descriptor.config_type()
+        parameters[name] = repr(value)
+    config['application_config'] = parameters
+    return config
+
+
+def input_rows(config, dataset):
+    from openeis.projects import models
+    topics = ' '.join(config['inputs'].values()).split()
+    return sum(models.Sensor.objects.get(map=dataset.map, name=name)
+               .data.filter(ingest=dataset).count() for name in set(topics))
+
+
+def run(name, klass, dataset, first, last):
+    '''Run an application, returning its results.'''
+    from openeis.projects.metrics import Metrics
+    metrics = Metrics()
+    config = configure(name, klass, dataset, first, last)
+    rows = input_rows(config, dataset)
+    wrapper = make_wrapper(metrics)
+    result = {'status': 'ok', 'input_rows': rows}
+    try:
+        with metrics.stage('total', rows), \
+                contextlib.redirect_stdout(io.StringIO()):
+            wrapper.run_application(config)
+    except Exception as e:
+        result.update(status='error', error=''.join(
+                traceback.format_exception_only(type(e), e)).strip())
+    metrics.close()
+    result.update(metrics.as_dict())
+    result['peak_rss'] = peak_rss()
+    return result
+
+
+def run_isolated(name, klass, dataset, first, last):
+    '''Run an application in a child process so peak RSS is its own.'''
+    if not hasattr(os, 'fork'):
+        return run(name, klass, dataset, first, last)
+    # Connections must not be shared with the child; both sides
+    # reconnect when next used.
+    for conn in connections.all():
+        conn.close()
+    read, write = os.pipe()
+    pid = os.fork()
+    if not pid:
+        os.close(read)
+        try:
+            data = json.dumps(run(name, klass, dataset, first, last))
+        except BaseException as e:
+            data = json.dumps({'status': 'error', 'error': repr(e)})
+        with os.fdopen(write, 'w') as file:
+            file.write(data)
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as file:
+        data = file.read()
+    os.waitpid(pid, 0)
+    return json.loads(data) if data else {'status': 'error',
+                                          'error': 'child process died'}
+
+
+def compare(results, baseline, tolerance):
+    '''Print a comparison with baseline, returning the regressions.'''
+    regressions = []
+    print('{:<40} {:>10} {:>10} {:>8}'.format(
+          'application/stage', 'baseline', 'seconds', 'ratio'))
+    for name, result in sorted(results['applications'].items()):
+        before = baseline.get('applications', {}).get(name)
+        if not before or result['status'] != 'ok':
+            continue
+        for stage, stats in sorted(result['stages'].items()):
+            old = before.get('stages', {}).get(stage)
+            if not old or not old['seconds']:
+                continue
+            ratio = stats['seconds'] / old['seconds']
+            flag = ''
+            if ratio > 1 + tolerance:
+                regressions.append((name, stage, ratio))
+                flag = ' !'
+            print('{:<40} {:>10.3f} {:>10.3f} {:>7.2f}x{}'.format(
+                  name + '/' + stage, old['seconds'], stats['seconds'],
+                  ratio, flag))
+    return regressions
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+            prog=os.path.basename(argv[0]),
+            description='Benchmark the applications against a synthetic '
+                        'dataset.')
+    parser.add_argument('applications', nargs='*', metavar='APPLICATION')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--interval', type=int, default=15,
+                        help='minutes between readings')
+    parser.add_argument('--output', default='bench_apps.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed fractional slowdown of a stage')
+    args = parser.parse_args(argv[1:])
+
+    from openeis.applications import _applicationDict as registry
+    names = args.applications or sorted(registry)
+    classes = {name: registry[name] for name in names if name in registry}
+
+    from openeis.projects.metrics import Metrics
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        metrics = Metrics()
+        with metrics.stage('dataset') as stats:
+            dataset, first, last, stats['rows'] = make_dataset(
+                    classes, args.days, args.interval)
+        metrics.close()
+        results = {
+            'created': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'backend': connection.vendor,
+            'days': args.days, 'interval': args.interval,
+            'dataset': metrics.as_dict()['stages']['dataset'],
+            'applications': {},
+        }
+        print('{} days every {} minutes, {} readings, {} backend'.format(
+              args.days, args.interval, stats['rows'], connection.vendor))
+        print('{:<32} {:>6} {:>10} {:>8} {:>12} {:>8}'.format(
+              'application', 'status', 'seconds', 'queries', 'rows/sec',
+              'MB'))
+        for name in names:
+            if name not in classes:
+                results['applications'][name] = {
+                        'status': 'error', 'error': 'not found'}
+                continue
+            result = run_isolated(name, classes[name], dataset, first, last)
+            results['applications'][name] = result
+            total = result.get('stages', {}).get('total', {})
+            print('{:<32} {:>6} {:>10.2f} {:>8} {:>12.0f} {:>8.0f}'.format(
+                  name, result['status'], total.get('seconds', 0.0),
+                  total.get('queries', 0),
+                  total.get('rows_per_second') or 0.0,
+                  result.get('peak_rss', 0) / 1024 / 1024))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('{} stage(s) slower than the baseline by more than '
+                  '{:.0%}'.format(len(regressions), args.tolerance))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
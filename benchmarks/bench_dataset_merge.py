@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Benchmark SensorIngest.merge with and without the single query path.
+
+Usage: python benchmarks/bench_dataset_merge.py [SENSORS [ROWS]]
+
+A synthetic dataset of SENSORS (default 300) float sensors with ROWS
+(default 1000) hourly readings each is created in a test database. One
+in ten readings is removed at random so that partial rows occur. The
+full merge (download) and the first rows (head) are timed for both
+merge paths.
+'''
+
+from datetime import datetime, timedelta
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'openeis.server.settings')
+
+from django.db import connection
+from django.utils.timezone import utc
+
+
+def make_dataset(sensor_count, rows, seed=0):
+    from openeis.projects import models
+    rand = random.Random(seed)
+    user = models.User.objects.create(username='bench')
+    project = models.Project.objects.create(owner=user, name='Benchmark')
+    names = ['Bench/Sensor{:03}'.format(i) for i in range(sensor_count)]
+    datamap = models.DataMap.objects.create(
+        project=project, name='Benchmark',
+        map={'version': 1, 'files': {},
+             'sensors': {name: {'type': 'OutdoorAirTemperature',
+                                'unit': 'fahrenheit'} for name in names}})
+    dataset = models.SensorIngest.objects.create(
+        project=project, name='Benchmark', map=datamap)
+    start = datetime(2014, 1, 1, tzinfo=utc)
+    for name in names:
+        sensor = models.Sensor.objects.create(
+            map=datamap, name=name, data_type=models.Sensor.FLOAT)
+        models.FloatSensorData.objects.bulk_create(
+            [models.FloatSensorData(sensor=sensor, ingest=dataset,
+                                    time=start + timedelta(hours=i),
+                                    value=rand.random())
+             for i in range(rows) if rand.random() < 0.9],
+            batch_size=300)
+    return dataset
+
+
+def timeit(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main(argv=sys.argv):
+    sensor_count = int(argv[1]) if len(argv) > 1 else 300
+    rows = int(argv[2]) if len(argv) > 2 else 1000
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        dataset = make_dataset(sensor_count, rows)
+        print('{} sensors, {} rows, {} backend'.format(
+              sensor_count, rows, connection.vendor))
+        print('{:>10} {:>10} {:>10} {:>8}'.format(
+              'operation', 'python', 'sql', 'speedup'))
+        for operation, func in [
+                ('download', lambda **kw: list(dataset.merge(**kw))),
+                ('head', lambda **kw: [row for row, _ in
+                                       zip(dataset.merge(**kw), range(16))])]:
+            before, expected = timeit(lambda: func(use_sql=False))
+            after, result = timeit(lambda: func(use_sql=True))
+            assert result == expected
+            print('{:>10} {:>10.3f} {:>10.3f} {:>7.1f}x'.format(
+                  operation, before, after, before / after))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Benchmark serial and parallel parsing of a multi-file dataset.
+
+Usage: python benchmarks/bench_ingest.py [MEGABYTES [FILES [PROCESSES]]]
+
+A synthetic dataset totalling MEGABYTES (default 1024) is written to a
+temporary directory as FILES (default 12) CSV files, each with a
+timestamp and ten float columns. The files are parsed with
+ingest_files(), cell by cell and in blocks, and with
+ingest_files_parallel() using PROCESSES (default: the number of CPUs)
+processes, and the rows and the sum of the parsed values are checked
+to match.
+'''
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openeis.projects.storage.ingest import ingest_files, ingest_files_parallel
+
+
+COLUMNS = 10
+
+
+def make_files(directory, size, count, seed=0):
+    rand = random.Random(seed)
+    datamap = {'version': 1, 'files': {}, 'sensors': {}}
+    headers = ['Date'] + ['Sensor{}'.format(i) for i in range(COLUMNS)]
+    paths = {}
+    for i in range(count):
+        name = str(i)
+        datamap['files'][name] = {
+            'signature': {'headers': headers},
+            'timestamp': {'columns': ['Date'], 'format': '%Y-%m-%d %H:%M'},
+        }
+        for header in headers[1:]:
+            datamap['sensors']['File{}/{}'.format(i, header)] = {
+                'type': 'WholeBuildingPower', 'unit': 'kilowatt',
+                'file': name, 'column': header}
+        path = paths[name] = os.path.join(directory, name + '.csv')
+        with open(path, 'w') as file:
+            file.write(','.join(headers) + '\n')
+            minute = 0
+            while file.tell() < size // count:
+                lines = []
+                for j in range(1000):
+                    day, rest = divmod(minute, 1440)
+                    lines.append('2014-{:02}-{:02} {:02}:{:02},'.format(
+                        day // 28 % 12 + 1, day % 28 + 1, *divmod(rest, 60)) +
+                        ','.join('{:.2f}'.format(rand.uniform(0, 1000))
+                                 for k in range(COLUMNS)))
+                    minute += 1
+                file.write('\n'.join(lines) + '\n')
+    return datamap, paths
+
+
+def parse(func, datamap, paths, **kwargs):
+    files = {name: {'file': open(path, 'rb'), 'time_zone': None,
+                    'time_offset': 0} for name, path in paths.items()}
+    rows, total = 0, 0.0
+    start = time.perf_counter()
+    try:
+        for file in func(datamap, files, **kwargs):
+            for row in file.rows:
+                rows += 1
+                total += sum(row.columns[1:])
+        return time.perf_counter() - start, rows, total
+    finally:
+        for file_dict in files.values():
+            file_dict['file'].close()
+
+
+def main(argv=sys.argv):
+    size = int(argv[1]) if len(argv) > 1 else 1024
+    count = int(argv[2]) if len(argv) > 2 else 12
+    processes = int(argv[3]) if len(argv) > 3 else os.cpu_count()
+    with tempfile.TemporaryDirectory() as directory:
+        datamap, paths = make_files(directory, size * 1024 * 1024, count)
+        results = [
+            ('serial', parse(ingest_files, datamap, paths)),
+            ('blocks', parse(ingest_files, datamap, paths, block_size=1000)),
+            ('x{}'.format(processes), parse(
+                ingest_files_parallel, datamap, paths, processes=processes,
+                block_size=1000)),
+        ]
+    _, (serial, rows, total) = results[0]
+    print('{} MB in {} files, {} rows'.format(size, count, rows))
+    print('{:>10} {:>10} {:>12} {:>8}'.format(
+          'mode', 'seconds', 'rows/sec', 'speedup'))
+    for mode, (seconds, mode_rows, mode_total) in results:
+        assert (rows, round(total, 2)) == (mode_rows, round(mode_total, 2))
+        print('{:>10} {:>10.1f} {:>12.0f} {:>7.1f}x'.format(
+              mode, seconds, rows / seconds, serial / seconds))
+
+
+if __name__ == '__main__':
+    main()
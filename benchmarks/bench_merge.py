@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Benchmark DatabaseInput merge modes against the original per-row scans.
+
+Usage: python benchmarks/bench_merge.py [ROWS]
+
+Streams hold ROWS (default 20000) one-minute samples each, with roughly
+one in a thousand samples removed at random so that partial rows occur.
+The output of each merge is checked against the original before timing.
+'''
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openeis.projects.storage import merge
+
+
+MAX_DATE = datetime.max - timedelta(days=5)
+
+
+def original_no_drop(*args):
+    '''The original merge_no_drop() which rescans all heads per row.'''
+    managed_query_sets = []
+    for arg in args:
+        for group, query_set_list in arg.items():
+            for query_set in query_set_list:
+                managed_query_sets.append((group, iter(query_set)))
+    current = [next(x[1]) for x in managed_query_sets]
+    oldest = min(current, key=lambda x: x[0])[0]
+    while True:
+        result = defaultdict(list)
+        result['time'] = oldest
+        for value, query in zip(current, managed_query_sets):
+            if value[0] == oldest:
+                result[query[0]].append(value[1])
+            else:
+                result[query[0]].append(None)
+        yield result
+        new_current = []
+        for value, query in zip(current, managed_query_sets):
+            if value[0] != oldest:
+                new_current.append(value)
+            else:
+                new_current.append(next(query[1], (MAX_DATE, None)))
+        current = new_current
+        oldest = min(current, key=lambda x: x[0])[0]
+        if oldest == MAX_DATE:
+            break
+
+
+def original_drop(*args):
+    '''The original merge_drop() which rescans all heads per row.'''
+    managed_query_sets = []
+    for arg in args:
+        for group, query_set_list in arg.items():
+            for query_set in query_set_list:
+                managed_query_sets.append((group, iter(query_set)))
+    current = [next(x[1]) for x in managed_query_sets]
+    newest = max(current, key=lambda x: x[0])[0]
+    while True:
+        if all(x[0] == newest for x in current):
+            result = defaultdict(list)
+            result['time'] = newest
+            for value, query in zip(current, managed_query_sets):
+                result[query[0]].append(value[1])
+            yield result
+            try:
+                current = [next(x[1]) for x in managed_query_sets]
+            except StopIteration:
+                return
+        else:
+            new_current = []
+            for value, query in zip(current, managed_query_sets):
+                if value[0] == newest:
+                    new_current.append(value)
+                else:
+                    try:
+                        new_current.append(next(query[1]))
+                    except StopIteration:
+                        return
+            current = new_current
+        newest = max(current, key=lambda x: x[0])[0]
+
+
+def make_streams(count, rows, seed=0):
+    rand = random.Random(seed)
+    start = datetime(2014, 1, 1)
+    return [[(start + timedelta(minutes=i), rand.random())
+             for i in range(rows) if rand.random() < 0.999]
+            for _ in range(count)]
+
+
+def timeit(func, args):
+    start = time.perf_counter()
+    count = sum(1 for _ in func(*args))
+    return time.perf_counter() - start, count
+
+
+def main(argv=sys.argv):
+    rows = int(argv[1]) if len(argv) > 1 else 20000
+    modes = [('no_drop', original_no_drop, merge.merge_no_drop),
+             ('drop', original_drop, merge.merge_drop)]
+    print('{:>8} {:>8} {:>10} {:>10} {:>8} {:>8}'.format(
+          'streams', 'mode', 'original', 'merge', 'speedup', 'rows'))
+    for count in [2, 20, 200]:
+        streams = make_streams(count, rows)
+        args = [{'a': streams[:count // 2]}, {'b': streams[count // 2:]}]
+        for mode, original, func in modes:
+            assert ([list(row.items()) for row in original(*args)] ==
+                    [list(row.items()) for row in func(*args)])
+            before, total = timeit(original, args)
+            after, _ = timeit(func, args)
+            print('{:>8} {:>8} {:>10.3f} {:>10.3f} {:>7.1f}x {:>8}'.format(
+                  count, mode, before, after, before / after, total))
+        after, _ = timeit(merge.merge_fill, args)
+        print('{:>8} {:>8} {:>10} {:>10.3f}'.format(count, 'fill', '', after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Benchmark Spearman ranking against the original loop-based ranking.
+
+Usage: python benchmarks/bench_spearman.py [ROWS] [COLUMNS]
+
+Series hold ROWS (default 100000) values with many ties.  Single-series
+ranking is timed against the original loop, and ranking COLUMNS
+(default 200) series of ROWS // 100 values at once with rankColumns()
+is timed against ranking them one at a time.  Ranks are checked
+against the original before timing.
+'''
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openeis.applications.utils import spearman
+
+
+def original_rank(values):
+    '''The original _rankForSpearman() which assigns ranks in a loop.'''
+    valCt = len(values)
+    srtdToActIdx = np.argsort(values)
+    ranks = np.zeros(valCt)
+    lastVal = values[srtdToActIdx[0]]
+    startRunIdx = 0
+    currIdx = 1
+    while currIdx < valCt:
+        currVal = values[srtdToActIdx[currIdx]]
+        if currVal > lastVal:
+            meanRank = 0.5 * (startRunIdx + currIdx + 1)
+            while startRunIdx < currIdx:
+                ranks[srtdToActIdx[startRunIdx]] = meanRank
+                startRunIdx += 1
+            lastVal = currVal
+        currIdx += 1
+    meanRank = 0.5 * (startRunIdx + currIdx + 1)
+    while startRunIdx < currIdx:
+        ranks[srtdToActIdx[startRunIdx]] = meanRank
+        startRunIdx += 1
+    return ranks
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main(argv=sys.argv):
+    rows = int(argv[1]) if len(argv) > 1 else 100000
+    columns = int(argv[2]) if len(argv) > 2 else 200
+    rng = np.random.RandomState(0)
+    print('{:>10} {:>10} {:>10} {:>10} {:>8}'.format(
+          'case', 'size', 'original', 'new', 'speedup'))
+    # Rounded temperatures and loads, as in energy_signature.
+    for ties in [rows // 100, rows]:
+        values = np.round(rng.uniform(0, ties, size=rows))
+        assert np.array_equal(original_rank(values),
+                              spearman._rankForSpearman(values))
+        before = timeit(original_rank, values)
+        after = timeit(spearman._rankForSpearman, values)
+        print('{:>10} {:>10} {:>10.4f} {:>10.4f} {:>7.1f}x'.format(
+              'ties' if ties < rows else 'few ties', rows, before, after,
+              before / after))
+    values = np.round(rng.uniform(0, 50, size=(max(rows // 100, 2), columns)))
+    ranks = spearman.rankColumns(values)
+    for col in range(columns):
+        assert np.array_equal(ranks[:, col], original_rank(values[:, col]))
+    before = timeit(lambda: [original_rank(values[:, col])
+                             for col in range(columns)])
+    single = timeit(lambda: [spearman._rankForSpearman(values[:, col])
+                             for col in range(columns)])
+    after = timeit(spearman.rankColumns, values)
+    size = '{}x{}'.format(*values.shape)
+    print('{:>10} {:>10} {:>10.4f} {:>10.4f} {:>7.1f}x'.format(
+          'columns', size, before, after, before / after))
+    print('{:>10} {:>10} {:>10.4f} {:>10.4f} {:>7.1f}x'.format(
+          'per column', size, single, after, single / after))
+    coeffs = spearman.findSpearmanRanks(values, values[:, 0])
+    assert np.isclose(coeffs[0], 1.0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Benchmark the import time of manage.py and of a cold API worker.
+
+Usage: python benchmarks/bench_startup.py [RUNS]
+
+Each scenario is run RUNS (default 5) times in a fresh interpreter and
+the median wall time is reported:
+
+  manage     manage.py help, which loads the installed applications
+  worker     import the views and look up one application class
+  list       describe all applications for the API from a cold manifest
+  manifest   describe all applications from a warm manifest
+  eager      import every application, as was done at package import
+
+Requires Django and the application dependencies to be installed.
+'''
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETUP = '''
+import os, sys
+sys.path.insert(0, {root!r})
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'openeis.server._settings')
+'''.format(root=ROOT)
+
+DESCRIBE = SETUP + '''
+from openeis.projects import serializers, views
+from openeis.applications import _applicationDict as apps
+apps.describe(views.ApplicationViewSet._describe, cache={cache!r},
+              depends=[views.__file__, serializers.__file__])
+'''
+
+SCENARIOS = [
+    ('manage', SETUP + '''
+sys.argv = ['manage.py', 'help']
+from openeis.server.manage import main
+try:
+    main()
+except SystemExit:
+    pass
+'''),
+    ('worker', SETUP + '''
+from openeis.projects import views
+from openeis.applications import get_algorithm_class
+assert get_algorithm_class('heat_map')
+'''),
+    ('list', DESCRIBE),
+    ('manifest', DESCRIBE),
+    ('eager', SETUP + '''
+from openeis.projects import views
+from openeis.applications import _applicationDict as apps
+for name in apps:
+    apps[name]
+'''),
+]
+
+
+def run(code):
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, '-c', code],
+                          stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main(argv=sys.argv):
+    runs = int(argv[1]) if len(argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as directory:
+        cache = os.path.join(directory, 'applications.json')
+        for name, code in SCENARIOS:
+            times = []
+            for i in range(runs):
+                # The manifest is left warm by the list runs
+                if name == 'list' and os.path.exists(cache):
+                    os.remove(cache)
+                times.append(run(code.format(cache=cache)))
+            print('{:10} {:8.3f} s'.format(name, statistics.median(times)))
+
+if __name__ == '__main__':
+    main()
@@ -55,15 +55,19 @@
 
 from abc import ABCMeta,abstractmethod
 #from schema.schema import sensordata
+import importlib
+import json
 import logging
+import os
 import pkgutil
+import re
+import sys
+import tempfile
+import threading
 from collections import defaultdict
+from collections.abc import Mapping
 from datetime import datetime
 
-_applicationList = [name for _, name, _ in pkgutil.iter_modules(__path__)]
-
-_applicationDict = {}
-
 
 #make these available here so we don't have to fix all application just yet.
 from openeis.core.descriptors import (OutputDescriptor,
@@ -285,25 +289,181 @@ class Results:
     def insert_table_row(self, table, row):
         self.table_output[table].append(row)
 
-for applicationName in _applicationList:
+def _defines_application(filename):
+    '''Return True if the module source at filename defines Application.
+
+    The source is scanned for a top-level class definition, assignment or
+    import of the name, which is much faster than importing or parsing
+    it. Modules without source are assumed to define it.
+    '''
+    try:
+        with open(filename, encoding='utf-8') as file:
+            source = file.read()
+    except FileNotFoundError:
+        return True
+    except (OSError, UnicodeDecodeError) as e:
+        logging.error('Module {name} cannot be read. Reason: {ex}'.format(
+            name=filename, ex=e))
+        return False
+    return _APPLICATION_RE.search(source) is not None
+
+_APPLICATION_RE = re.compile(r'^(?:class\s+Application\b|Application\s*=|'
+                             r'(?:from\s+\S+\s+)?import\s.*\bApplication\b)',
+                             re.MULTILINE)
+
+
+class ApplicationRegistry(Mapping):
+    '''Map application names to classes, importing them on demand.
+
+    Application modules are found by scanning the sources of the package
+    modules, and each is imported the first time its class is looked
+    up. Modules which fail to import are logged and dropped.
+    '''
+
+    def __init__(self, package, path):
+        self._package = package
+        self._path = path
+        self._names = None
+        self._files = {}
+        self._classes = {}
+        self._lock = threading.RLock()
+
+    def _scan(self):
+        names = []
+        for finder, name, ispkg in pkgutil.iter_modules(self._path):
+            directory = getattr(finder, 'path', '')
+            filename = (os.path.join(directory, name, '__init__.py') if ispkg
+                        else os.path.join(directory, name + '.py'))
+            if _defines_application(filename):
+                names.append(name)
+                self._files[name] = filename
+        return sorted(names)
+
+    @property
+    def names(self):
+        '''Sorted list of the application names.'''
+        with self._lock:
+            if self._names is None:
+                self._names = self._scan()
+            return list(self._names)
+
+    def _load(self, name):
+        try:
+            module = importlib.import_module('.' + name, self._package)
+            klass = module.Application
+        except Exception as e:
+            logging.error('Module {name} cannot be imported. Reason: {ex}'.format(name=name, ex=e))
+            self._names.remove(name)
+            raise KeyError(name)
+
+        #Validation of Algorithm class
+
+        if not issubclass(klass, DriverApplicationBaseClass):
+            logging.warning('The implementation of {name} does not inherit from openeis.algorithm.DriverApplicationBaseClass.'.format(name=name))
+        return klass
+
+    def __getitem__(self, name):
+        try:
+            return self._classes[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self.names:
+                raise KeyError(name)
+            if name not in self._classes:
+                self._classes[name] = self._load(name)
+            return self._classes[name]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def describe(self, describe, cache=None, depends=(), version=None):
+        '''Return a dict mapping application names to describe(klass).
+
+        If cache is given, it is the path of a JSON manifest in which the
+        descriptions are saved with the modification time and size of
+        each application module and of the modules defining the classes
+        it inherits from. Descriptions of unchanged applications are
+        read from the manifest, so the applications are not imported.
+        The manifest is discarded if the version, such as that of
+        openeis, or any of the depends files, such as the module
+        defining describe, have changed.
+        '''
+        key = [version] + [_file_stamp(path) for path in depends]
+        manifest = {}
+        if cache:
+            try:
+                with open(cache) as file:
+                    saved = json.load(file)
+                if saved['key'] == key:
+                    manifest = saved['applications']
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+        descriptions, changed = {}, False
+        for name in self.names:
+            stamp = _file_stamp(self._files.get(name))
+            entry = manifest.get(name)
+            if (stamp and entry and entry['stamp'] == stamp and
+                    all(_file_stamp(path) == base
+                        for path, base in entry['bases'].items())):
+                descriptions[name] = entry['description']
+                continue
+            try:
+                klass = self[name]
+            except KeyError:
+                continue
+            descriptions[name] = describe(klass)
+            manifest[name] = {'stamp': stamp, 'bases': {
+                path: _file_stamp(path) for path in _class_files(klass)},
+                'description': descriptions[name]}
+            changed = True
+        if cache and changed:
+            _write_manifest(cache, {'key': key, 'applications': {
+                name: manifest[name] for name in descriptions}})
+        return descriptions
+
+
+def _class_files(klass):
+    '''Return the source files of the modules defining klass and the
+    classes it inherits from.'''
+    files = set()
+    for cls in klass.__mro__:
+        filename = getattr(sys.modules.get(cls.__module__), '__file__', None)
+        if filename:
+            files.add(filename)
+    return sorted(files)
+
+
+def _file_stamp(path):
     try:
-        absolute_app = '.'+applicationName
-        module = __import__(applicationName, globals(), locals(), ['Application'], 1)
-        klass = module.Application
-    except Exception as e:
-        logging.error('Module {name} cannot be imported. Reason: {ex}'.format(name=applicationName, ex=e))
-        continue
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return [stat.st_mtime, stat.st_size]
 
-    #Validation of Algorithm class
 
-    if not issubclass(klass, DriverApplicationBaseClass):
-        logging.warning('The implementation of {name} does not inherit from openeis.algorithm.DriverApplicationBaseClass.'.format(name=applicationName))
+def _write_manifest(path, manifest):
+    '''Atomically replace the manifest at path, ignoring failures.'''
+    try:
+        data = json.dumps(manifest)
+        directory = os.path.dirname(path) or '.'
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False,
+                                         suffix='.tmp') as file:
+            file.write(data)
+        os.replace(file.name, path)
+    except (OSError, TypeError, ValueError) as e:
+        logging.warning('Application manifest {} cannot be written. '
+                        'Reason: {}'.format(path, e))
 
-    _applicationDict[applicationName] = klass
 
-#print(_applicationDict)
+_applicationDict = ApplicationRegistry(__name__, __path__)
 
 
 def get_algorithm_class(name):
     return _applicationDict.get(name)
-
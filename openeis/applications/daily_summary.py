@@ -98,10 +98,24 @@ from openeis.applications import DriverApplicationBaseClass, InputDescriptor, \
 from openeis.applications import reports
 import logging
 import numpy
-import math
-from django.db.models import Max, Min, Avg
-from dateutil.relativedelta import relativedelta
 from openeis.applications.utils import conversion_utils as cu
+from openeis.projects.storage.chunks import local_fields
+from openeis.projects.storage.merge import to_datetime64
+
+
+def _percentiles(values, starts, counts, q):
+    """
+    Return the q-th percentile of each group of sorted values, where
+    the groups begin at starts and hold counts values, interpolating
+    linearly as numpy.percentile does.
+    """
+    position = (counts - 1) * (q / 100.0)
+    below = numpy.floor(position).astype(numpy.int64)
+    above = numpy.minimum(below + 1, counts - 1)
+    fraction = position - below
+    low = values[starts + below]
+    high = values[starts + above]
+    return low + (high - low) * fraction
 
 
 class Application(DriverApplicationBaseClass):
@@ -221,15 +235,14 @@ class Application(DriverApplicationBaseClass):
         self.out.log("Starting application: daily summary.", logging.INFO)
 
         self.out.log("Querying database.", logging.INFO)
-        peakLoad = self.inp.get_query_sets('load', group_by='all',
-                                           group_by_aggregation=Max)[0]
         load_query = self.inp.get_query_sets('load', exclude={'value':None})[0]
-
-        load_startDay = load_query.earliest()[0].date()
-        load_endDay = load_query.latest()[0].date()
-        current_Day = load_startDay
-        load_day_list_95 = []
-        load_day_list_5 = []
+        readings = list(load_query)
+        if not readings:
+            raise Exception("Must have more than 1 day of data!")
+        load_times, load_values = zip(*readings)
+        load_times = to_datetime64(load_times).astype(numpy.int64)
+        load_values = numpy.array(load_values, dtype=numpy.float64)
+        peakLoad = load_values.max()
 
         self.out.log("Getting unit conversions.", logging.INFO)
         base_topic = self.inp.get_topics()
@@ -247,18 +260,26 @@ class Application(DriverApplicationBaseClass):
         peakLoadIntensity = peakLoad / floorAreaSqft
 
         self.out.log("Calculating daily top and bottom percentile.", logging.INFO)
-        while current_Day <= load_endDay:
-            load_day_query = load_query.filter(time__year=current_Day.year,
-                                            time__month=current_Day.month,
-                                            time__day=current_Day.day)
-            current_Day += relativedelta(days=1)
-
-            load_day_values = [x[1] for x in load_day_query]
-            if (len(load_day_values) < 5):
-                continue
-
-            load_day_list_95.append(numpy.percentile(load_day_values, 95))
-            load_day_list_5.append(numpy.percentile(load_day_values, 5))
+        # Days and hours are those of the current time zone, as for the
+        # time__day and time__hour lookups, but the range of days runs
+        # from the UTC date of the first reading to that of the last.
+        local = local_fields(load_times)
+        days = local('year') * 10000 + local('month') * 100 + local('day')
+        first_day, last_day = (
+            x.year * 10000 + x.month * 100 + x.day for x in
+            load_times[[0, -1]].astype('datetime64[us]')
+                               .astype('datetime64[D]').tolist())
+        in_range = (days >= first_day) & (days <= last_day)
+        day_values = load_values[in_range]
+        order = numpy.lexsort((day_values, days[in_range]))
+        day_values = day_values[order]
+        day_starts, day_counts = numpy.unique(days[in_range][order],
+                                              return_index=True,
+                                              return_counts=True)[1:]
+        enough = day_counts >= 5
+        day_starts, day_counts = day_starts[enough], day_counts[enough]
+        load_day_list_95 = _percentiles(day_values, day_starts, day_counts, 95)
+        load_day_list_5 = _percentiles(day_values, day_starts, day_counts, 5)
 
         # average them
         load_day_95_mean = numpy.mean(load_day_list_95)
@@ -271,23 +292,17 @@ class Application(DriverApplicationBaseClass):
         self.out.log("Calculating load variability.", logging.INFO)
         # TODO: Generate error if there are not 24 hours worth of data for
         # every day and less than two days of data.
-        hourly_variability = []
-
-        for h in range(24):
-            hourly_mean = self.inp.get_query_sets('load', group_by='all',
-                                                  group_by_aggregation=Avg,
-                                                  filter_={'time__hour':h})[0]
-            hour_load_query = self.inp.get_query_sets('load',
-                                                     filter_={'time__hour':h},
-                                                     exclude={'value':None})[0]
-            counts = hour_load_query.count()
-            if (counts < 2):
-                raise Exception("Must have more than 1 day of data!")
-            rootmeansq = math.sqrt(
-                sum((x[1] - hourly_mean) ** 2 for x in hour_load_query)
-                / (counts - 1)
-                )
-            hourly_variability.append(rootmeansq / hourly_mean)
+        hours = local('hour')
+        counts = numpy.bincount(hours, minlength=24)
+        if (counts < 2).any():
+            raise Exception("Must have more than 1 day of data!")
+        hourly_mean = numpy.bincount(hours, load_values, minlength=24) / counts
+        deviations = load_values - hourly_mean[hours]
+        rootmeansq = numpy.sqrt(
+            numpy.bincount(hours, deviations * deviations, minlength=24)
+            / (counts - 1)
+            )
+        hourly_variability = rootmeansq / hourly_mean
 
         load_variability = numpy.mean(hourly_variability)
 
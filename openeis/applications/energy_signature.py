@@ -272,28 +272,23 @@ class Application(DriverApplicationBaseClass):
             logging.INFO
             )
 
-        #print('merge load', merged_load_oat)
-        load_values = []
-        oat_values = []
-
         self.out.log("Pulling data from database.", logging.INFO)
-        merged_load_oat = self.inp.merge(load_query, oat_query)
-        for x in merged_load_oat:
-            if temperature_unit == 'celcius':
-                convertedTemp = cu.convertCelciusToFahrenheit(x['oat'][0])
-            elif temperature_unit == 'kelvin':
-                convertedTemp = cu.convertKelvinToCelcius(
-                                cu.convertCelciusToFahrenheit(x['oat'][0]))
-            else:
-                convertedTemp = x['oat'][0]
-
-            load_values.append(x['load'][0]*load_convertfactor)
-            oat_values.append(convertedTemp)
+        merged_load_oat = self.inp.merge_arrays(load_query, oat_query)
+        oat_values = merged_load_oat['oat'][:, 0]
+        load_values = merged_load_oat['load'][:, 0]
+        for oat, load in zip(oat_values.tolist(), load_values.tolist()):
             self.out.insert_row(LOAD_VS_OAT_TABLE_NAME, {
-                "oat": x['oat'][0],
-                "load": x['load'][0]
+                "oat": oat,
+                "load": load
                 })
 
+        if temperature_unit == 'celcius':
+            oat_values = cu.convertCelciusToFahrenheit(oat_values)
+        elif temperature_unit == 'kelvin':
+            oat_values = cu.convertKelvinToCelcius(
+                         cu.convertCelciusToFahrenheit(oat_values))
+        load_values = load_values * load_convertfactor
+
         self.out.log("Calculating the Spearman rank.", logging.INFO)
         #print(load_values)
         #print(oat_values)
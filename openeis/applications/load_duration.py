@@ -90,7 +90,7 @@ from openeis.applications.utils import conversion_utils as cu
 
 class Application(DriverApplicationBaseClass):
 
-    def __init__(self, *args, building_name=None, **kwargs):
+    def __init__(self, *args, building_name=None, points=None, **kwargs):
         #Called after app has been staged
         """
         When applications extend this base class, they need to make
@@ -105,6 +105,7 @@ class Application(DriverApplicationBaseClass):
             self.default_building_name_used = True
 
         self.building_name = building_name
+        self.points = points
 
     @classmethod
     def get_self_descriptor(cls):    
@@ -118,7 +119,12 @@ class Application(DriverApplicationBaseClass):
     def get_config_parameters(cls):
         #Called by UI
         return {
-            "building_name": ConfigDescriptor(str, "Building Name", optional=True)
+            "building_name": ConfigDescriptor(str, "Building Name", optional=True),
+            "points": ConfigDescriptor(int, "Number of Points",
+                                       description="Output this many evenly "
+                                       "spaced points of the curve, rather "
+                                       "than one point per load sample",
+                                       optional=True, value_min=2)
             }
 
 
@@ -214,8 +220,27 @@ class Application(DriverApplicationBaseClass):
         load_convertfactor = cu.getFactor_powertoKW(load_unit)
 
         self.out.log("Compiling the report table.", logging.INFO)
-        ctr = 1
-        for x in load_query[0]:
+        # The loads are counted, then only those output are read in
+        # sorted order.
+        load = load_query[0]
+        loadCt = load.count()
+        if not loadCt:
+            return
+        wanted = _curve_indices(loadCt, self.points)
+        for ctr, x in zip(wanted, self.inp.select_rows(load, wanted)):
             self.out.insert_row("Load_Duration", { "sorted load": x[1]*load_convertfactor,
-                                                   "percent time": (len(load_query[0])-ctr) / len(load_query[0]) } )
-            ctr += 1
\ No newline at end of file
+                                                   "percent time": (loadCt-ctr-1) / loadCt } )
+
+
+def _curve_indices(count, points=None):
+    """
+    Return the indices, into `count` sorted loads, of the loads output.
+
+    All loads are output if `points` is None or at least `count`.  Otherwise
+    `points` indices are spaced as evenly as possible from the first to the
+    last load, so the points are exact samples of the full curve.
+    """
+    if points is None or points >= count:
+        return range(count)
+    points = max(points, 2)
+    return [(k*(count-1) + (points-1)//2) // (points-1) for k in range(points)]
@@ -87,8 +87,8 @@ from openeis.applications import DriverApplicationBaseClass, InputDescriptor,  \
     OutputDescriptor, ConfigDescriptor, Descriptor
 from openeis.applications import reports
 from openeis.applications.utils import conversion_utils as cu
+from openeis.applications.utils import holiday_calendar
 import logging
-import workalendar.usa
 
 class Application(DriverApplicationBaseClass):
 
@@ -239,23 +239,24 @@ class Application(DriverApplicationBaseClass):
 
         self.out.log("Compiling the report table.", logging.INFO)
         #for x in load_by_hour[start:end]:
-        cal = workalendar.usa.UnitedStates()
+        # Local times and day types (W, Sat, Sun or H) are found for all
+        # hours at once.
+        load_by_hour = list(load_by_hour)
+        local_times = self.inp.localize_sensor_times(
+            base_topic['load'][0], [x[0] for x in load_by_hour])
+        daytypes = holiday_calendar.get_calendar().day_types(local_times)
         values = []
         prev_local_time = None
+        prev_daytype = None
         for i, x in enumerate(load_by_hour):
-            local_time = self.inp.localize_sensor_time(base_topic['load'][0], x[0])
+            local_time = local_times[i]
             if (i==0) or (local_time == prev_local_time):
                 values.append(x[1])
                 prev_local_time = local_time
+                prev_daytype = daytypes[i]
 
             if (i==len(load_by_hour)-1) or (local_time != prev_local_time):
-                daytype = 'W' #weekdays: [0,4]
-                if prev_local_time.weekday() == 5:
-                    daytype = 'Sat'
-                if prev_local_time.weekday() == 6:
-                    daytype = 'Sun'
-                if cal.is_holiday(prev_local_time):
-                    daytype = 'H'
+                daytype = str(prev_daytype)
                 value = sum(values)/len(values)
                 #print(prev_local_time.strftime('%m/%d/%Y %H:%M:%S') + "   " + daytype + "      " + str(value))
                 self.out.insert_row("Load_Profiling", {
@@ -265,4 +266,5 @@ class Application(DriverApplicationBaseClass):
                 })
                 values = [x[1]]
                 prev_local_time = local_time
+                prev_daytype = daytypes[i]
 
@@ -88,8 +88,8 @@ from openeis.applications import DriverApplicationBaseClass, InputDescriptor,  \
 from openeis.applications import reports
 from openeis.applications.utils import conversion_utils as cu
 from dateutil import parser
+from openeis.applications.utils import holiday_calendar
 import logging
-import workalendar.usa
 
 class Application(DriverApplicationBaseClass):
 
@@ -254,15 +254,21 @@ class Application(DriverApplicationBaseClass):
 
         self.out.log("Compiling the report table.", logging.INFO)
         #for x in load_by_hour[start:end]:
-        cal = workalendar.usa.UnitedStates()
+        # Local times and day types (W, Sat, Sun or H) are found for all
+        # hours at once.
+        load_by_hour = list(load_by_hour)
+        local_times = self.inp.localize_sensor_times(
+            base_topic['load'][0], [x[0] for x in load_by_hour])
+        daytypes = holiday_calendar.get_calendar().day_types(local_times)
         values = []
         prev_local_time = None
+        prev_daytype = None
         pre_start_local = self.inp.localize_sensor_time(base_topic['load'][0], self.pre_start)
         pre_end_local = self.inp.localize_sensor_time(base_topic['load'][0], self.pre_end)
         post_start_local = self.inp.localize_sensor_time(base_topic['load'][0], self.post_start)
         post_end_local = self.inp.localize_sensor_time(base_topic['load'][0], self.post_end)
         for i, x in enumerate(load_by_hour):
-            local_time = self.inp.localize_sensor_time(base_topic['load'][0], x[0])
+            local_time = local_times[i]
             #Rx type
             rx_type = None
             if (pre_start_local <= local_time <= pre_end_local):
@@ -277,15 +283,10 @@ class Application(DriverApplicationBaseClass):
             if (local_time == pre_start_local) or (local_time == post_start_local) or (local_time == prev_local_time):
                 values.append(x[1])
                 prev_local_time = local_time
+                prev_daytype = daytypes[i]
 
             if (local_time == pre_end_local) or (local_time == post_end_local) or (local_time != prev_local_time):
-                daytype = 'W' #weekdays: [0,4]
-                if prev_local_time.weekday() == 5:
-                    daytype = 'Sat'
-                if prev_local_time.weekday() == 6:
-                    daytype = 'Sun'
-                if cal.is_holiday(prev_local_time):
-                    daytype = 'H'
+                daytype = str(prev_daytype)
                 value = sum(values)/len(values)
                 #print(prev_local_time.strftime('%m/%d/%Y %H:%M:%S') + "   " + daytype + "      " + str(value))
                 self.out.insert_row("Load_Profiling", {
@@ -296,3 +297,4 @@ class Application(DriverApplicationBaseClass):
                 })
                 values = [x[1]]
                 prev_local_time = local_time
+                prev_daytype = daytypes[i]
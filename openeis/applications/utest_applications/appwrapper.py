@@ -150,6 +150,15 @@ class AppWrapper:
         else:
             assert value in collection
     
+    def _make_input(self, dataset, topic_map):
+        return DatabaseInput(dataset.map.id, topic_map, dataset.id)
+
+    def _make_output(self, analysis, output_format):
+        return DatabaseOutputFile(analysis, output_format)
+
+    def _make_app(self, klass, db_input, output, kwargs):
+        return klass(db_input, output, **kwargs)
+
     def _run_app(self, config):
         
         # Get application.
@@ -187,13 +196,13 @@ class AppWrapper:
             )
         analysis.save()
 
-        db_input = DatabaseInput(dataset.map.id, topic_map, dataset_id)
+        db_input = self._make_input(dataset, topic_map)
 
         output_format = klass.output_format(db_input)
-        file_output = DatabaseOutputFile(analysis, output_format)
+        file_output = self._make_output(analysis, output_format)
 
         # Execute the application.
-        app = klass(db_input, file_output, **kwargs)
+        app = self._make_app(klass, db_input, file_output, kwargs)
         try:
             app.run_application()
             for report in klass.reports(output_format):
@@ -0,0 +1,12 @@
+import pytest
+
+from openeis.projects.conf import settings as proj_settings
+
+
+@pytest.fixture(autouse=True)
+def temporary_cache_dirs(monkeypatch, tmpdir):
+    '''Keep the dataset snapshots and fits of the tests out of DATA_DIR.'''
+    monkeypatch.setattr(proj_settings, 'DATASET_SNAPSHOT_DIR',
+                        str(tmpdir.join('snapshots')))
+    monkeypatch.setattr(proj_settings, 'FIT_CACHE_DIR',
+                        str(tmpdir.join('fits')))
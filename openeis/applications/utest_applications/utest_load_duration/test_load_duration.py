@@ -118,6 +118,28 @@ def test_load_duration_basic(basic_dataset):
     }
     
     run_appwrapper(config, expected)
+
+def test_load_duration_points(basic_dataset):
+    # Three evenly spaced points of the five sample curve.
+    config = ConfigParser()
+    
+    config.add_section("global_settings")
+    config.set("global_settings", 'application', app_name)
+    config.set("global_settings", 'dataset_id', str(basic_dataset.id))
+    config.set("global_settings", 'sensormap_id', str(basic_dataset.map.id))
+    
+    config.add_section("application_config")
+    config.set('application_config', 'building_name', '"bldg90"')
+    config.set('application_config', 'points', '3')
+    
+    config.add_section('inputs')
+    config.set('inputs', 'load', 'lbnl/bldg90/WholeBuildingPower')
+    
+    expected = {
+        'Load_Duration': os.path.join(basedir, 'load_duration_points.ref.csv')
+    }
+    
+    run_appwrapper(config, expected)
     
 def test_load_duration_missing(missing_dataset):
     config = ConfigParser()
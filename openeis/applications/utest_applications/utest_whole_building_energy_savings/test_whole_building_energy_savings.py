@@ -121,7 +121,29 @@ def test_util_findDateIndex():
         datetime.datetime(2014, 2, 1, 0, 0, 0, 0)
         )
     assert testDateIndex == 24
-    
+    testDateIndex = dtt.findDateIndex(
+        datetime_list,
+        datetime.datetime(2013, 12, 1, 0, 0, 0, 0)
+        )
+    assert testDateIndex is None
+    testDateIndex = dtt.findDateIndex(
+        datetime_list.astype('datetime64[us]'),
+        datetime.datetime(2014, 1, 2, 5, 0, 0, 0)
+        )
+    assert testDateIndex == 24
+
+def test_util_formModel_subhourly():
+    # Fifteen-minute data gets one alpha per quarter hour of the week.
+    times = (numpy.datetime64('2014-01-06T00:00') +
+             numpy.arange(4*24*28) * numpy.timedelta64(15, 'm'))
+    quarter = numpy.arange(len(times)) % (4*24*7)
+    oats = 50.0 + 10.0 * numpy.sin(numpy.arange(len(times)) / 96.0)
+    vals = 100.0 + quarter + 0.5 * oats
+    model = dtt.formModel(times, list(oats), list(vals), 15, 1)
+    assert model['OvU'].shape == (7, 24, 4)
+    predicted = dtt.applyModel(model, times, oats)
+    assert numpy.allclose(predicted, vals)
+
 def build_expected(table_name, file_ref):
     return {table_name: os.path.join(basedir, file_ref)}
 
@@ -133,6 +155,19 @@ def test_whole_building_energy_savings_base(base_dataset):
                                                 base_dataset.map.id)
     
     run_appwrapper(config, expected_output)
+
+def test_whole_building_energy_savings_cached_fit(base_dataset, monkeypatch,
+                                                  tmpdir):
+    # The second run reuses the baseline fit by the first.
+    expected_output = build_expected('DayTimeTemperatureModel',
+                                     'whole_building_energy_savings_base.ref.csv')
+    config = build_whole_building_config_parser(app_name,
+                                                base_dataset.id,
+                                                base_dataset.map.id)
+    run_appwrapper(config, expected_output)
+    assert len(tmpdir.join('fits', str(base_dataset.id)).listdir()) == 1
+    monkeypatch.setattr(dtt, 'formModel', None)
+    run_appwrapper(config, expected_output)
     
 #     wbes_base_ini = os.path.join(self.basedir,
 #         'whole_building_energy_savings_base.ini')
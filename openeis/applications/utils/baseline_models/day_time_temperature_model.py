@@ -87,32 +87,64 @@ and includes the following modification: Paragraph 3. has been added.
 import datetime as dt
 import numpy as np
 
+from openeis.applications.utils import holiday_calendar
+
+
+_EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+
+
+def _toDays(dates):
+    """Return days since 1970-01-01 of dates, datetimes or `datetime64` values."""
+    dates = np.asarray(dates)
+    if np.issubdtype(dates.dtype, np.datetime64):
+        return dates.astype('datetime64[D]').astype(np.int64)
+    return np.array([x.toordinal() for x in dates.ravel()],
+                    dtype=np.int64) - _EPOCH_ORDINAL
+
+
+def _stepsPerHour(timeStepMinutes):
+    """Number of time steps per hour (at least one)."""
+    return max(int(round(60/timeStepMinutes)), 1)
+
+
+def _timeOfWeek(datevec, timeStepMinutes):
+    """
+    Return the time-of-week index of each time in `datevec`.
+
+    Indices run from 0 to 7*24*`_stepsPerHour(timeStepMinutes)`-1, ordered
+    by day of week (Monday first), hour of day and time step within the hour.
+    """
+    minutes = holiday_calendar.wall_clock(datevec).astype(np.int64)
+    days, minuteOfDay = np.divmod(minutes, 24*60)
+    hod, moh = np.divmod(minuteOfDay, 60)
+    dow = holiday_calendar.weekdays(days)
+    stepCt = _stepsPerHour(timeStepMinutes)
+    step = np.minimum(moh // timeStepMinutes, stepCt - 1).astype(np.int64)
+    return (dow*24 + hod)*stepCt + step
+
+
 def findDateIndex(datelist, locatedate):
-    """Given a list of date objects, return index of a specific date."""
-
-    # TODO: Need to document expectation that the dates are not sorted.  In
-    # general, would expect them to be sorted, and therefore would expect a
-    # binary search to be much better than this.
-    ctr = 0
-    dateIndex = None
-    while ctr < len(datelist):
-        if (datelist[ctr].year == locatedate.year) & (datelist[ctr].month == locatedate.month) & (datelist[ctr].day == locatedate.day):
-           dateIndex = ctr
-           break
-        else:
-           ctr += 1
-
-    # TODO: Need to document why the code below is executed (or else remove the code).
-    # - This says, "If you didn't find {locatedate}, look for one day earlier."
-    # - This potentially creates an infinite loop, since {locatedate} might start
-    #   out earlier than earliest date in {datelist}.
-    # - Even if it finds a solution, and somehow know it's sensible, need to document
-    #   in the method header that this is what happens.
-    if (dateIndex == None):
-        newlocatedate = locatedate - dt.timedelta(days=1)
-        dateIndex = findDateIndex(datelist, newlocatedate)
-
-    return dateIndex
+    """
+    Given a list of date objects, return index of a specific date.
+
+    Returns the index of the first entry of `datelist` falling on the day of
+    `locatedate`.  If no entry does, looks for the latest earlier day which
+    has entries.  Returns `None` if all entries are later than `locatedate`.
+
+    `datelist` may hold dates, datetimes or `datetime64` values.  Sorted lists
+    are searched by bisection; unsorted ones are scanned.
+    """
+    days = _toDays(datelist)
+    day = _toDays([locatedate])[0]
+    if( np.all(days[1:] >= days[:-1]) ):
+        idx = np.searchsorted(days, day, side='right') - 1
+        if( idx < 0 ):
+            return None
+        return int(np.searchsorted(days, days[idx], side='left'))
+    earlier = (days <= day)
+    if( not np.any(earlier) ):
+        return None
+    return int(np.argmax(days == days[earlier].max()))
 
 
 def getBins(oat, binCt):
@@ -164,7 +196,7 @@ def getTc(oat,B):
 def findThresholdValue(datevec, e):
     """Find the threshold value for each time of day."""
     tv=[0,0,0,0,0,0,0]
-    dow=np.array([x.weekday() for x in datevec])    # day of week vector
+    dow=holiday_calendar.weekdays(holiday_calendar.local_days(datevec))   # day of week vector
     for i in range(0,7):
         [L10, L90] = np.percentile(e[dow==i], [10,90])
         tv[i] = L10 + 0.1*(L90-L10) #threshhold value for 'occupied'
@@ -180,57 +212,118 @@ def _getOccupiedTime(datevec, medianval, timeStepMinutes, thresholdvec):
     Array indices:
     - dow, day-of-week
     - hod, hour-of-day
-    - moh, minute-of-hour
+    - moh, time step of hour
+
+    Times of week without entries are marked occupied.  Medians are found for
+    all times of week at once, from entries sorted by time of week and value.
     """
-    dow = np.array([x.weekday() for x in datevec])  # day of week vector
-    hod = np.array([x.hour for x in datevec])       # hour of day vector
-    moh = np.array([x.minute for x in datevec])     # minutes
-    timeDiv = int(round(60/timeStepMinutes))           # of timesteps per hour
+    stepCt = _stepsPerHour(timeStepMinutes)
+    tow = _timeOfWeek(datevec, timeStepMinutes)
+    medianval = np.asarray(medianval, dtype=float)
 
-    OvU = np.ones([7,24,timeDiv], dtype=bool)
+    OvU = np.ones(7*24*stepCt, dtype=bool)
+    if( len(tow) == 0 ):
+        return OvU.reshape(7, 24, stepCt)
 
-    tint=round(timeStepMinutes/60)
-    for i in range(0,7):
-        threshold = thresholdvec[i] #threshold value for 'occupied'
-        for j in range(0,24):
-            for k in range(1,tint+1):
-                mask = (dow==i) & (hod==j) & (moh==(k-1)*timeStepMinutes)
-                if( np.any(mask) ):
-                    OvU[i,j,k-1] = (np.median(medianval[mask]) > threshold)
-    return OvU
+    # NaNs sort last, so mark times of week holding any as having NaN medians.
+    order = np.lexsort((medianval, tow))
+    srtdVals = medianval[order]
+    slots, starts, counts = np.unique(tow[order], return_index=True,
+                                      return_counts=True)
+    medians = 0.5 * (srtdVals[starts + (counts-1)//2] + srtdVals[starts + counts//2])
+    hasNan = np.bincount(tow, weights=np.isnan(medianval), minlength=len(OvU)) > 0
+    medians[hasNan[slots]] = np.nan
+
+    thresholds = np.asarray(thresholdvec, dtype=float)[slots // (24*stepCt)]
+    OvU[slots] = (medians > thresholds)
+    return OvU.reshape(7, 24, stepCt)
 
 
 def sch2vec(OvU,datevec,timeStepMinutes):
     """Converts schedule of occupied vs non-occupied table to values for specific date vector."""
-    Ovec = np.array([OvU[x.weekday(),x.hour,round(x.minute/timeStepMinutes)] for x in datevec], dtype=bool)
+    Ovec = OvU.reshape(-1)[_timeOfWeek(datevec, timeStepMinutes)]
     return Ovec
 
 
-def getA(datevec,oat,timeStepMinutes,B):
-    oat = oat.reshape(len(oat),1)
+def _getOatM(oat, B):
+    """Temperature columns of the design matrix."""
+    oat = np.asarray(oat, dtype=float).reshape(len(oat),1)
     if len(B)>1:
-        oatM=getTc(oat,B)
-    else:
-        oatM=np.array(oat)
-        oatM=oatM.reshape(len(oatM),1)
-    tint=round(timeStepMinutes/60)
-    L=24*tint*7 # time steps per week (# of alpha values)
-    Ap=np.zeros((len(datevec),L))
-    for i in range(0,len(datevec)):
-        Nt=round(datevec[i].minute/tint)+datevec[i].hour*tint+datevec[i].weekday()*24*tint
-        Ap[i,Nt]=1
+        return getTc(oat,B)
+    return oat
+
+
+def getA(datevec,oat,timeStepMinutes,B):
+    """
+    Form the dense design matrix: temperature columns, followed by one
+    indicator column per time of week.
+
+    The fit and prediction use the time-of-week indices directly instead,
+    see `_fitTtow` and `_applyTtow`.
+    """
+    oatM = _getOatM(oat, B)
+    L = 7*24*_stepsPerHour(timeStepMinutes) # time steps per week (# of alpha values)
+    Ap = np.zeros((len(oatM),L))
+    Ap[np.arange(len(oatM)),_timeOfWeek(datevec,timeStepMinutes)] = 1
     # Unoccupied type implementation: temp term and alpha for each TOW
     a=np.hstack((oatM,Ap))
     return a
 
 
+def _fitTtow(tow, oatM, vals, towCt):
+    """
+    Least-squares fit of `vals` to temperature columns `oatM` plus one
+    intercept per time of week.
+
+    Equivalent to fitting the design matrix of `getA`, less its columns which
+    sum to zero or less, without forming it: the temperature coefficients are
+    fit to values and temperatures less their time-of-week means, and each
+    intercept is then the mean residual of its time of week.
+
+    Returns the coefficients in the column order of `getA`, with zeros for
+    dropped columns.
+    """
+    colCt = oatM.shape[1]
+    w = np.zeros(colCt + towCt)
+    if( len(vals) == 0 ):
+        return w
+    counts = np.bincount(tow, minlength=towCt)
+    seen = counts > 0
+    cols = np.sum(oatM, 0) > 0
+    oatM = oatM[:,cols]
+
+    def towMeans(x):
+        sums = np.bincount(tow, weights=x, minlength=towCt)
+        return sums[seen] / counts[seen]
+
+    def demeaned(x):
+        means = np.zeros(towCt)
+        means[seen] = towMeans(x)
+        return x - means[tow]
+
+    if( oatM.shape[1] > 0 ):
+        oatD = np.column_stack([demeaned(oatM[:,i]) for i in range(oatM.shape[1])])
+        beta = np.linalg.lstsq(oatD, demeaned(vals), rcond=None)[0]
+    else:
+        beta = np.zeros(0)
+    w[:colCt][cols] = beta
+    w[colCt:][seen] = towMeans(vals - np.dot(oatM, beta))
+    return w
+
+
+def _applyTtow(tow, oatM, w):
+    """Modeled values for time-of-week indices and temperature columns."""
+    colCt = oatM.shape[1]
+    return np.dot(oatM, w[:colCt]) + w[colCt:][tow]
+
+
 def formModel(timesTrain, oatsTrain, valsTrain, timeStepMinutes, binCt):
     """
     Form the temperature-time-of-week model (i.e., perform the training stage).
 
     Arguments:
     - `timesTrain`, times with which to train model.
-      A `np.ndarray` of `dt.datetime` objects.
+      A `np.ndarray` of `dt.datetime` objects, or of `np.datetime64`.
     - `oatsTrain`, outdoor air temperatures with which to train model.
       A `np.ndarray` of floats.
     - `valsTrain`, energy use values with which to train model.
@@ -248,7 +341,8 @@ def formModel(timesTrain, oatsTrain, valsTrain, timeStepMinutes, binCt):
 
     timesTrain = np.array(timesTrain)
     assert( timesTrain.ndim == 1 )
-    assert( type(timesTrain[0]) is dt.datetime )
+    assert( np.issubdtype(timesTrain.dtype, np.datetime64) or
+            type(timesTrain[0]) is dt.datetime )
 
     oatsTrain = np.array(oatsTrain)
     assert( oatsTrain.ndim == 1 )
@@ -266,27 +360,23 @@ def formModel(timesTrain, oatsTrain, valsTrain, timeStepMinutes, binCt):
     assert( type(binCt) is int )
     assert( binCt > 0 )
 
+    # Time-of-week index of each time, found once.
+    towCt = 7*24*_stepsPerHour(timeStepMinutes)
+    tow = _timeOfWeek(timesTrain, timeStepMinutes)
+
     thresholdval = findThresholdValue(timesTrain, valsTrain)
     OvU = _getOccupiedTime(timesTrain, valsTrain, timeStepMinutes, thresholdval)
     # Specifies occ(1) or unoc(0) for each [dow,hod,increment of hour]
-    Ovec = sch2vec(OvU, timesTrain, timeStepMinutes)
+    Ovec = OvU.reshape(-1)[tow]
     # Converts schedule to 0/1 for specific vector of dates
 
     # Occupied
     B = getBins(oatsTrain, binCt)
     sc = (np.isnan(valsTrain)==False) & (np.isnan(oatsTrain)==False) & Ovec
-    a=getA(timesTrain[sc],oatsTrain[sc],timeStepMinutes,B)
-    aN=a[:,np.sum(a,0)>0]
-    w=np.linalg.lstsq(aN,valsTrain[sc])[0]
-    wN=np.zeros(len(a[1,:]))
-    wN[np.sum(a,0)>0]=w
+    wN = _fitTtow(tow[sc], _getOatM(oatsTrain[sc],B), valsTrain[sc], towCt)
     # Unoccupied
     scU = (np.isnan(valsTrain)==False) & (np.isnan(oatsTrain)==False) & (Ovec==False)
-    aU=getA(timesTrain[scU],oatsTrain[scU],timeStepMinutes,[1])
-    aUN=aU[:,np.sum(aU,0)>0]
-    wU=np.linalg.lstsq(aUN,valsTrain[scU])[0]
-    wUN=np.zeros(len(aU[1,:]))
-    wUN[np.sum(aU,0)>0]=wU
+    wUN = _fitTtow(tow[scU], _getOatM(oatsTrain[scU],[1]), valsTrain[scU], towCt)
 
     return( {
         'timeStepMinutes':timeStepMinutes,
@@ -309,22 +399,18 @@ def applyModel(ttowModel, datevec, oat):
     wN = ttowModel['wN']
     wUN = ttowModel['wUN']
     OvU = ttowModel['OvU']
-    datevec = np.array(datevec)
-    oat = np.array(oat)
+    oat = np.array(oat, dtype=float)
 
-    Ovec=sch2vec(OvU,datevec,timeStepMinutes)
+    tow = _timeOfWeek(datevec, timeStepMinutes)
+    Ovec = OvU.reshape(-1)[tow]
 
     #Occupied
     sc = (np.isnan(oat)==False) & Ovec
-    a = getA(datevec[sc],oat[sc],timeStepMinutes,B)
-    em=np.dot(a,wN)
     Eall=np.nan*sc
-    Eall[sc]=em
+    Eall[sc]=_applyTtow(tow[sc], _getOatM(oat[sc],B), wN)
 
     #Unoccupied
     scU = (np.isnan(oat)==False) & (Ovec==False)
-    aU=getA(datevec[scU],oat[scU],timeStepMinutes,list([1]))
-    emU=np.dot(aU,wUN)
-    Eall[scU]=emU
+    Eall[scU]=_applyTtow(tow[scU], _getOatM(oat[scU],list([1])), wUN)
 
-    return Eall
\ No newline at end of file
+    return Eall
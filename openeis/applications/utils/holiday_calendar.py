@@ -0,0 +1,210 @@
+"""
+Holiday calendars and day-type classification shared by the applications.
+
+Holidays of a region are found once per year and process, and day types
+are assigned to whole arrays of local times at once.
+
+
+Copyright
+=========
+
+OpenEIS Algorithms Phase 2 Copyright (c) 2014,
+The Regents of the University of California, through Lawrence Berkeley National
+Laboratory (subject to receipt of any required approvals from the U.S.
+Department of Energy). All rights reserved.
+
+If you have questions about your rights to use or distribute this software,
+please contact Berkeley Lab's Technology Transfer Department at TTD@lbl.gov
+referring to "OpenEIS Algorithms Phase 2 (LBNL Ref 2014-168)".
+
+NOTICE:  This software was produced by The Regents of the University of
+California under Contract No. DE-AC02-05CH11231 with the Department of Energy.
+For 5 years from November 1, 2012, the Government is granted for itself and
+others acting on its behalf a nonexclusive, paid-up, irrevocable worldwide
+license in this data to reproduce, prepare derivative works, and perform
+publicly and display publicly, by or on behalf of the Government. There is
+provision for the possible extension of the term of this license. Subsequent to
+that period or any extension granted, the Government is granted for itself and
+others acting on its behalf a nonexclusive, paid-up, irrevocable worldwide
+license in this data to reproduce, prepare derivative works, distribute copies
+to the public, perform publicly and display publicly, and to permit others to
+do so. The specific term of the license can be identified by inquiry made to
+Lawrence Berkeley National Laboratory or DOE. Neither the United States nor the
+United States Department of Energy, nor any of their employees, makes any
+warranty, express or implied, or assumes any legal liability or responsibility
+for the accuracy, completeness, or usefulness of any data, apparatus, product,
+or process disclosed, or represents that its use would not infringe privately
+owned rights.
+
+
+License
+=======
+
+Copyright (c) 2014, The Regents of the University of California, Department
+of Energy contract-operators of the Lawrence Berkeley National Laboratory.
+All rights reserved.
+
+1. Redistribution and use in source and binary forms, with or without
+   modification, are permitted provided that the following conditions are met:
+
+   (a) Redistributions of source code must retain the copyright notice, this
+   list of conditions and the following disclaimer.
+
+   (b) Redistributions in binary form must reproduce the copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+   (c) Neither the name of the University of California, Lawrence Berkeley
+   National Laboratory, U.S. Dept. of Energy nor the names of its contributors
+   may be used to endorse or promote products derived from this software
+   without specific prior written permission.
+
+2. THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+   AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+   IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+   DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+   ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+   (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+   LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+   ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+   (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+   THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+3. You are under no obligation whatsoever to provide any bug fixes, patches,
+   or upgrades to the features, functionality or performance of the source code
+   ("Enhancements") to anyone; however, if you choose to make your Enhancements
+   available either publicly, or directly to Lawrence Berkeley National
+   Laboratory, without imposing a separate written license agreement for such
+   Enhancements, then you hereby grant the following license: a non-exclusive,
+   royalty-free perpetual license to install, use, modify, prepare derivative
+   works, incorporate into other computer software, distribute, and sublicense
+   such enhancements or derivative works thereof, in binary and source code
+   form.
+
+NOTE: This license corresponds to the "revised BSD" or "3-clause BSD" license
+and includes the following modification: Paragraph 3. has been added.
+"""
+
+
+#--- Provide access.
+#
+import datetime as dt
+import numpy as np
+
+
+# Weekday of 1970-01-01, the day zero of `datetime64[D]`.
+_EPOCH_WEEKDAY = 3
+
+# Day types, by weekday (Monday first), and for holidays.
+DAY_TYPES = np.array(['W', 'W', 'W', 'W', 'W', 'Sat', 'Sun'])
+HOLIDAY = 'H'
+
+_calendars = {}
+
+
+def wall_clock(local_times):
+    """
+    Return *local_times* as a `datetime64[m]` array of wall-clock times.
+
+    **Args:**
+
+    - *local_times*, a `datetime64` array of wall-clock times, or a sequence of
+      `dt.date` or `dt.datetime` objects, whose own (possibly time zone aware)
+      dates and times are used.
+    """
+    local_times = np.asarray(local_times)
+    if np.issubdtype(local_times.dtype, np.datetime64):
+        return local_times.astype('datetime64[m]')
+    return np.array([
+        x.replace(tzinfo=None) if isinstance(x, dt.datetime) else x
+        for x in local_times.ravel()
+        ], dtype='datetime64[m]')
+
+
+def local_days(local_times):
+    """Return the local days of *local_times* (see :func:`wall_clock`) as a `datetime64[D]` array."""
+    return wall_clock(local_times).astype('datetime64[D]')
+
+
+def local_hours(local_times):
+    """Return the local hours of day of *local_times* (see :func:`wall_clock`)."""
+    times = wall_clock(local_times)
+    return (times - times.astype('datetime64[D]')).astype(np.int64) // 60
+
+
+def weekdays(days):
+    """Return the weekdays (Monday is 0) of a `datetime64[D]` array, or of an array of days since 1970-01-01."""
+    return (days.astype(np.int64) + _EPOCH_WEEKDAY) % 7
+
+
+def is_in(days, dates):
+    """
+    Return a boolean array marking which of the `datetime64[D]` *days* are
+    among *dates*, a collection of `dt.date`.
+    """
+    return np.isin(days, np.array(sorted(dates), dtype='datetime64[D]'))
+
+
+class HolidayCalendar:
+    """
+    Holidays of a `workalendar` calendar, found once per year.
+
+    Use :func:`get_calendar` to share one instance per region in a process.
+    """
+
+    def __init__(self, calendar):
+        self.calendar = calendar
+        self._holidays = {}
+
+    def holidays(self, year):
+        """Return the set of `dt.date` holidays in *year*."""
+        try:
+            return self._holidays[year]
+        except KeyError:
+            pass
+        result = self._holidays[year] = frozenset(
+            day for day, _ in self.calendar.holidays(year))
+        return result
+
+    def is_holiday(self, day):
+        """Return True if the local date of *day* is a holiday."""
+        if isinstance(day, dt.datetime):
+            day = day.date()
+        return day in self.holidays(day.year)
+
+    def holiday_mask(self, days):
+        """Return a boolean array marking the holidays among `datetime64[D]` *days*."""
+        years = np.unique(days.astype('datetime64[Y]').astype(np.int64) + 1970)
+        dates = set()
+        for year in years.tolist():
+            dates.update(self.holidays(year))
+        return is_in(days, dates)
+
+    def day_types(self, local_times):
+        """
+        Return the day type of each of *local_times* (see :func:`local_days`):
+        'W' for weekdays, 'Sat', 'Sun', or 'H' for holidays.
+        """
+        days = local_days(local_times)
+        result = DAY_TYPES[weekdays(days)]
+        result[self.holiday_mask(days)] = HOLIDAY
+        return result
+
+
+def get_calendar(calendar_class=None):
+    """
+    Return the shared :class:`HolidayCalendar` of a `workalendar` calendar class.
+
+    **Args:**
+
+    - *calendar_class*, defaults to `workalendar.usa.UnitedStates`.
+    """
+    if calendar_class is None:
+        import workalendar.usa
+        calendar_class = workalendar.usa.UnitedStates
+    try:
+        return _calendars[calendar_class]
+    except KeyError:
+        pass
+    result = _calendars[calendar_class] = HolidayCalendar(calendar_class())
+    return result
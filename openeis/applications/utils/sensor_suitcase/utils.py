@@ -82,6 +82,11 @@ NOTE: This license corresponds to the "revised BSD" or "3-clause BSD" license
 and includes the following modification: Paragraph 3. has been added.
 """
 
+import numpy as np
+
+from openeis.applications.utils import holiday_calendar
+
+
 def get_CBECS(area):
     """
     Grab CBECS data used to calculate savings in Sensor Suitcase algorithms.
@@ -131,14 +136,15 @@ def separate_hours(data, op_hours, days_op, holidays=[]):
         - holidays: a list of datetime.date that are holidays.
             - data with these dates will be put into non-operational hours
     """
-    operational = []
-    non_op = []
-    for point in data:
-        if (point[0].date() in holidays) or \
-            (point[0].isoweekday() not in days_op):
-            non_op.append(point)
-        elif ((point[0].hour >= op_hours[0]) and (point[0].hour < op_hours[1])):
-            operational.append(point)
-        else:
-            non_op.append(point)
+    if not len(data):
+        return [], []
+    # Classify all points at once; holidays are looked up as a set.
+    times = holiday_calendar.wall_clock([point[0] for point in data])
+    days = holiday_calendar.local_days(times)
+    hours = holiday_calendar.local_hours(times)
+    is_op = ~(holiday_calendar.is_in(days, set(holidays)) |
+              ~np.isin(holiday_calendar.weekdays(days) + 1, list(days_op)))
+    is_op &= (hours >= op_hours[0]) & (hours < op_hours[1])
+    operational = [point for point, op in zip(data, is_op) if op]
+    non_op = [point for point, op in zip(data, is_op) if not op]
     return operational, non_op
@@ -112,38 +112,88 @@ def findSpearmanRank(xValues, yValues):
     assert( valCt > 1 )
     assert( len(yValues) == valCt )
     #
-    # Require numpy arrays with floating-point numbers.
-    # TODO: Not sure need to do this anymore, since no longer allowing NaNs.
-    if( type(xValues)!=np.ndarray or isinstance(xValues[0],int) ):
-        xValues = np.array(xValues, dtype=np.float)
-    if( type(yValues)!=np.ndarray or isinstance(yValues[0],int) ):
-        yValues = np.array(yValues, dtype=np.float)
+    # Rank the values.
+    xRanks = _rankForSpearman(np.asarray(xValues, dtype=float))
+    yRanks = _rankForSpearman(np.asarray(yValues, dtype=float))
+    #
+    return( _correlate(xRanks, yRanks) )
+    #
+    # End :func:`findSpearmanRank`.
+
+
+def findSpearmanRanks(xValues, yValues):
+    """
+    Find the Spearman rank correlation coefficients between columns of arrays.
+
+    **Args:**
+
+    - *xValues*, 2-D array-like, with one series per column.
+    - *yValues*, 2-D array-like of the same shape as *xValues*, or a 1-D
+      sequence with one entry per row of *xValues*, which is then compared
+      against every column.
+
+    **Returns:**
+
+    - *spearmanCoeffs*, 1-D array holding, for each column, the Spearman rank
+      correlation coefficient between the columns of *xValues* and *yValues*.
+
+    **Notes:**
+
+    - Same assumptions as :func:`findSpearmanRank`.  Each column gives the
+      same coefficient as :func:`findSpearmanRank` on that column alone.
+    """
+    #
+    # Check inputs.
+    xValues = np.asarray(xValues, dtype=float)
+    yValues = np.asarray(yValues, dtype=float)
+    assert( xValues.ndim == 2 )
+    valCt = xValues.shape[0]
+    assert( valCt > 1 )
+    assert( yValues.shape[0] == valCt )
     #
     # Rank the values.
-    xRanks = _rankForSpearman(xValues)
-    yRanks = _rankForSpearman(yValues)
+    #   A single *yValues* series needs ranking only once.
+    xRanks = rankColumns(xValues)
+    if( yValues.ndim == 1 ):
+        yRanks = _rankForSpearman(yValues)[:, np.newaxis]
+    else:
+        assert( yValues.shape == xValues.shape )
+        yRanks = rankColumns(yValues)
+    #
+    return( _correlate(xRanks, yRanks) )
+    #
+    # End :func:`findSpearmanRanks`.
+
+
+def _correlate(xRanks, yRanks):
+    """
+    Find the correlation coefficient of ranks, along the first axis.
+    """
     #
     # Subtract out mean rank, so each resulting vector has mean of zero.
-    xRanks = xRanks - xRanks.mean()
-    yRanks = yRanks - yRanks.mean()
+    xRanks = xRanks - xRanks.mean(axis=0)
+    yRanks = yRanks - yRanks.mean(axis=0)
     #
     # Find Spearman rank correlation coefficient.
-    spearmanCoeff = np.inner(xRanks, yRanks) / np.sqrt(
-        np.inner(xRanks,xRanks) * np.inner(yRanks,yRanks)
-        )
-    #
-    return( spearmanCoeff )
+    return( np.sum(xRanks*yRanks, axis=0) / np.sqrt(
+        np.sum(xRanks*xRanks, axis=0) * np.sum(yRanks*yRanks, axis=0)
+        ) )
     #
-    # End :func:`findSpearmanRank`.
+    # End :func:`_correlate`.
 
 
-def _rankForSpearman(values):
+def rankColumns(values):
     """
-    Find the ranks of a vector *values*, as defined for Spearman rank correlation coefficient.
+    Find the ranks of each column of *values*, as defined for Spearman rank correlation coefficient.
 
     **Args:**
 
-    - *values*, array-like sequences of values.
+    - *values*, array of values, ranked along the first axis.  A 1-D array is
+      ranked as a single column.
+
+    **Returns:**
+
+    - *ranks*, float array of the same shape as *values*.
 
     **Notes:**
 
@@ -151,76 +201,69 @@ def _rankForSpearman(values):
     - Equal values get mean rank.
     - Assume argument does not contain any missing or corrupt values (i.e., no ``NAN``
       entries).
+    - Sorts each column once; ties are found as runs of equal entries in the
+      sorted columns, so no Python-level loop runs over the values.
     """
     #
-    # TODO:  Look into doing something easier, like this:
-    # srtdToActIdx = np.argsort(values)
-    # ranks = np.zeros(valCt)
-    # ranks[srtdToActIdx] = numpy.arange(valCt)
-    #   Then run through the ranks and find stretches with same values.
+    values = np.asarray(values)
+    valCt = values.shape[0]
+    if( valCt == 0 ):
+        return( np.zeros(values.shape) )
+    #
+    # Find indices that would sort each column, and the sorted values.
+    #   Example:
+    # - values       = [1, 2, 5, 2, 3]
+    # - srtdToActIdx = [0, 1, 3, 4, 2]
+    # - srtdVals     = [1, 2, 2, 3, 5]
+    srtdToActIdx = np.argsort(values, axis=0)
+    srtdVals = np.take_along_axis(values, srtdToActIdx, axis=0)
     #
-    # TODO: Remove these, since they probably will turn out to be needless
-    # requirements, given that NaNs are no longer an issue.
-    # assert( type(values) == np.ndarray )
-    # assert( values.ndim == 1 )
+    # Mark the sorted entries that start and end runs of equal entries.
+    # - runStarts    = [T, T, F, T, T]
+    # - runEnds      = [T, F, T, T, T]
+    runStarts = np.ones(values.shape, dtype=bool)
+    runStarts[1:] = srtdVals[1:] != srtdVals[:-1]
+    runEnds = np.ones(values.shape, dtype=bool)
+    runEnds[:-1] = runStarts[1:]
     #
-    # Initialize.
-    valCt = len(values)
+    # Find, for each sorted entry, the sorted indices starting and ending its
+    # run, by carrying them forward from starts and back from ends.
+    # - startRunIdx  = [0, 1, 1, 3, 4]
+    # - endRunIdx    = [0, 2, 2, 3, 4]
+    idx = np.arange(valCt).reshape((valCt,) + (1,)*(values.ndim - 1))
+    startRunIdx = np.maximum.accumulate(np.where(runStarts, idx, 0), axis=0)
+    endRunIdx = np.minimum.accumulate(
+        np.where(runEnds, idx, valCt)[::-1], axis=0
+        )[::-1]
     #
-    # Find indices that would sort *values*.
-    #   Example:
-    # - values       = [1, 2, 5, 4, 3]
-    # - srtdToActIdx = [0, 1, 4, 3, 2]
-    srtdToActIdx = np.argsort(values)
-    #
-    # Step through *values* in sorted order, assigning ranks.
-    ranks = np.zeros(valCt)
-    lastVal = values[srtdToActIdx[0]]
-    startRunIdx = 0
-    currIdx = 1
-    while( currIdx < valCt ):
-        #
-        currVal = values[srtdToActIdx[currIdx]]
-        #
-        # Assign ranks if *currVal* breaks a run of equal entries.
-        if( currVal > lastVal ):
-            # Here, indices *startRunIdx* to *currIdx*-1, inclusive, all had
-            # the same value (*lastVal*).
-            #   Their "natural" ranks are *startRunIdx*+1 to *currIdx*,
-            # inclusive.  Assign all the indices the mean rank.
-            #   Examples:
-            # - startRunIdx=0, currIdx=1 ==> mean(1) ==> meanRank=1
-            # - startRunIdx=0, currIdx=2 ==> mean(1,2) ==> meanRank=1.5
-            # - startRunIdx=0, currIdx=5 ==> mean(1,2,3,4,5) ==> meanRank=3
-            # - startRunIdx=1, currIdx=2 ==> mean(2) ==> meanRank=2
-            # - startRunIdx=1, currIdx=4 ==> mean(2,3,4) ==> meanRank=3
-            # - startRunIdx=1, currIdx=5 ==> mean(2,3,4,5) ==> meanRank=3.5
-            # - startRunIdx=1, currIdx=6 ==> mean(2,3,4,5,6) ==> meanRank=4
-            meanRank = 0.5 * (startRunIdx + currIdx + 1)
-            while( startRunIdx < currIdx ):
-                # Note that ``srtdToActIdx[startRunIdx]`` gives an index for
-                # which *values* equals *lastVal*.
-                ranks[srtdToActIdx[startRunIdx]] = meanRank
-                startRunIdx += 1
-            # Mark start of a new run.
-            #   Note already have ``startRunIdx == currIdx``.
-            lastVal = currVal
-        #
-        # Prepare for next iteration.
-        currIdx += 1
-    #
-    # Here, still need to assign ranks for last entries inspected.
-    #   This code should exactly copy that in the loop above.  There are ways
-    # around this ugly duplication, but they are themselves ugly.
-    meanRank = 0.5 * (startRunIdx + currIdx + 1)
-    while( startRunIdx < currIdx ):
-        ranks[srtdToActIdx[startRunIdx]] = meanRank
-        startRunIdx += 1
-    #
-    # Here, *ranks* holds ranks, between 1 and *currIdx*, inclusive, for all
-    # the entries in *values*.
-    assert( currIdx == valCt )
+    # Natural ranks of a run are *startRunIdx*+1 to *endRunIdx*+1, inclusive.
+    # Assign all entries of the run the mean rank, in their actual positions.
+    # - ranks        = [1, 2.5, 5, 2.5, 4]
+    ranks = np.empty(values.shape)
+    np.put_along_axis(ranks, srtdToActIdx,
+        0.5 * (startRunIdx + endRunIdx) + 1, axis=0)
     #
     return( ranks )
     #
-    # End :func:`__rankForSpearman`.
+    # End :func:`rankColumns`.
+
+
+def _rankForSpearman(values):
+    """
+    Find the ranks of a vector *values*, as defined for Spearman rank correlation coefficient.
+
+    **Args:**
+
+    - *values*, array-like sequences of values.
+
+    **Notes:**
+
+    - Rank smallest to largest.
+    - Equal values get mean rank.
+    - Assume argument does not contain any missing or corrupt values (i.e., no ``NAN``
+      entries).
+    """
+    #
+    return( rankColumns(np.asarray(values).ravel()) )
+    #
+    # End :func:`_rankForSpearman`.
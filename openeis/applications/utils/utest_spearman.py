@@ -87,6 +87,33 @@ from testing_utils import findMean, findCorrelationCoeff
 import spearman
 import numpy as np
 
+
+def _loopRankForSpearman(values):
+    """
+    The original loop-based ranking, kept as a reference for equivalence tests.
+    """
+    valCt = len(values)
+    srtdToActIdx = np.argsort(values)
+    ranks = np.zeros(valCt)
+    lastVal = values[srtdToActIdx[0]]
+    startRunIdx = 0
+    currIdx = 1
+    while( currIdx < valCt ):
+        currVal = values[srtdToActIdx[currIdx]]
+        if( currVal > lastVal ):
+            meanRank = 0.5 * (startRunIdx + currIdx + 1)
+            while( startRunIdx < currIdx ):
+                ranks[srtdToActIdx[startRunIdx]] = meanRank
+                startRunIdx += 1
+            lastVal = currVal
+        currIdx += 1
+    meanRank = 0.5 * (startRunIdx + currIdx + 1)
+    while( startRunIdx < currIdx ):
+        ranks[srtdToActIdx[startRunIdx]] = meanRank
+        startRunIdx += 1
+    return( ranks )
+
+
 class TestSpearmanRank(AppTestBase):
 
     # Test ranking
@@ -182,3 +209,49 @@ class TestSpearmanRank(AppTestBase):
         spearExpect = findCorrelationCoeff(ranksMean1, ranksMean2, True)
         self.nearly_same(spear1_2, spearExpect, absTol=1e-18, relTol=1e-12)
         self.nearly_same(spear2_1, spearExpect, absTol=1e-18, relTol=1e-12)
+
+
+class TestSpearmanEquivalence(AppTestBase):
+
+    def _rows(self):
+        # Random rows of several lengths, with and without many ties.
+        rng = np.random.RandomState(0)
+        for valCt in [2, 3, 10, 101, 1000]:
+            yield rng.uniform(size=valCt)
+            yield rng.randint(0, 3, size=valCt).astype(float)
+            yield rng.randint(0, max(valCt//4, 2), size=valCt)
+
+    # Test ranking against the original loop
+    def test_rank_matches_loop(self):
+        for row in self._rows():
+            ranks = spearman._rankForSpearman(row)
+            self.assertTrue(np.array_equal(ranks, _loopRankForSpearman(row)))
+
+    def test_rank_columns(self):
+        rng = np.random.RandomState(1)
+        values = rng.randint(0, 20, size=(200, 6))
+        ranks = spearman.rankColumns(values)
+        for col in range(values.shape[1]):
+            self.assertTrue(np.array_equal(ranks[:,col],
+                _loopRankForSpearman(values[:,col])))
+
+    # Test batched coefficients against single ones
+    def test_coeffs_match_single(self):
+        rng = np.random.RandomState(2)
+        xValues = rng.randint(0, 20, size=(200, 6))
+        yValues = xValues + rng.normal(scale=5.0, size=xValues.shape)
+        coeffs = spearman.findSpearmanRanks(xValues, yValues)
+        for col in range(xValues.shape[1]):
+            coeff = spearman.findSpearmanRank(xValues[:,col], yValues[:,col])
+            self.assertTrue(self.nearly_same(coeffs[col], coeff,
+                absTol=1e-18, relTol=1e-12))
+
+    def test_coeffs_shared_series(self):
+        rng = np.random.RandomState(3)
+        xValues = rng.uniform(size=(100, 4))
+        yValues = rng.randint(0, 10, size=100)
+        coeffs = spearman.findSpearmanRanks(xValues, yValues)
+        for col in range(xValues.shape[1]):
+            coeff = spearman.findSpearmanRank(xValues[:,col], yValues)
+            self.assertTrue(self.nearly_same(coeffs[col], coeff,
+                absTol=1e-18, relTol=1e-12))
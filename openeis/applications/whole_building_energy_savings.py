@@ -99,6 +99,7 @@ import datetime as dt
 from django.db.models import Avg
 from openeis.applications.utils.baseline_models import day_time_temperature_model as ttow
 from openeis.applications.utils import conversion_utils as cu
+from openeis.projects.storage import fits
 
 
 
@@ -230,22 +231,21 @@ class Application(DriverApplicationBaseClass):
 
         return report_list
 
-    def execute(self):
-        # Called after User hits GO
+    def _get_values(self, filter_=None):
         """
-        Calculates weather sensitivity using Spearman rank.
-        Also, outputs data points for energy signature scatter plot.
+        Return lists of the times, loads [kW] and outside air temperatures [F]
+        of hours having both, optionally filtered by `filter_`.
         """
-        self.out.log("Starting application: whole building energy savings.", logging.INFO)
-
         # Gather loads and outside air temperatures. Reduced to an hourly average
         self.out.log("Querying database.", logging.INFO)
         load_query = self.inp.get_query_sets('load', group_by='hour',
                                              group_by_aggregation=Avg,
+                                             filter_=filter_,
                                              exclude={'value':None},
                                              wrap_for_merge=True)
         oat_query = self.inp.get_query_sets('oat', group_by='hour',
                                              group_by_aggregation=Avg,
+                                             filter_=filter_,
                                              exclude={'value':None},
                                              wrap_for_merge=True)
 
@@ -286,42 +286,85 @@ class Application(DriverApplicationBaseClass):
             oat_values.append(convertedTemp)
             datetime_values.append(x['time'])
 
-        indexList = {}
-        indexList['trainingStart'] = ttow.findDateIndex(datetime_values, self.baseline_start)
-        self.out.log('@trainingStart '+str(indexList['trainingStart']), logging.INFO)
-        indexList['trainingStop'] = ttow.findDateIndex(datetime_values, self.baseline_stop)
-        self.out.log('@trainingStop '+str(indexList['trainingStop']), logging.INFO)
-        indexList['predictStart'] = ttow.findDateIndex(datetime_values, self.savings_start)
-        self.out.log('@predictStart '+str(indexList['predictStart']), logging.INFO)
-        indexList['predictStop'] = ttow.findDateIndex(datetime_values, self.savings_stop)
-        self.out.log('@predictStop '+str(indexList['predictStop']), logging.INFO)
-
-        for indx in indexList.keys():
-            if indexList[indx] == None:
-                self.out.log("Date not found in the datelist", logging.WARNING)
-
-        # Break up data into training and prediction periods.
-        timesTrain = datetime_values[indexList['trainingStart']:indexList['trainingStop']]
-        timesPredict = datetime_values[indexList['predictStart']:indexList['predictStop']]
-
-        valsTrain = load_values[indexList['trainingStart']:indexList['trainingStop']]
-        valsActual = load_values[indexList['predictStart']:indexList['predictStop']]
-
-        oatsTrain = oat_values[indexList['trainingStart']:indexList['trainingStop']]
-        oatsPredict = oat_values[indexList['predictStart']:indexList['predictStop']]
-
-        # Generate other information needed for model.
-        timeStepMinutes = (timesTrain[1] - timesTrain[0]).total_seconds()/60
-        # TODO: Should this be calculated in the utility function
+        return datetime_values, load_values, oat_values
+
+    def execute(self):
+        # Called after User hits GO
+        """
+        Calculates weather sensitivity using Spearman rank.
+        Also, outputs data points for energy signature scatter plot.
+        """
+        self.out.log("Starting application: whole building energy savings.", logging.INFO)
+
+        base_topic = self.inp.get_topics()
         binCt = 6  # TODO: Allow caller to pass this in as an argument.
 
-        # Form the temperature-time-of-week model.
-        self.out.log("Finding baseline model", logging.INFO)
-        ttowModel = ttow.formModel(timesTrain,
-                                   oatsTrain,
-                                   valsTrain,
-                                   timeStepMinutes,
-                                   binCt)
+        # Reuse the baseline model fit by an earlier analysis of this
+        # dataset with the same inputs and training period, in which case
+        # only the savings period needs to be queried.
+        dataset = getattr(self.inp, 'dataset', None)
+        fitKey = fits.key('ttow', base_topic, self.baseline_start,
+                          self.baseline_stop, 'hour', binCt)
+        ttowModel = None
+        if dataset is not None:
+            ttowModel = fits.get(dataset, fitKey)
+        if ttowModel is not None:
+            self.out.log("Using cached baseline model", logging.INFO)
+            savingsFilter = {
+                'time__gte': self.savings_start.replace(tzinfo=dt.timezone.utc),
+                'time__lt': (self.savings_stop.replace(tzinfo=dt.timezone.utc) +
+                             dt.timedelta(days=1))
+                }
+            datetime_values, load_values, oat_values = self._get_values(
+                filter_=savingsFilter)
+            predictStart = ttow.findDateIndex(datetime_values, self.savings_start)
+            predictStop = ttow.findDateIndex(datetime_values, self.savings_stop)
+            if predictStart is None or predictStop is None:
+                # The savings period starts on a day without data, so its
+                # bounds depend on data before it.
+                ttowModel = None
+
+        if ttowModel is None:
+            datetime_values, load_values, oat_values = self._get_values()
+
+            indexList = {}
+            indexList['trainingStart'] = ttow.findDateIndex(datetime_values, self.baseline_start)
+            self.out.log('@trainingStart '+str(indexList['trainingStart']), logging.INFO)
+            indexList['trainingStop'] = ttow.findDateIndex(datetime_values, self.baseline_stop)
+            self.out.log('@trainingStop '+str(indexList['trainingStop']), logging.INFO)
+            indexList['predictStart'] = ttow.findDateIndex(datetime_values, self.savings_start)
+            self.out.log('@predictStart '+str(indexList['predictStart']), logging.INFO)
+            indexList['predictStop'] = ttow.findDateIndex(datetime_values, self.savings_stop)
+            self.out.log('@predictStop '+str(indexList['predictStop']), logging.INFO)
+
+            for indx in indexList.keys():
+                if indexList[indx] == None:
+                    self.out.log("Date not found in the datelist", logging.WARNING)
+
+            # Break up data into training and prediction periods.
+            timesTrain = datetime_values[indexList['trainingStart']:indexList['trainingStop']]
+            valsTrain = load_values[indexList['trainingStart']:indexList['trainingStop']]
+            oatsTrain = oat_values[indexList['trainingStart']:indexList['trainingStop']]
+            predictStart = indexList['predictStart']
+            predictStop = indexList['predictStop']
+
+            # Generate other information needed for model.
+            timeStepMinutes = (timesTrain[1] - timesTrain[0]).total_seconds()/60
+            # TODO: Should this be calculated in the utility function
+
+            # Form the temperature-time-of-week model.
+            self.out.log("Finding baseline model", logging.INFO)
+            ttowModel = ttow.formModel(timesTrain,
+                                       oatsTrain,
+                                       valsTrain,
+                                       timeStepMinutes,
+                                       binCt)
+            if dataset is not None:
+                fits.put(dataset, fitKey, ttowModel)
+
+        timesPredict = datetime_values[predictStart:predictStop]
+        valsActual = load_values[predictStart:predictStop]
+        oatsPredict = oat_values[predictStart:predictStop]
 
         # Apply the model.
         self.out.log("Applying baseline model", logging.INFO)
@@ -329,10 +372,12 @@ class Application(DriverApplicationBaseClass):
 
         # Output for scatter plot
         prevSum = 0
+        local_times = self.inp.localize_sensor_times(base_topic['load'][0],
+                                                     timesPredict)
         for ctr in range(len(timesPredict)):
             # Calculate cumulative savings.
             prevSum += (valsPredict[ctr] - valsActual[ctr])
-            local_time = str(self.inp.localize_sensor_time(base_topic['load'][0], timesPredict[ctr]))
+            local_time = str(local_times[ctr])
             self.out.insert_row("DayTimeTemperatureModel", {
                                 "datetimeValues": local_time,
                                 "measured": valsActual[ctr],
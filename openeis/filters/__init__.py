@@ -56,8 +56,10 @@
 
 
 import abc
+import importlib
 import logging
-import pkgutil, importlib
+import threading
+from collections.abc import Mapping
 
 from openeis.core.descriptors import (ConfigDescriptorBaseClass,
                                       SelfDescriptorBaseClass)
@@ -92,22 +94,77 @@ class SimpleRuleFilter(BaseFilter, metaclass=abc.ABCMeta):
     def filter_type(cls):
         return "other"
 
-column_modifiers = {}
+class ColumnModifierRegistry(Mapping):
+    '''Map filter names to classes, importing filter modules on demand.
+
+    Filters are declared by name and module in FILTERS, so that the
+    available filters are known without importing any module. A module
+    is imported when one of its filters is first looked up, at which
+    point its classes add themselves with register_column_modifier().
+    '''
+
+    def __init__(self, package, declared):
+        self._package = package
+        self._declared = dict(declared)
+        self._classes = {}
+        self._lock = threading.RLock()
+
+    def register(self, klass):
+        self._classes[klass.__name__] = klass
+        return klass
+
+    def __getitem__(self, name):
+        try:
+            return self._classes[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._classes and name in self._declared:
+                module = self._declared[name]
+                try:
+                    importlib.import_module('.' + module, self._package)
+                except Exception as e:
+                    logging.error('Module {name} cannot be imported. Reason: {ex}'.format(name=module, ex=e))
+                    del self._declared[name]
+            return self._classes[name]
+
+    def _names(self):
+        names = dict.fromkeys(self._declared)
+        names.update(dict.fromkeys(self._classes))
+        return list(names)
 
-def register_column_modifier(klass):
-    column_modifiers[klass.__name__] = klass
-    return klass
-
-_extList = [name for _, name, _ in pkgutil.iter_modules(__path__)]
-
-extDict = {}
-
-for extName in _extList:
-    print('Importing module: ', extName)
-    try:
-        module = __import__(extName,globals(),locals(),[], 1)
-    except Exception as e:
-        logging.error('Module {name} cannot be imported. Reason: {ex}'.format(name=extName, ex=e))
-        continue
+    def __iter__(self):
+        # Filters whose module fails to import are dropped.
+        for name in self._names():
+            try:
+                self[name]
+            except KeyError:
+                continue
+            yield name
+
+    def __len__(self):
+        # Not sum(): once imported, the sum filter module is bound to the
+        # package attribute sum, which hides the builtin here.
+        return len(list(iter(self)))
+
+    def __contains__(self, name):
+        return name in self._classes or name in self._declared
+
+
+# Filter class names and the modules defining them.
+FILTERS = {
+    'All': 'all_filter',
+    'Any': 'any_filter',
+    'Average': 'average',
+    'LinearInterpolation': 'linear_interpolation',
+    'NotAll': 'not_all_filter',
+    'NotAny': 'not_any_filter',
+    'RepeatPrevious': 'repeat_previous',
+    'RoundOff': 'round_off',
+    'Sum': 'sum',
+}
+
+column_modifiers = ColumnModifierRegistry(__name__, FILTERS)
 
-    extDict[extName] = module
\ No newline at end of file
+def register_column_modifier(klass):
+    return column_modifiers.register(klass)
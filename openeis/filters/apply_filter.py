@@ -55,6 +55,7 @@
 
 import datetime
 from openeis.projects import models
+from openeis.projects.storage import fits, snapshot
 from openeis.filters import column_modifiers
 from pytz import timezone
 
@@ -88,6 +89,9 @@ def apply_filter_config(dataset_id,config):
     sensoringest.id = None
     sensoringest.map = datamap
     sensoringest.save()
+    # Remove any snapshot or fits left by a deleted ingest with the same key.
+    snapshot.invalidate(sensoringest.id)
+    fits.invalidate(sensoringest.id)
 
 
 
@@ -123,8 +127,6 @@ def _iter_data(sensordata, tz_str):
 def _create_and_update_filters(generators, configs):
     errors = []
 
-    print("column mods: ", column_modifiers)
-
     for topic, filter_name, filter_config in configs:
         if not isinstance(topic, str):
             topic = topic[0]
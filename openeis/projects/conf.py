@@ -55,13 +55,68 @@
 
 '''Package-level settings with package defaults.'''
 
+import os
+
 from django.conf import settings as _settings
 
 __all__ = ('settings',)
 
 _DEFAULTS = {
+    # JSON file caching the application descriptions returned by the
+    # API, or None to import the applications to describe them.
+    'APPLICATION_MANIFEST': (
+        os.path.join(_settings.DATA_DIR, 'applications.json')
+        if hasattr(_settings, 'DATA_DIR') else None),
+    # Directory of memory-mapped snapshots of datasets read by analyses,
+    # or None to always query the database; see storage.snapshot.
+    'DATASET_SNAPSHOT_DIR': (
+        os.path.join(_settings.DATA_DIR, 'snapshots')
+        if hasattr(_settings, 'DATA_DIR') else None),
+    # Directory of models fit to datasets by analyses, reused by later
+    # analyses of the same dataset, or None to always fit; see
+    # storage.fits.
+    'FIT_CACHE_DIR': (
+        os.path.join(_settings.DATA_DIR, 'fits')
+        if hasattr(_settings, 'DATA_DIR') else None),
     'FILE_HEAD_ROWS_DEFAULT': 15,
     'FILE_HEAD_ROWS_MAX': 30,
+    # Store sensor readings one per row ('rows') or packed into
+    # compressed chunks ('chunks'); see storage.chunks.
+    'SENSOR_DATA_STORAGE': 'rows',
+    # Seconds of readings per chunk.
+    'SENSOR_DATA_CHUNK_SPAN': 7 * 24 * 3600,
+    # Maintain hourly and daily rollups of numeric readings, from which
+    # grouped queries are answered; see storage.rollups.
+    'SENSOR_DATA_ROLLUPS': True,
+    # Number of processes parsing files during ingestion; 1 parses in
+    # the ingesting thread and None uses one process per CPU.
+    'INGEST_PROCESSES': 1,
+    # Files are split into ranges of about this many bytes to be parsed
+    # in parallel.
+    'INGEST_SPLIT_SIZE': 16 * 1024 * 1024,
+    # Rows parsed at a time by the vectorized column parsers; None parses
+    # cell by cell.
+    'INGEST_BLOCK_SIZE': 1000,
+    # Write ingested readings with the database's bulk path ('bulk') or
+    # with bulk_create() ('orm'), in batches of INGEST_BATCH_SIZE.
+    'INGEST_LOADER': 'bulk',
+    'INGEST_BATCH_SIZE': 50000,
+    # Number of analyses run at once by each worker pool and the most
+    # any one user may have running; 0 places no limit on users.
+    'ANALYSIS_PROCESSES': 2,
+    'ANALYSIS_USER_LIMIT': 1,
+    # Seconds between checks of the analysis queue and after which a
+    # running job whose pool stopped reporting is failed.
+    'ANALYSIS_POLL_INTERVAL': 1.0,
+    'ANALYSIS_HEARTBEAT_TIMEOUT': 60,
+    # Run a worker pool in each web server process; when false, the
+    # runanalyses command must be run to process queued analyses.
+    'ANALYSIS_POOL_EMBEDDED': True,
+    # Record the time, queries and rows of each stage of an analysis
+    # with the analysis and in its debug zip; see metrics.
+    'ANALYSIS_METRICS': True,
+    # Rows fetched per query when returning analysis output.
+    'OUTPUT_BATCH_SIZE': 10000,
 }
 
 
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Database-backed queue of analyses run by a pool of worker processes.
+
+Creating an analysis queues an AnalysisJob, which a WorkerPool claims
+and runs in a child process, so a long-running application neither
+holds the GIL of the web server nor is lost with the thread that
+started it. Job state is kept in the database: queued jobs survive a
+restart and jobs whose pool stopped reporting are marked as failed by
+the next pool to run.
+
+The pool runs in a daemon thread of the web server, started with the
+server's WSGI application (see start_server_pool()), unless the
+ANALYSIS_POOL_EMBEDDED setting is false, in which case the runanalyses
+management command must be run to process the queue.
+'''
+
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import traceback
+
+from django.db import connections
+from django.db.models import Count
+from django.utils.timezone import utc
+
+from openeis.applications import get_algorithm_class
+from . import models, serializers
+from .conf import settings as proj_settings
+from .metrics import Metrics, instrument
+from .storage.db_input import DatabaseInput
+from .storage.db_output import DatabaseOutputZip
+
+
+__all__ = ['enqueue', 'cancel', 'claim', 'fail_stale', 'WorkerPool',
+           'start_embedded_pool', 'start_server_pool']
+
+_log = logging.getLogger(__name__)
+
+Job = models.AnalysisJob
+
+
+def _now():
+    return datetime.datetime.utcnow().replace(tzinfo=utc)
+
+
+def enqueue(analysis, priority=0):
+    '''Queue analysis to be run and return the new job.
+
+    Jobs with a higher priority are run first.
+    '''
+    job = Job.objects.create(analysis=analysis, priority=priority,
+                             user_id=analysis.project.owner_id)
+    if proj_settings.ANALYSIS_POOL_EMBEDDED:
+        start_embedded_pool()
+    return job
+
+
+def cancel(analysis):
+    '''Cancel the job running analysis.
+
+    Queued jobs are canceled immediately; running jobs are flagged and
+    terminated by their pool. Returns False if the job already ended.
+    '''
+    now = _now()
+    jobs = Job.objects.filter(analysis=analysis)
+    if jobs.filter(state=Job.QUEUED).update(
+            state=Job.CANCELED, cancel_requested=True, heartbeat=now):
+        models.Analysis.objects.filter(pk=analysis.pk).update(ended=now)
+        return True
+    return bool(jobs.filter(state=Job.RUNNING).update(cancel_requested=True))
+
+
+def claim(worker, user_limit=None):
+    '''Mark the next runnable job as running by worker and return it.
+
+    Jobs are claimed in order of descending priority, then in the order
+    they were queued, skipping those of users already running
+    user_limit jobs. None is returned if no job can be run.
+    '''
+    if user_limit is None:
+        user_limit = proj_settings.ANALYSIS_USER_LIMIT
+    queued = Job.objects.filter(state=Job.QUEUED)
+    if user_limit:
+        busy = (Job.objects.filter(state=Job.RUNNING).values('user')
+                .annotate(running=Count('pk')).filter(running__gte=user_limit))
+        queued = queued.exclude(user__in=[row['user'] for row in busy])
+    candidates = queued.order_by('-priority', 'queued', 'pk')
+    for pk in candidates.values_list('pk', flat=True)[:10]:
+        # Another worker may claim the job first; only the update which
+        # sees the job still queued succeeds.
+        if Job.objects.filter(pk=pk, state=Job.QUEUED).update(
+                state=Job.RUNNING, worker=worker, heartbeat=_now()):
+            return Job.objects.select_related('analysis').get(pk=pk)
+    return None
+
+
+def _finish(pk, state):
+    '''Record the end of a job, unless it was already finished.'''
+    now = _now()
+    if Job.objects.filter(pk=pk, state=Job.RUNNING).update(
+            state=state, heartbeat=now):
+        models.Analysis.objects.filter(pk=pk, ended=None).update(ended=now)
+
+
+def fail_stale(timeout=None):
+    '''Fail running jobs whose pool has not reported within timeout seconds.
+
+    Such jobs were orphaned by a pool which stopped or was restarted.
+    Returns the number of jobs failed.
+    '''
+    if timeout is None:
+        timeout = proj_settings.ANALYSIS_HEARTBEAT_TIMEOUT
+    cutoff = _now() - datetime.timedelta(seconds=timeout)
+    stale = list(Job.objects.filter(state=Job.RUNNING, heartbeat__lt=cutoff)
+                 .values_list('pk', 'cancel_requested'))
+    for pk, canceled in stale:
+        _log.warning('analysis %s was orphaned by its worker', pk)
+        _finish(pk, Job.CANCELED if canceled else Job.FAILED)
+    return len(stale)
+
+
+def _perform_analysis(analysis):
+    '''Run the application of analysis and return True if it succeeded.'''
+    succeeded = False
+    analysis.started = _now()
+    analysis.save()
+    try:
+        db_input = DatabaseInput(analysis.dataset.map.id,
+                analysis.configuration["inputs"], analysis.dataset.id)
+        klass = get_algorithm_class(analysis.application)
+        output_format = klass.output_format(db_input)
+        kwargs = analysis.configuration['parameters']
+        db_output = DatabaseOutputZip(analysis, output_format, analysis.configuration)
+
+        metrics = None
+        try:
+            app = klass(db_input, db_output, **kwargs)
+            if proj_settings.ANALYSIS_METRICS:
+                metrics = Metrics()
+                instrument(metrics, db_input, db_output, app)
+            app.run_application()
+            analysis.reports = [serializers.ReportSerializer(report).data
+                                for report in klass.reports(output_format)]
+            succeeded = True
+        except Exception:
+            db_output.appenFileToZip("stackTrace.txt", traceback.format_exc())
+        if metrics is not None:
+            metrics.close()
+            analysis.metrics = metrics.as_dict()
+            db_output.appenFileToZip(
+                    "metrics.json", json.dumps(analysis.metrics, indent=2))
+    finally:
+        analysis.ended = _now()
+        analysis.save()
+    return succeeded
+
+
+def _run_job(pk):
+    '''Body of the worker process running the job with the given key.'''
+    state = Job.FAILED
+    try:
+        analysis = models.Analysis.objects.get(pk=pk)
+        if _perform_analysis(analysis):
+            state = Job.FINISHED
+    except Exception:
+        _log.exception('analysis %s failed', pk)
+    finally:
+        _finish(pk, state)
+        for connection in connections.all():
+            connection.close()
+
+
+class WorkerPool:
+    '''Run queued analyses in a pool of worker processes.
+
+    Each claimed job runs in its own child process, which is terminated
+    if the job is canceled or deleted. Call run() to process the queue
+    until stop() is called, or poll() to start and reap jobs once.
+    '''
+
+    def __init__(self, processes=None, user_limit=None, poll_interval=None,
+                 name=None):
+        self.processes = processes or proj_settings.ANALYSIS_PROCESSES
+        self.user_limit = user_limit
+        self.poll_interval = (proj_settings.ANALYSIS_POLL_INTERVAL
+                              if poll_interval is None else poll_interval)
+        self.name = name or '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.children = {}
+        self._stopped = threading.Event()
+
+    def poll(self):
+        '''Reap finished jobs, terminate canceled ones and start new jobs.'''
+        for pk, process in list(self.children.items()):
+            if not process.is_alive():
+                process.join()
+                del self.children[pk]
+                if process.exitcode:
+                    _finish(pk, Job.FAILED)
+        if self.children:
+            active = set(Job.objects.filter(
+                pk__in=list(self.children), state=Job.RUNNING,
+                cancel_requested=False).values_list('pk', flat=True))
+            for pk in set(self.children) - active:
+                _log.info('terminating canceled analysis %s', pk)
+                self._terminate(pk, Job.CANCELED)
+            Job.objects.filter(pk__in=list(self.children)).update(
+                heartbeat=_now())
+        fail_stale()
+        while len(self.children) < self.processes:
+            job = claim(self.name, self.user_limit)
+            if job is None:
+                break
+            self._start(job.pk)
+
+    def _start(self, pk):
+        # Connections must not be shared with the child; both sides
+        # reconnect when next used.
+        for connection in connections.all():
+            connection.close()
+        process = multiprocessing.Process(
+            target=_run_job, args=(pk,), name='analysis-{}'.format(pk))
+        process.start()
+        self.children[pk] = process
+
+    def _terminate(self, pk, state):
+        process = self.children.pop(pk)
+        process.terminate()
+        process.join()
+        _finish(pk, state)
+
+    def run(self):
+        '''Process the queue until stop() is called.'''
+        self._stopped.clear()
+        try:
+            while not self._stopped.is_set():
+                try:
+                    self.poll()
+                except Exception:
+                    _log.exception('error processing analysis queue')
+                self._stopped.wait(self.poll_interval)
+        finally:
+            for pk in list(self.children):
+                self._terminate(pk, Job.FAILED)
+
+    def stop(self):
+        '''Stop run(), failing the jobs still running.'''
+        self._stopped.set()
+
+
+_embedded_pool = None
+_embedded_lock = threading.Lock()
+
+def start_embedded_pool():
+    '''Start a pool in a daemon thread of this process, if not running.'''
+    global _embedded_pool
+    with _embedded_lock:
+        if _embedded_pool is None:
+            _embedded_pool = WorkerPool()
+            threading.Thread(target=_embedded_pool.run, daemon=True,
+                             name='analysis-pool').start()
+    return _embedded_pool
+
+
+def start_server_pool():
+    '''Start the embedded pool, if enabled, when the server starts.
+
+    Jobs queued before a restart are then run, and jobs orphaned by it
+    failed, without waiting for another analysis to be queued.
+    '''
+    if proj_settings.ANALYSIS_POOL_EMBEDDED:
+        return start_embedded_pool()
+    return None
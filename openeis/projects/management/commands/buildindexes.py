@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''
+Create the indexes declared by the project models, including the
+dynamically created application output tables, on an existing database.
+syncdb only creates indexes along with new tables, so databases created
+before an index was added to a model lack it. Indexes which already
+exist, by name, are skipped.
+'''
+
+from optparse import make_option
+import re
+
+from django.core.management.base import CommandError, NoArgsCommand
+from django.core.management.color import no_style
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import get_app, get_models
+
+from openeis.projects import models
+
+
+# get_indexes() only introspects single-column indexes, so the names of
+# all the indexes of a table are read from the catalog instead.
+_INDEX_NAMES_SQL = {
+    'sqlite': "SELECT name FROM sqlite_master "
+              "WHERE type = 'index' AND tbl_name = %s",
+    'postgresql': "SELECT indexname FROM pg_indexes WHERE tablename = %s",
+    'mysql': "SELECT DISTINCT index_name FROM information_schema.statistics "
+             "WHERE table_schema = DATABASE() AND table_name = %s",
+}
+
+_CREATE_INDEX_RE = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+(\S+)', re.I)
+
+
+def index_names(connection, cursor, table):
+    '''Return the names of the indexes on table.'''
+    cursor.execute(_INDEX_NAMES_SQL[connection.vendor], [table])
+    return {row[0] for row in cursor.fetchall()}
+
+
+def index_name(sql):
+    '''Return the unquoted name of the index created by sql.'''
+    return _CREATE_INDEX_RE.match(sql.strip()).group(1).strip('"`[]')
+
+
+class Command(NoArgsCommand):
+    help = 'Create missing indexes on sensor data and output tables.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--database', default=DEFAULT_DB_ALIAS,
+                    help='Database to create the indexes in.'),
+        make_option('-n', '--dry-run', action='store_true', default=False,
+                    help='Print the SQL without executing it.'),
+    )
+
+    def handle_noargs(self, *, verbosity=1, database=DEFAULT_DB_ALIAS,
+                      dry_run=False, **options):
+        verbosity = int(verbosity)
+        connection = connections[database]
+        if connection.vendor not in _INDEX_NAMES_SQL:
+            raise CommandError('Indexes of {} databases cannot be '
+                               'listed'.format(connection.vendor))
+        style = no_style()
+        tables = set(connection.introspection.table_names())
+        data_models = [model for model in get_models(get_app('projects'))
+                       if model._meta.db_table in tables]
+        seen = set()
+        for output in models.AppOutput.objects.using(database).all():
+            model = output.get_data_model(using=database)
+            if model._meta.db_table not in seen:
+                seen.add(model._meta.db_table)
+                data_models.append(model)
+        created = 0
+        cursor = connection.cursor()
+        for model in data_models:
+            existing = index_names(connection, cursor, model._meta.db_table)
+            for sql in connection.creation.sql_indexes_for_model(model, style):
+                if index_name(sql) in existing:
+                    continue
+                if dry_run:
+                    self.stdout.write(sql)
+                    continue
+                cursor.execute(sql)
+                created += 1
+                if verbosity >= 2:
+                    self.stdout.write(sql)
+        if verbosity >= 1 and not dry_run:
+            self.stdout.write('Created {} indexes'.format(created))
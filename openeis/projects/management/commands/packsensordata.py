@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''
+Pack the numeric and boolean readings of one or more datasets, stored one
+per row, into compressed SensorDataChunk objects and remove the rows.
+String readings are left as rows. If no dataset IDs are given, all
+datasets are packed.
+'''
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from openeis.projects import models
+from openeis.projects.conf import settings as proj_settings
+from openeis.projects.storage.chunks import ChunkWriter, DTYPES
+
+
+class Command(BaseCommand):
+    args = '[DATASET_ID ...]'
+    help = 'Pack sensor readings into compressed chunks.'
+    option_list = BaseCommand.option_list + (
+        make_option('--span', type='int',
+                    default=proj_settings.SENSOR_DATA_CHUNK_SPAN,
+                    help='Seconds of readings per chunk.'),
+    )
+
+    def handle(self, *args, verbosity=1, span=None, **options):
+        verbosity = int(verbosity)
+        try:
+            ids = [int(arg) for arg in args]
+        except ValueError as e:
+            raise CommandError(e)
+        ingests = models.SensorIngest.objects.all()
+        if ids:
+            ingests = ingests.filter(id__in=ids)
+        for ingest in ingests:
+            with transaction.atomic():
+                writer = ChunkWriter(models.SensorDataChunk, span=span)
+                count = 0
+                for sensor in ingest.map.sensors.all():
+                    if sensor.data_type not in DTYPES:
+                        continue
+                    rows = sensor.data_class.objects.filter(
+                            sensor=sensor, ingest=ingest)
+                    for time, value in rows.order_by('time').values_list(
+                            'time', 'value').iterator():
+                        writer.add(sensor, ingest, time, value)
+                        count += 1
+                    writer.close()
+                    rows.delete()
+            if verbosity >= 1:
+                self.stdout.write('Packed {} readings of dataset {} into {} '
+                                  'chunks'.format(count, ingest.id,
+                                                  writer.chunk_count))
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Timers and counters for the stages of an analysis run.
+
+A Metrics object accumulates, for each named stage, the wall time, the
+number of calls, the database queries issued and the rows read or
+written, along with latency histograms. instrument() attaches one to
+the DatabaseInput, DatabaseOutput and application of a run:
+
+    query     DatabaseInput.get_query_sets()
+    merge     DatabaseInput.merge(), merge_fill_in_data() and
+              merge_arrays(), including iteration of the merged rows,
+              which is when querysets are usually evaluated; rows read
+              are the merged rows and queries are those issued until
+              the rows are exhausted
+    execute   the application's execute(), inclusive of the above
+    output    DatabaseOutput.insert_row() and close(); rows written
+              are the rows inserted
+
+and a 'run' histogram of the latency of each run() call of driven
+applications. Querysets evaluated by an application directly are
+counted in execute only.
+'''
+
+import contextlib
+import functools
+import time
+
+from django.db import connections
+
+
+__all__ = ['Metrics', 'Histogram', 'instrument']
+
+
+class Histogram:
+    '''Count latencies in power of two buckets of microseconds.'''
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, seconds):
+        bucket = 1 << max(int(seconds * 1000000), 1).bit_length() - 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if self.minimum is None or seconds < self.minimum:
+            self.minimum = seconds
+        if self.maximum is None or seconds > self.maximum:
+            self.maximum = seconds
+
+    def as_dict(self):
+        '''Return the histogram, with buckets keyed by their lower bound
+        in microseconds.'''
+        return {
+            'count': self.count,
+            'seconds': self.total,
+            'minimum': self.minimum,
+            'maximum': self.maximum,
+            'buckets': {str(bucket): count for bucket, count
+                        in sorted(self.buckets.items())},
+        }
+
+
+class Metrics:
+    '''Accumulate the time, calls, queries and rows of named stages.
+
+    If count_queries is true, queries are counted by enabling the debug
+    cursor of each database connection until close() is called; the
+    recorded queries are discarded as they are counted so memory use
+    does not grow.
+    '''
+
+    def __init__(self, count_queries=True):
+        self.stages = {}
+        self.histograms = {}
+        self.count_queries = count_queries
+        self._queries = 0
+        self._active = set()
+        self._debug_cursors = []
+        if count_queries:
+            for connection in connections.all():
+                self._debug_cursors.append(
+                        (connection, connection.use_debug_cursor))
+                connection.use_debug_cursor = True
+
+    def close(self):
+        '''Count outstanding queries and restore the debug cursors.'''
+        self.queries()
+        self.count_queries = False
+        for connection, use_debug_cursor in self._debug_cursors:
+            connection.use_debug_cursor = use_debug_cursor
+        self._debug_cursors = []
+
+    def queries(self):
+        '''Return the number of queries issued since creation.'''
+        if self.count_queries:
+            for connection in connections.all():
+                self._queries += len(connection.queries)
+                del connection.queries[:]
+        return self._queries
+
+    def _stats(self, name):
+        try:
+            return self.stages[name]
+        except KeyError:
+            stats = self.stages[name] = {
+                'seconds': 0.0, 'calls': 0, 'queries': 0, 'rows': 0}
+            return stats
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=0):
+        '''Time the body as a call of the named stage.
+
+        Only the outermost of nested calls of a stage is counted.
+        '''
+        stats = self._stats(name)
+        if name in self._active:
+            yield stats
+            return
+        self._active.add(name)
+        queries = self.queries()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats['seconds'] += time.perf_counter() - start
+            stats['calls'] += 1
+            stats['queries'] += self.queries() - queries
+            stats['rows'] += rows
+            self._active.discard(name)
+
+    def add_rows(self, name, rows):
+        self._stats(name)['rows'] += rows
+
+    def histogram(self, name):
+        try:
+            return self.histograms[name]
+        except KeyError:
+            histogram = self.histograms[name] = Histogram()
+            return histogram
+
+    def timed(self, name, func, rows=0):
+        '''Return func wrapped to run as a call of the named stage.'''
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.stage(name, rows):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def latency(self, name, func):
+        '''Return func wrapped to add its latency to a histogram.'''
+        histogram = self.histogram(name)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.add(time.perf_counter() - start)
+        return wrapper
+
+    def merged(self, name, func):
+        '''Return a merge function wrapped to time the merge and the
+        iteration of its rows as the named stage.
+
+        Merges made while the stage is active, such as by another merge,
+        are returned unwrapped.
+        '''
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if name in self._active:
+                return func(*args, **kwargs)
+            with self.stage(name):
+                result = func(*args, **kwargs)
+            if isinstance(result, dict):
+                times = result.get('time')
+                self.add_rows(name, 0 if times is None else len(times))
+                return result
+            return self._iterate(name, iter(result))
+        return wrapper
+
+    def _iterate(self, name, iterator):
+        # Rows are timed into a running total and the queries are read
+        # once the iterator is exhausted or closed, keeping the cost of
+        # each row to a pair of clock reads.
+        stats = self._stats(name)
+        active = self._active
+        clock = time.perf_counter
+        queries = self.queries()
+        seconds = 0.0
+        rows = 0
+        try:
+            while True:
+                nested = name in active
+                active.add(name)
+                start = clock()
+                try:
+                    row = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    if not nested:
+                        seconds += clock() - start
+                        active.discard(name)
+                rows += not nested
+                yield row
+        finally:
+            stats['seconds'] += seconds
+            stats['rows'] += rows
+            stats['queries'] += self.queries() - queries
+
+    def as_dict(self):
+        '''Return the metrics in a form which may be encoded as JSON.'''
+        stages = {}
+        for name, stats in self.stages.items():
+            stages[name] = dict(stats, rows_per_second=(
+                stats['rows'] / stats['seconds']
+                if stats['rows'] and stats['seconds'] else None))
+        return {
+            'stages': stages,
+            'histograms': {name: histogram.as_dict() for name, histogram
+                           in self.histograms.items()},
+        }
+
+
+def instrument(metrics, db_input, db_output, app):
+    '''Record the stages of running app with metrics.
+
+    The methods are wrapped on the instances, so the classes and other
+    runs are unaffected.
+    '''
+    db_input.get_query_sets = metrics.timed(
+            'query', db_input.get_query_sets)
+    for method in ('merge', 'merge_fill_in_data', 'merge_arrays'):
+        setattr(db_input, method,
+                metrics.merged('merge', getattr(db_input, method)))
+    db_output.insert_row = metrics.timed(
+            'output', db_output.insert_row, rows=1)
+    db_output.close = metrics.timed('output', db_output.close)
+    app.execute = metrics.timed('execute', app.execute)
+    if callable(getattr(app, 'run', None)):
+        app.run = metrics.latency('run', app.run)
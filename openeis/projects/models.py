@@ -70,11 +70,13 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.db import connections, models, transaction
 from django.db.models.query import QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import utc
 
 import jsonschema.exceptions
 
 from .protectedmedia import ProtectedFileSystemStorage
-from .storage import dynamictables, sensormap
+from .storage import chunks, dynamictables, fits, sensormap, snapshot
 from .storage.csvfile import CSVFile
 
 
@@ -292,8 +294,28 @@ class SensorIngest(models.Model):
     # time of ingest
     start = models.DateTimeField(auto_now_add=True)
     end = models.DateTimeField(null=True, default=None)
-
-    def merge(self, start=None, end=None, include_header=True, as_local_time = False):
+    # readings ingested and their rate, set when ingestion completes
+    rows = models.IntegerField(null=True, default=None)
+    rows_per_second = models.FloatField(null=True, default=None)
+    # incremented by readings_changed()
+    version = models.IntegerField(default=0)
+
+    def readings_changed(self):
+        '''Record a change of the readings of a complete ingest.
+
+        The data version is incremented before the snapshots and fits
+        built from the readings are removed, so one built concurrently
+        from the old readings is not used either.
+        '''
+        SensorIngest.objects.filter(pk=self.pk).update(
+            version=models.F('version') + 1)
+        self.version = SensorIngest.objects.values_list(
+            'version', flat=True).get(pk=self.pk)
+        snapshot.invalidate(self.id)
+        fits.invalidate(self.id)
+
+    def merge(self, start=None, end=None, include_header=True,
+              as_local_time = False, use_sql=True):
         '''Return an iterator over the merged dataset.
 
         If start is an integer, skip start rows. If start is a datetime
@@ -302,6 +324,11 @@ class SensorIngest(models.Model):
         of rows. If end is a date, include only rows less than the end time.
         If include_header is True (the default), also add a header row at
         the top.
+
+        If use_sql is True (the default), rows are aligned by a single
+        query ordered by time (see _merge_sql()) when the database
+        supports it. Otherwise, each sensor is queried separately and
+        the results are merged in Python.
         '''
         def _iter_data(data):
             '''Helper generator to aid in merging columns. Expects to be
@@ -363,7 +390,11 @@ class SensorIngest(models.Model):
                 #data_time = time if tz is None else time.astimezone(timezone(tz))
 
                 yield [data_time] + [d and d.value for d in [i.send(time) for i in iterators]]
-        generator = _merge()
+        generator = None
+        if use_sql:
+            generator = self._merge_sql(sensors, start, end, tz)
+        if generator is None:
+            generator = _merge()
         # Filter by start row and end count
         if isinstance(start, int):
             iterator = iter(generator)
@@ -378,12 +409,108 @@ class SensorIngest(models.Model):
                 break
             yield row
 
+    _merge_vendors = {'sqlite', 'postgresql'}
+
+    def _merge_sql(self, sensors, start=None, end=None, tz=None,
+                   fetch_size=2000):
+        '''Return a generator of merged rows using a single query.
+
+        The readings of all sensors are selected with one UNION ALL
+        query over the sensor data tables, ordered by time and sensor,
+        and consecutive readings with the same time are collected into
+        a row. PostgreSQL reads the results through a server-side
+        cursor. Returns None if the database backend is unsupported, if
+        the ingest has chunked readings or if the value types of the
+        sensors cannot be combined, in which
+        case the caller should fall back to merging in Python.
+        '''
+        db = self._state.db or 'default'
+        connection = connections[db]
+        if (connection.vendor not in self._merge_vendors or
+                self.chunks.using(db).exists()):
+            return None
+        classes = {}
+        for sensor in sensors:
+            classes.setdefault(sensor.data_class, []).append(sensor.pk)
+        if (connection.vendor == 'postgresql' and
+                len({cls._meta.get_field('value').get_internal_type()
+                     for cls in classes}) > 1):
+            return None
+        parts, params = [], []
+        for i, (cls, ids) in enumerate(sorted(classes.items(),
+                                              key=lambda x: x[0].__name__)):
+            queryset = cls.objects.using(db).filter(ingest=self,
+                                                    sensor__in=ids)
+            if isinstance(start, datetime.datetime):
+                queryset = queryset.filter(time__gte=start)
+            if isinstance(end, datetime.datetime):
+                queryset = queryset.filter(time__lt=end)
+            queryset = queryset.order_by().values_list(
+                    'time', 'sensor', 'value')
+            sql, part_params = queryset.query.get_compiler(db).as_sql()
+            parts.append('SELECT * FROM ({}) AS part{}'.format(sql, i))
+            params.extend(part_params)
+        sql = ' UNION ALL '.join(parts) + ' ORDER BY 1, 2'
+        columns = {sensor.pk: i for i, sensor in enumerate(sensors)}
+        # SQLite returns booleans as integers from compound queries.
+        booleans = {sensor.pk for sensor in sensors
+                    if sensor.data_type == Sensor.BOOLEAN}
+        zone = timezone(tz) if tz else None
+
+        def convert_time(time):
+            if isinstance(time, str):
+                time = parse_datetime(time)
+            if time.tzinfo is None:
+                time = time.replace(tzinfo=utc)
+            return time.astimezone(zone) if zone else time
+
+        def _merge():
+            if not parts:
+                return
+            if connection.vendor == 'postgresql':
+                context = transaction.atomic(using=db)
+            else:
+                context = contextlib.ExitStack()
+            with context:
+                if connection.vendor == 'postgresql':
+                    connection.ensure_connection()
+                    cursor = connection.connection.cursor(
+                            name='merge_{}'.format(self.pk))
+                    cursor.itersize = fetch_size
+                else:
+                    cursor = connection.cursor()
+                try:
+                    cursor.execute(sql, params)
+                    row, last_time, last_sensor = None, None, None
+                    while True:
+                        records = cursor.fetchmany(fetch_size)
+                        if not records:
+                            break
+                        for time, sensor_id, value in records:
+                            if time != last_time or sensor_id == last_sensor:
+                                if row is not None:
+                                    yield row
+                                row = [None] * (len(columns) + 1)
+                                row[0] = convert_time(time)
+                                last_time = time
+                            if sensor_id in booleans and value is not None:
+                                value = bool(value)
+                            row[columns[sensor_id] + 1] = value
+                            last_sensor = sensor_id
+                    if row is not None:
+                        yield row
+                finally:
+                    cursor.close()
+        return _merge()
+
 
 @dispatch.receiver(models.signals.post_delete, sender=SensorIngest)
 def handle_dataset_delete(sender, instance, using, **kwargs):
     datamap = instance.map
     if datamap and datamap.removed and not datamap.datasets.exists():
         datamap.delete()
+    snapshot.invalidate(instance.id)
+    fits.invalidate(instance.id)
 
 
 class SensorIngestFile(models.Model):
@@ -434,7 +561,11 @@ class Sensor(models.Model):
 
     @property
     def data(self):
-        return getattr(self, self.get_data_type_display() + 'sensordata_set')
+        rows = getattr(self, self.get_data_type_display() + 'sensordata_set')
+        if self.data_type in chunks.DTYPES and self.chunks.exists():
+            return chunks.ChunkedSensorData(
+                    rows.all(), self.chunks.all(), self.data_type)
+        return rows
 
     @property
     def data_class(self):
@@ -548,6 +679,9 @@ class BaseSensorData(models.Model):
         abstract = True
         ordering = ['time']
         get_latest_by = 'time'
+        # Readings are almost always selected by sensor and ingest and
+        # ordered by time.
+        index_together = [('sensor', 'ingest', 'time')]
 
 
 class BooleanSensorData(BaseSensorData):
@@ -567,6 +701,55 @@ class StringSensorData(BaseSensorData):
     objects = SensorDataManager()
 
 
+class SensorDataChunk(models.Model):
+    '''Compressed readings of one sensor over a window of time.
+
+    See storage.chunks for the encoding of time_data, value_data and
+    null_data.
+    '''
+
+    sensor = models.ForeignKey(Sensor, related_name='chunks')
+    ingest = models.ForeignKey(SensorIngest, related_name='chunks')
+    start = models.DateTimeField(db_index=True)
+    end = models.DateTimeField(db_index=True)
+    count = models.IntegerField()
+    minimum = models.FloatField(null=True)
+    maximum = models.FloatField(null=True)
+    time_data = models.BinaryField()
+    value_data = models.BinaryField()
+    null_data = models.BinaryField(blank=True)
+
+    class Meta:
+        ordering = ['start']
+        index_together = [('sensor', 'ingest', 'start')]
+
+
+class SensorRollup(models.Model):
+    '''Aggregates of the numeric readings of a sensor over a period.
+
+    period is 'hour' or 'day', with start the beginning of the UTC hour
+    or day, or 'all' for a rollup of every reading. The 'all' rollup is
+    written last and marks the rollups of a sensor and ingest as
+    complete. readings counts all readings while count, sum, minimum,
+    maximum and sum_squares cover only those which are not null. See
+    storage.rollups.
+    '''
+
+    sensor = models.ForeignKey(Sensor, related_name='rollups')
+    ingest = models.ForeignKey(SensorIngest, related_name='rollups')
+    period = models.CharField(max_length=4)
+    start = models.DateTimeField()
+    readings = models.IntegerField()
+    count = models.IntegerField()
+    sum = models.FloatField()
+    minimum = models.FloatField(null=True)
+    maximum = models.FloatField(null=True)
+    sum_squares = models.FloatField()
+
+    class Meta:
+        unique_together = ('sensor', 'ingest', 'period', 'start')
+
+
 class Analysis(models.Model):
     '''A run of a single application against a single dataset.'''
 
@@ -593,6 +776,46 @@ class Analysis(models.Model):
     started = models.DateTimeField(null=True, default=None)
     ended = models.DateTimeField(null=True, default=None)
     reports = JSONField()
+    # Timers and counters of the stages of the run; see metrics.Metrics.
+    metrics = JSONField(null=True, default=None)
+
+
+class AnalysisJob(models.Model):
+    '''Queue entry tracking the execution of an analysis.
+
+    Jobs are claimed by the worker pool in the jobqueue module in order
+    of descending priority and then by the time they were queued.
+    '''
+
+    QUEUED = 'q'
+    RUNNING = 'r'
+    FINISHED = 'f'
+    FAILED = 'e'
+    CANCELED = 'c'
+
+    STATE_CHOICES = ((QUEUED, 'queued'), (RUNNING, 'running'),
+                     (FINISHED, 'finished'), (FAILED, 'failed'),
+                     (CANCELED, 'canceled'))
+
+    analysis = models.OneToOneField(Analysis, primary_key=True,
+                                    related_name='job')
+    # Owner of the analysis, used to limit concurrent jobs per user
+    user = models.ForeignKey(User, related_name='analysis_jobs')
+    priority = models.SmallIntegerField(default=0)
+    state = models.CharField(max_length=1, choices=STATE_CHOICES,
+                             default=QUEUED)
+    queued = models.DateTimeField(auto_now_add=True)
+    # Identifies the worker running the job and when it last reported in
+    worker = models.CharField(max_length=255, blank=True, default='')
+    heartbeat = models.DateTimeField(null=True, default=None)
+    cancel_requested = models.BooleanField(default=False)
+
+    class Meta:
+        index_together = [('state', 'priority', 'queued'), ('user', 'state')]
+
+    @property
+    def is_active(self):
+        return self.state in (self.QUEUED, self.RUNNING)
 
 
 def _share_key():
@@ -608,9 +831,25 @@ class AppOutput(models.Model):
     analysis = models.ForeignKey(Analysis, related_name='app_output')
     name = models.CharField(max_length=255)
     fields = JSONField()
+    # Number of rows written, recorded when the analysis finishes
+    row_count = models.IntegerField(null=True, default=None)
 
     _create_lock = threading.Lock()
 
+    def get_row_count(self):
+        '''Return the number of rows, counting them if unknown.
+
+        The count is cached only once the analysis has ended, as rows
+        may still be written until then.
+        '''
+        if self.row_count is not None:
+            return self.row_count
+        count = self.get_data_model().objects.count()
+        if self.analysis.ended is not None:
+            self.row_count = count
+            AppOutput.objects.filter(pk=self.pk).update(row_count=count)
+        return count
+
     def get_data_model(self, using=None):
         '''Return a model appropriate for application output.
 
@@ -635,8 +874,13 @@ class AppOutput(models.Model):
         class Manager(models.Manager):
             def get_queryset(self):
                 return super().get_queryset().filter(source=output)
+        # Output tables are shared by outputs with the same field types
+        # and rows are read back by source in insertion order.
+        class Meta:
+            index_together = [('source', 'id')]
         attrs = {'source': models.ForeignKey(AppOutput, related_name='+'),
-                 'objects': Manager(), '__init__': __init__, 'save': save}
+                 'objects': Manager(), '__init__': __init__, 'save': save,
+                 'Meta': Meta}
         # Append PK to name since Django caches models by name
         model = dynamictables.create_model('AppOutputData' + str(output.pk),
                 'appoutputdata', self.analysis.project.id, self.fields, attrs)
@@ -651,6 +895,61 @@ def delete_appoutputdata(sender, instance, using, **kwargs):
     instance.get_data_model(using=using).objects.all().delete()
 
 
+def _add_column(model, name, db, verbosity):
+    '''Add the column of a field to a table created without it.'''
+    connection = connections[db]
+    table = model._meta.db_table
+    field = model._meta.get_field(name)
+    cursor = connection.cursor()
+    columns = {column[0] for column in
+               connection.introspection.get_table_description(cursor, table)}
+    if field.column in columns:
+        return
+    if int(verbosity) >= 1:
+        print('Adding column {} to {}'.format(field.column, table))
+    qn = connection.ops.quote_name
+    if field.null:
+        null = 'NULL'
+    else:
+        # Existing rows take the default, which must be an integer.
+        null = 'NOT NULL DEFAULT {:d}'.format(field.get_default())
+    cursor.execute('ALTER TABLE {} ADD COLUMN {} {} {}'.format(
+        qn(table), qn(field.column), field.db_type(connection), null))
+
+
+@dispatch.receiver(models.signals.post_syncdb)
+def add_appoutput_row_count(sender, verbosity=1, db='default', **kwargs):
+    '''Add the row_count column to AppOutput tables created without it.'''
+    if sender.__name__ != __name__:
+        return
+    _add_column(AppOutput, 'row_count', db, verbosity)
+
+
+@dispatch.receiver(models.signals.post_syncdb)
+def add_analysis_metrics(sender, verbosity=1, db='default', **kwargs):
+    '''Add the metrics column to Analysis tables created without it.'''
+    if sender.__name__ != __name__:
+        return
+    _add_column(Analysis, 'metrics', db, verbosity)
+
+
+@dispatch.receiver(models.signals.post_syncdb)
+def add_sensoringest_rows(sender, verbosity=1, db='default', **kwargs):
+    '''Add the row statistics columns to SensorIngest tables without them.'''
+    if sender.__name__ != __name__:
+        return
+    _add_column(SensorIngest, 'rows', db, verbosity)
+    _add_column(SensorIngest, 'rows_per_second', db, verbosity)
+
+
+@dispatch.receiver(models.signals.post_syncdb)
+def add_sensoringest_version(sender, verbosity=1, db='default', **kwargs):
+    '''Add the version column to SensorIngest tables created without it.'''
+    if sender.__name__ != __name__:
+        return
+    _add_column(SensorIngest, 'version', db, verbosity)
+
+
 @dispatch.receiver(models.signals.post_syncdb)
 def sync_appoutputdata(sender, verbosity=1, db='default', **kwargs):
     '''Remove unreferenced application output data and tables.'''
@@ -340,7 +340,8 @@ class SensorIngestSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = models.SensorIngest
-        read_only_fields = ('start', 'end', 'project', 'map')
+        read_only_fields = ('start', 'end', 'project', 'map', 'rows',
+                            'rows_per_second', 'version')
 
     def validate(self, attrs):
         # Empty names slipped by with PATCH, so catch them here.
@@ -368,6 +369,8 @@ class DataSetManipulateSerializer(serializers.Serializer):
     config = JSONField(required=True)
     
 class AnalysisSerializer(serializers.ModelSerializer):
+    metrics = JSONField(read_only=True)
+
     class Meta:
         model = models.Analysis
         read_only_fields = ('added', 'started', 'ended', 'reports', 'project')
@@ -376,9 +379,18 @@ class AnalysisSerializer(serializers.ModelSerializer):
         result = super().to_native(obj)
         if obj is None:
             return result
-        is_alive = self.context.get('is_alive', lambda x: False)
-        if obj and is_alive(obj.id):
+        try:
+            job = obj.job
+        except models.AnalysisJob.DoesNotExist:
+            job = None
+        if job:
+            result['priority'] = job.priority
+        if job and job.state == job.RUNNING:
             result['status'] = 'running'
+        elif job and job.state == job.CANCELED:
+            result['status'] = 'canceled'
+        elif job and job.state == job.FAILED:
+            result['status'] = 'failed'
         elif not obj.started:
             result['status'] = 'queued'
         elif not obj.ended:
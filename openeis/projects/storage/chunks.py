@@ -0,0 +1,575 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Store sensor readings in compressed, time-bounded chunks.
+
+Rather than one database row per reading, each chunk holds the readings
+of a single sensor and ingest falling within a fixed window of time as
+a pair of compressed arrays: delta-encoded microsecond timestamps and
+the values. The first and last times, the count and the minimum and
+maximum value of each chunk are stored alongside the arrays so that
+time and value filters can skip chunks without decoding them.
+
+ChunkWriter packs readings into chunks and ChunkedSensorData reads them
+back, providing the subset of the QuerySet interface used by
+DatabaseInput, SensorIngest.merge() and the filters.
+'''
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+import zlib
+
+from django.utils import timezone
+import numpy as np
+
+from .merge import to_datetime64
+
+
+__all__ = ['ChunkWriter', 'ChunkedSensorData', 'pack', 'unpack']
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# Sensor data types (see Sensor.DATA_TYPE_CHOICES) which may be chunked.
+DTYPES = {'b': np.bool_, 'f': np.float64, 'i': np.int64}
+
+
+def to_microseconds(time):
+    '''Return microseconds since the epoch for an aware datetime.'''
+    return (time - EPOCH) // MICROSECOND
+
+
+def from_microseconds(value):
+    '''Return an aware UTC datetime for microseconds since the epoch.'''
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def pack(times, values, data_type):
+    '''Return chunk field values for the given readings.
+
+    times is a sequence of microseconds since the epoch and values a
+    sequence of the same length, with None for null readings. The
+    readings are sorted by time before they are packed.
+    '''
+    times = np.asarray(times, dtype=np.int64)
+    nulls = np.array([value is None for value in values], dtype=bool)
+    dtype = DTYPES[data_type]
+    if nulls.any():
+        values = np.array([dtype(0) if value is None else value
+                           for value in values], dtype=dtype)
+    else:
+        values = np.array(values, dtype=dtype)
+    order = np.argsort(times, kind='mergesort')
+    times, values, nulls = times[order], values[order], nulls[order]
+    present = values[~nulls].astype(np.float64)
+    present = present[~np.isnan(present)]
+    return {
+        'start': from_microseconds(times[0]),
+        'end': from_microseconds(times[-1]),
+        'count': len(times),
+        'minimum': float(present.min()) if len(present) else None,
+        'maximum': float(present.max()) if len(present) else None,
+        'time_data': zlib.compress(
+            np.diff(times, prepend=0).astype('<i8').tobytes()),
+        'value_data': zlib.compress(
+            values.astype(values.dtype.newbyteorder('<')).tobytes()),
+        'null_data': (zlib.compress(np.packbits(nulls).tobytes())
+                      if nulls.any() else b''),
+    }
+
+
+def unpack(chunk, data_type):
+    '''Return (times, values, nulls) arrays for a packed chunk.'''
+    times = np.cumsum(np.frombuffer(
+        zlib.decompress(bytes(chunk.time_data)), dtype='<i8'))
+    values = np.frombuffer(zlib.decompress(bytes(chunk.value_data)),
+                           dtype=np.dtype(DTYPES[data_type]).newbyteorder('<'))
+    null_data = bytes(chunk.null_data or b'')
+    if null_data:
+        nulls = np.unpackbits(np.frombuffer(zlib.decompress(null_data),
+                                            dtype=np.uint8))[:len(times)]
+        nulls = nulls.astype(bool)
+    else:
+        nulls = np.zeros(len(times), dtype=bool)
+    if data_type == 'f':
+        nulls |= np.isnan(values)
+    return times.astype(np.int64), values.astype(DTYPES[data_type]), nulls
+
+
+class ChunkWriter:
+    '''Buffer sensor readings and save them as chunks.
+
+    Readings are grouped by sensor and ingest into windows of span
+    seconds, aligned to the epoch. A chunk is written whenever a
+    sensor's readings move to another window or when the buffer holds
+    max_count readings, so memory use is bounded by one partial chunk
+    per sensor. Call close() to write the remaining partial chunks.
+    '''
+
+    def __init__(self, chunk_class, span=86400, max_count=100000,
+                 batch_size=100):
+        self.chunk_class = chunk_class
+        self.span = span * 1000000
+        self.max_count = max_count
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.pending = []
+        self.chunk_count = 0
+
+    def add(self, sensor, ingest, time, value):
+        time = to_microseconds(time)
+        window = time // self.span
+        key = sensor.pk, ingest.pk
+        try:
+            buffer = self.buffers[key]
+        except KeyError:
+            buffer = self.buffers[key] = [window, [], [], sensor, ingest]
+        if buffer[0] != window or len(buffer[1]) >= self.max_count:
+            self._pack(buffer)
+            buffer[0] = window
+        buffer[1].append(time)
+        buffer[2].append(value)
+
+    def add_objects(self, objects):
+        '''Add readings from sensor data model instances.'''
+        for obj in objects:
+            self.add(obj.sensor, obj.ingest, obj.time, obj.value)
+
+    def _pack(self, buffer):
+        window, times, values, sensor, ingest = buffer
+        if not times:
+            return
+        self.pending.append(self.chunk_class(
+                sensor=sensor, ingest=ingest,
+                **pack(times, values, sensor.data_type)))
+        buffer[1], buffer[2] = [], []
+        if len(self.pending) >= self.batch_size:
+            self._save()
+
+    def _save(self):
+        if self.pending:
+            self.chunk_class.objects.bulk_create(self.pending)
+            self.chunk_count += len(self.pending)
+            self.pending = []
+
+    def close(self):
+        for buffer in self.buffers.values():
+            self._pack(buffer)
+        self.buffers = {}
+        self._save()
+
+
+Reading = namedtuple('Reading', 'time value')
+
+_AGGREGATES = {
+    'Avg': lambda values: float(np.mean(values)),
+    'Count': len,
+    'Max': lambda values: values.max().item(),
+    'Min': lambda values: values.min().item(),
+    'Sum': lambda values: values.sum().item(),
+}
+
+_TRUNC_UNITS = {'year': 'Y', 'month': 'M', 'day': 'D', 'hour': 'h',
+                'minute': 'm', 'second': 's'}
+
+_PRUNE_LOOKUPS = {
+    # Lookup: chunk filter(s) able to rule out whole chunks
+    ('time', 'gt'): ['end__gt'], ('time', 'gte'): ['end__gte'],
+    ('time', 'lt'): ['start__lt'], ('time', 'lte'): ['start__lte'],
+    ('time', 'exact'): ['start__lte', 'end__gte'],
+    ('value', 'gt'): ['maximum__gt'], ('value', 'gte'): ['maximum__gte'],
+    ('value', 'lt'): ['minimum__lt'], ('value', 'lte'): ['minimum__lte'],
+}
+
+
+def hourly_offsets(times, tzinfo):
+    '''Return the UTC offsets in tzinfo of UTC microseconds.
+
+    Offsets are looked up once per distinct hour of times. Returns an
+    array of the offsets in microseconds and a list of the tzinfo (for
+    pytz zones, the one with that offset) of each hour, and an array
+    indexing the hour of each time into both.
+    '''
+    hour = 3600 * 1000000
+    hours, inverse = np.unique(times // hour, return_inverse=True)
+    zones = [from_microseconds(h * hour).astimezone(tzinfo)
+             for h in hours.tolist()]
+    offsets = np.array([zone.utcoffset() // MICROSECOND for zone in zones],
+                       dtype=np.int64)
+    return offsets, [zone.tzinfo for zone in zones], inverse.reshape(-1)
+
+
+def local_fields(times, tzinfo=None):
+    '''Return a function to extract date fields from UTC microseconds.
+
+    Fields are extracted in the given time zone, or in the current time
+    zone if tzinfo is None, as Django does for lookups such as
+    time__hour. UTC offsets are looked up once per distinct hour.
+    '''
+    tzinfo = tzinfo or timezone.get_current_timezone()
+    hour = 3600 * 1000000
+    offsets, _, inverse = hourly_offsets(times, tzinfo)
+    local = times + offsets[inverse]
+    days = local // (24 * hour)
+
+    def extract(kind):
+        stamps = local.astype('datetime64[us]')
+        if kind == 'year':
+            return stamps.astype('datetime64[Y]').astype(np.int64) + 1970
+        if kind == 'month':
+            return stamps.astype('datetime64[M]').astype(np.int64) % 12 + 1
+        if kind == 'day':
+            return (stamps.astype('datetime64[D]') -
+                    stamps.astype('datetime64[M]')).astype(np.int64) + 1
+        if kind == 'week_day':
+            # Django numbers days from Sunday (1) to Saturday (7).
+            return (days + 4) % 7 + 1
+        if kind == 'hour':
+            return local // hour % 24
+        if kind == 'minute':
+            return local // 60000000 % 60
+        raise NotImplementedError('unsupported date lookup: ' + kind)
+    return extract
+
+
+class ChunkedSensorData:
+    '''Read-only, QuerySet-like view of chunked sensor readings.
+
+    Combines readings stored in chunks with any stored as rows, so data
+    appended to a chunked ingest row by row is still included. Supports
+    filter(), exclude(), order_by(), timeseries(), values_list(),
+    aggregate(), count(), exists(), earliest(), latest(), indexing and
+    iteration. Lookups on time and value are evaluated with NumPy after
+    chunks which cannot match have been pruned in the database; other
+    lookups (e.g. ingest) are passed through to the database.
+    '''
+
+    def __init__(self, rows, chunks, data_type):
+        self._rows = rows
+        self._chunks = chunks
+        self._data_type = data_type
+        self._lookups = []
+        self._ordering = ('time',)
+        self._trunc_kind = None
+        self._aggregate = None
+        self._fields = None
+        self._flat = False
+        self._cache = None
+
+    def _clone(self, **attrs):
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone.__dict__.update(attrs)
+        clone._cache = None
+        return clone
+
+    def _filter(self, negate, kwargs):
+        rows = (self._rows.exclude if negate else self._rows.filter)(**kwargs)
+        lookups, passed = {}, {}
+        for key, value in kwargs.items():
+            field, _, lookup = key.partition('__')
+            if field in ('time', 'value'):
+                lookups[(field, lookup or 'exact')] = value
+            else:
+                passed[key] = value
+        chunks = self._chunks
+        if passed:
+            chunks = (chunks.exclude if negate else chunks.filter)(**passed)
+        if not negate:
+            for (field, lookup), value in lookups.items():
+                if value is None:
+                    continue
+                for prune in _PRUNE_LOOKUPS.get((field, lookup), ()):
+                    chunks = chunks.filter(**{prune: value})
+        return self._clone(_rows=rows, _chunks=chunks, _lookups=(
+                self._lookups + [(negate, lookups)] if lookups
+                else self._lookups))
+
+    def all(self):
+        return self._clone()
+
+    def filter(self, **kwargs):
+        return self._filter(False, kwargs)
+
+    def exclude(self, **kwargs):
+        return self._filter(True, kwargs)
+
+    def order_by(self, *fields):
+        for field in fields:
+            if field.lstrip('-') not in ('time', 'value'):
+                raise NotImplementedError(
+                        'cannot order chunked data by {!r}'.format(field))
+        return self._clone(_ordering=fields)
+
+    def values_list(self, *fields, flat=False):
+        return self._clone(_fields=fields or ('time', 'value'), _flat=flat)
+
+    def timeseries(self, *, trunc_kind=None, aggregate=None):
+        '''Return timeseries pairs, as SensorDataQuerySet.timeseries().'''
+        if aggregate is not None and aggregate.__name__ not in _AGGREGATES:
+            raise NotImplementedError(
+                    'unsupported aggregate: ' + aggregate.__name__)
+        return self._clone(_trunc_kind=trunc_kind, _aggregate=aggregate and
+                           aggregate.__name__, _fields=('time', 'value'))
+
+    def arrays(self):
+        '''Return (times, values) arrays of time-value pairs ordered by
+        time, as merge_arrays() loads them, or None if the pairs are
+        truncated, aggregated or ordered otherwise.
+
+        Times are datetime64[us] in UTC and values float64, with NaN for
+        null values.
+        '''
+        if (self._trunc_kind or self._aggregate or
+                self._fields != ('time', 'value') or
+                tuple(self._ordering) != ('time',)):
+            return None
+        times, values, nulls = self._load()
+        values = values.astype(np.float64)
+        values[nulls] = np.nan
+        return times.astype('datetime64[us]'), values
+
+    def _load(self):
+        '''Return sorted (times, values, nulls) arrays of all readings.'''
+        parts = [unpack(chunk, self._data_type) for chunk in self._chunks]
+        # Lookups on chunks are evaluated here; rows were filtered by the
+        # database.
+        if parts and self._lookups:
+            parts = [self._select(*map(np.concatenate, zip(*parts)))]
+        rows = list(self._rows.order_by().values_list('time', 'value'))
+        if rows:
+            times, values = zip(*rows)
+            nulls = np.array([value is None for value in values], dtype=bool)
+            dtype = DTYPES[self._data_type]
+            values = np.array([dtype(0) if value is None else value
+                               for value in values], dtype=dtype)
+            times = to_datetime64(times).astype(np.int64)
+            parts.append((times, values, nulls))
+        if not parts:
+            return (np.array([], dtype=np.int64),
+                    np.array([], dtype=DTYPES[self._data_type]),
+                    np.array([], dtype=bool))
+        times, values, nulls = map(np.concatenate, zip(*parts))
+        if len(times) > 1 and (np.diff(times) < 0).any():
+            order = np.argsort(times, kind='mergesort')
+            times, values, nulls = times[order], values[order], nulls[order]
+        return times, values, nulls
+
+    def _select(self, times, values, nulls):
+        '''Return the readings matching the time and value lookups.'''
+        if not self._lookups:
+            return times, values, nulls
+        keep = np.ones(len(times), dtype=bool)
+        for negate, lookups in self._lookups:
+            match = np.ones(len(times), dtype=bool)
+            for (field, lookup), value in lookups.items():
+                match &= self._match(times, values, nulls,
+                                     field, lookup, value)
+            keep &= ~match if negate else match
+        return times[keep], values[keep], nulls[keep]
+
+    def _match(self, times, values, nulls, field, lookup, value):
+        if lookup == 'isnull':
+            result = nulls if field == 'value' else np.zeros(len(times), bool)
+            return result if value else ~result
+        if field == 'time':
+            if lookup in ('year', 'month', 'day', 'week_day', 'hour',
+                          'minute'):
+                array = local_fields(times)(lookup)
+            else:
+                array = times
+                if lookup in ('in', 'range'):
+                    value = to_datetime64(value).astype(np.int64)
+                else:
+                    value = to_datetime64([value]).astype(np.int64)[0]
+        else:
+            if value is None:
+                # Django treats value=None as value__isnull=True.
+                return nulls.copy() if lookup == 'exact' else ~nulls & False
+            array = values
+        if lookup == 'exact' or lookup in ('year', 'month', 'day', 'week_day',
+                                           'hour', 'minute'):
+            result = array == value
+        elif lookup == 'gt':
+            result = array > value
+        elif lookup == 'gte':
+            result = array >= value
+        elif lookup == 'lt':
+            result = array < value
+        elif lookup == 'lte':
+            result = array <= value
+        elif lookup == 'in':
+            result = np.isin(array, np.asarray(value))
+        elif lookup == 'range':
+            result = (array >= value[0]) & (array <= value[1])
+        else:
+            raise NotImplementedError(
+                    'unsupported lookup: {}__{}'.format(field, lookup))
+        if field == 'value':
+            result &= ~nulls
+        return result
+
+    def _evaluate(self):
+        times, values, nulls = self._load()
+        if self._trunc_kind:
+            unit = _TRUNC_UNITS[self._trunc_kind]
+            times = (times.astype('datetime64[us]').astype(
+                     'datetime64[' + unit + ']').astype('datetime64[us]')
+                     .astype(np.int64))
+        if self._aggregate:
+            func = _AGGREGATES[self._aggregate]
+            bounds = np.flatnonzero(np.diff(times)) + 1
+            groups = np.split(np.arange(len(times)), bounds)
+            result_times = times[np.r_[0, bounds]] if len(times) else times
+            result = []
+            for group in groups:
+                group = group[~nulls[group]]
+                result.append(func(values[group].astype(np.float64)
+                                   if self._aggregate == 'Avg'
+                                   else values[group])
+                              if len(group) else
+                              (0 if self._aggregate == 'Count' else None))
+            nulls = np.array([value is None for value in result], dtype=bool)
+            times, values = result_times, result
+        else:
+            values = values.tolist()
+        for field in reversed(self._ordering):
+            key = field.lstrip('-')
+            if key == 'time':
+                order = np.argsort(times, kind='mergesort')
+            else:
+                # Nulls sort first, as they do in SQLite.
+                present = [i for i in range(len(values)) if not nulls[i]]
+                present.sort(key=values.__getitem__)
+                order = np.array(
+                        list(np.flatnonzero(nulls)) + present, dtype=np.int64)
+            if field.startswith('-'):
+                order = order[::-1]
+            times, nulls = times[order], nulls[order]
+            values = [values[i] for i in order.tolist()]
+        times = [from_microseconds(time) for time in times.tolist()]
+        return [Reading(time, None if null else value)
+                for time, value, null in zip(times, values, nulls.tolist())]
+
+    def _results(self):
+        if self._cache is None:
+            readings = self._evaluate()
+            if self._fields is None:
+                self._cache = readings
+            else:
+                fields = [Reading._fields.index(field)
+                          for field in self._fields]
+                if self._flat:
+                    self._cache = [reading[fields[0]] for reading in readings]
+                else:
+                    self._cache = [tuple(reading[i] for i in fields)
+                                   for reading in readings]
+        return self._cache
+
+    def __iter__(self):
+        return iter(self._results())
+
+    def iterator(self):
+        return iter(self._results())
+
+    def __len__(self):
+        return len(self._results())
+
+    def __getitem__(self, index):
+        return self._results()[index]
+
+    def __bool__(self):
+        return bool(self._results())
+
+    def count(self):
+        return len(self._results())
+
+    def exists(self):
+        return bool(self._results())
+
+    def _by_time(self, latest):
+        readings = self._clone(_ordering=('time',), _fields=None)._results()
+        if not readings:
+            raise self._rows.model.DoesNotExist()
+        reading = readings[-1] if latest else readings[0]
+        if self._fields is None:
+            return reading
+        return tuple(getattr(reading, field) for field in self._fields)
+
+    def earliest(self, field_name=None):
+        return self._by_time(False)
+
+    def latest(self, field_name=None):
+        return self._by_time(True)
+
+    def aggregate(self, **kwargs):
+        '''Aggregate values, e.g. aggregate(value=Avg('value')).'''
+        readings = self._clone(_trunc_kind=None, _aggregate=None,
+                               _fields=None)._results()
+        values = [reading.value for reading in readings
+                  if reading.value is not None]
+        result = {}
+        for name, aggregate in kwargs.items():
+            kind = getattr(aggregate, 'name', type(aggregate).__name__)
+            if kind not in _AGGREGATES:
+                raise NotImplementedError('unsupported aggregate: ' + kind)
+            if not values:
+                result[name] = 0 if kind == 'Count' else None
+            elif kind == 'Avg':
+                result[name] = float(np.mean(np.array(values, dtype=float)))
+            else:
+                result[name] = _AGGREGATES[kind](np.array(values))
+        return result
@@ -131,6 +131,24 @@ class CloneProject():
                     sensor_data.id = None
                     cloned_sensor_data.append(sensor_data)
                 orig_sensor.data_class.objects.bulk_create(cloned_sensor_data)
+
+                cloned_chunks = []
+                for chunk in models.SensorDataChunk.objects.filter(
+                        sensor=orig_sensor, ingest=sensor_ingest):
+                    chunk.sensor = sensor
+                    chunk.ingest = self.sensor_ingest_dict[sensor_ingest]
+                    chunk.id = None
+                    cloned_chunks.append(chunk)
+                models.SensorDataChunk.objects.bulk_create(cloned_chunks)
+
+                cloned_rollups = []
+                for rollup in models.SensorRollup.objects.filter(
+                        sensor=orig_sensor, ingest=sensor_ingest):
+                    rollup.sensor = sensor
+                    rollup.ingest = self.sensor_ingest_dict[sensor_ingest]
+                    rollup.id = None
+                    cloned_rollups.append(rollup)
+                models.SensorRollup.objects.bulk_create(cloned_rollups)
             
     
     def clone_analysis(self, analyses_list, sensor_ingest, project):
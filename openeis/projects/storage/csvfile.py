@@ -65,13 +65,24 @@ class CSVFile:
     in Django's File iterator and to limit the line lengths via the
     max_line_size argument. If the encoding argument is not given, UTF-8
     is used to decode the file. Raises csv.Error for any CSV problems.
+
+    A previously detected dialect may be given to skip sniffing, in
+    which case has_header is False. Reading may be limited to the lines
+    starting at byte offset start (which must be the start of a line)
+    and before byte offset end.
     '''
     def __init__(self, file, *, max_line_size=10000,
-                 encoding='utf-8', sample_size=10000):
+                 encoding='utf-8', sample_size=10000, dialect=None,
+                 start=0, end=None):
         self.file = file
         self.max_line_size = max_line_size
         self.encoding = 'utf-8'
-        self.dialect, self.has_header = self._sniff(sample_size)
+        self.end = end
+        if dialect is None:
+            self.dialect, self.has_header = self._sniff(sample_size)
+        else:
+            self.dialect, self.has_header = dialect, False
+        self.file.seek(start)
         self.reader = csv.reader(self._iterlines(), self.dialect)
 
     def _sniff(self, size=10000, delimiters=', \t|'):
@@ -91,7 +102,11 @@ class CSVFile:
     def _iterlines(self):
         '''Iterate over the lines of the file.'''
         readline = self._readline
+        end = self.end
+        tell = self.file.tell
         while True:
+            if end is not None and tell() >= end:
+                return
             line = readline()
             if not line:
                 return
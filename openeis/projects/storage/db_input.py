@@ -68,20 +68,27 @@ input_map =
 }
 '''
 
-from collections import defaultdict
 from datetime import datetime, timedelta
 import logging
 
+from django.db import connections, transaction
+from django.db.models.query import QuerySet, ValuesListQuerySet
+import numpy as np
 import pytz
 
 from .. import models
+from .chunks import from_microseconds, hourly_offsets
+from .merge import (merge_drop, merge_no_drop, merge_fill, merge_arrays,
+                    to_datetime64)
+from .rollups import rollup_series
+from . import snapshot
 
 _logger = logging.getLogger(__name__)
 
 MAX_DATE =  pytz.utc.localize(datetime.max - timedelta(days=5))
 
 
-def get_sensors(datamap_id, topics):
+def get_sensors(datamap_id, topics, mapdef=None, sensors=None):
     '''Get querysets for to given topics.
 
     get_sensors() returns a list of two-tuples. The first element is a
@@ -89,11 +96,15 @@ def get_sensors(datamap_id, topics):
     definition. The second element is a function which takes no
     arguments and will return a new queryset. The queryset has two
     columns of data: the time and the data point value.
+
+    The DataMap and a dictionary of its sensors by name may be passed
+    as mapdef and sensors to avoid fetching them again.
     '''
     if isinstance(topics, str):
         topics = [topics]
     result = []
-    mapdef = models.DataMap.objects.get(pk=datamap_id)
+    if mapdef is None:
+        mapdef = models.DataMap.objects.get(pk=datamap_id)
     datamap = mapdef.map
     for topic in topics:
         # if "All" in topic:
@@ -114,15 +125,22 @@ def get_sensors(datamap_id, topics):
         meta = datamap['sensors'][topic]
         # XXX: Augment metadata by adding general definition properties
         if 'type' in meta:
-            sensor = mapdef.sensors.get(name=topic)
-            def get_queryset():
+            sensor = (mapdef.sensors.get(name=topic) if sensors is None
+                      else sensors[topic])
+            # Bound now; topics share this loop's sensor variable.
+            def get_queryset(sensor=sensor):
                 return sensor.data
+            get_queryset.sensor = sensor
         else:
             get_queryset = None
         result.append((meta, get_queryset))
     return result
 
 
+# exclude arguments of get_query_sets() which rollups can answer.
+_ROLLUP_EXCLUDES = (None, {'value': None}, {'value__isnull': True})
+
+
 class DatabaseInput:
 
     def __init__(self, datamap_id, topic_map, dataset_id=None):
@@ -139,8 +157,17 @@ class DatabaseInput:
         self.data_map = {}
         self.sensor_meta_map = {}
         self.topic_meta = {}
+        self._timezones = {}
+        # The map and all of its sensors are fetched once and shared by
+        # the topics.
         mapdef = models.DataMap.objects.get(pk=datamap_id)
+        sensors = {sensor.name: sensor for sensor in mapdef.sensors.all()}
         self.map_defintion = mapdef.map
+        self.dataset = None
+        self.snapshot = None
+        if dataset_id is not None:
+            self.dataset = models.SensorIngest.objects.get(pk=dataset_id)
+            self.snapshot = snapshot.get(self.dataset)
 
         for input_name, topics in self.topic_map.items():
             for topic in topics:
@@ -156,13 +183,16 @@ class DatabaseInput:
         #{'zonetemp': ['ZoneBuilding/AHU1/Zone3/ZoneTemperature', 'ZoneBuilding/AHU1/Zone2/ZoneTemperature'],
         # 'fan_airflow': [], 'occupancy': [], 'zone_temp_setpoint': [], 'damper_position': []}
         for input_name, topics in self.topic_map.items():
-            self.data_map[input_name] = tuple(get_sensors(datamap_id,x)[0] for x in topics)
+            self.data_map[input_name] = tuple(
+                get_sensors(datamap_id, topics, mapdef, sensors))
 
         for input_name, topics in self.topic_map.items():
             self.topic_meta[input_name] = {}
             for topic in topics:
-                self.topic_meta[input_name][topic] = get_sensors(datamap_id,topic)[0][0]
-                self.topic_meta[input_name][topic]['timezone'] = self.get_tz_for_sensor(topic)
+                # Copied so the definition is not changed.
+                meta = dict(self.map_defintion['sensors'][topic])
+                meta['timezone'] = self.get_tz_for_sensor(topic)
+                self.topic_meta[input_name][topic] = meta
 
     def get_topics(self):
         return self.topic_map.copy()
@@ -173,7 +203,11 @@ class DatabaseInput:
     def get_tz_for_sensor(self, sensor_topic):
         #pop off base of topic
         base = sensor_topic.split('/')[0]
-        
+        try:
+            return self._timezones[base]
+        except KeyError:
+            pass
+
         #TODO: better warnings
         if (base in self.map_defintion['sensors'] and 
             'attributes' in self.map_defintion['sensors'][base].keys() and
@@ -182,7 +216,8 @@ class DatabaseInput:
         else:
             #_logger.warning(("No timezone for sensor", sensor_topic))
             tz = pytz.UTC
-            
+
+        self._timezones[base] = tz
         return tz
     
     def localize_sensor_time(self, sensor_topic, timestamp):
@@ -194,6 +229,28 @@ class DatabaseInput:
         timestamp = timestamp.astimezone(tz)
         return timestamp
 
+    def localize_sensor_times(self, sensor_topic, timestamps):
+        '''Localize many times, as localize_sensor_time() does each.
+
+        timestamps may be a datetime64 array, such as the 'time' array
+        returned by merge_arrays(), or a sequence of datetimes, with
+        naive times taken to be UTC. Returns a list of aware datetimes
+        in the time zone of the sensor. The UTC offset is looked up once
+        per distinct hour rather than once per time.
+        '''
+        tz = self.get_tz_for_sensor(sensor_topic)
+        if isinstance(timestamps, np.ndarray) and timestamps.dtype.kind == 'M':
+            times = timestamps.astype('datetime64[us]')
+        else:
+            times = to_datetime64(list(timestamps))
+        if not len(times):
+            return []
+        times = times.astype(np.int64)
+        offsets, zones, inverse = hourly_offsets(times, tz)
+        local = (times + offsets[inverse]).tolist()
+        return [from_microseconds(time).replace(tzinfo=zones[i])
+                for time, i in zip(local, inverse.tolist())]
+
     def get_topics_meta(self):
         '''Returns topics with their meta data'''
         return self.topic_meta.copy()
@@ -208,130 +265,44 @@ class DatabaseInput:
             args  - one or more results returned from get_query_sets() method
             drop_partial_lines - whether to drop incomplete sets, missing values are represented by None
         '''
-        def merge_drop():
-            "Drop incomplete rows"
-            managed_query_sets = []
-
-            for arg in args:
-                for group, query_set_list in arg.items():
-                    for query_set in query_set_list:
-                        managed_query_sets.append((group,query_set.__iter__()))
-            current = [x[1].__next__() for x in managed_query_sets]
-            newest = max(current, key=lambda x:x[0] )[0]
-
-            while True:
-                if all(x[0] == newest for x in current):
-                    result = defaultdict(list)
-                    result['time']  = newest
-                    for value, query in zip(current, managed_query_sets):
-                        result[query[0]].append(value[1])
-
-                    yield result
-                    current = [x[1].__next__() for x in managed_query_sets]
-                    newest = max(current, key=lambda x:x[0] )[0]
-                else:
-                    new_current = []
-                    terminate = False
-                    for value, query in zip(current, managed_query_sets):
-                        if value[0] == newest:
-                            new_current.append(value)
-                        else:
-                            try:
-                                new_current.append(query[1].__next__())
-                            except StopIteration:
-                                terminate = True
-                                break
-                    if terminate:
-                        break
-                    current = new_current
-                    newest = max(current, key=lambda x:x[0] )[0]
-
-        def merge_no_drop():
-            "Incomplete rows provide a None for missing values."
-            managed_query_sets = []
-
-            for arg in args:
-                for group, query_set_list in arg.items():
-                    for query_set in query_set_list:
-                        managed_query_sets.append((group,query_set.__iter__()))
-            current = [x[1].__next__() for x in managed_query_sets]
-            oldest = min(current, key=lambda x:x[0] )[0]
-
-            while True:
-                result = defaultdict(list)
-                result['time']  = oldest
-
-                for value, query in zip(current, managed_query_sets):
-                    if value[0] == oldest:
-                        result[query[0]].append(value[1])
-                    else:
-                        result[query[0]].append(None)
-
-                yield result
-                new_current = []
-                for value, query in zip(current, managed_query_sets):
-                    if value[0] != oldest:
-                        new_current.append(value)
-                    else:
-                        try:
-                            new_current.append(query[1].__next__())
-                        except StopIteration:
-                            new_current.append((MAX_DATE,None))
-                current = new_current
-                oldest = min(current, key=lambda x:x[0] )[0]
-                if oldest == MAX_DATE:
-                    break
-
-
-        return merge_drop() if drop_partial_lines else merge_no_drop()
+        return merge_drop(*args) if drop_partial_lines else merge_no_drop(*args)
 
     @staticmethod
     def merge_fill_in_data(*args, drop_partial_lines=True, fill_in_data=None):
         "Incomplete rows provide last known reading for missing values or None if no good value"
-        #pass in a timedelta to advance time
-        managed_query_sets = []
-
-        latest_value = []
-
-        for arg in args:
-            for group, query_set_list in arg.items():
-                for query_set in query_set_list:
-                    managed_query_sets.append((group,query_set.__iter__()))
-                    latest_value.append(None)
-        current = [x[1].__next__() for x in managed_query_sets]
-        oldest = min(current, key=lambda x:x[0] )[0]
-
-        while True:
-            result = defaultdict(list)
-            result['time']  = oldest
-            index = 0
-            for value, query in zip(current, managed_query_sets):
-
-                if value[0] == oldest:
-                    result[query[0]].append(value[1])
-                    latest_value[index] = value[1]
-                else:
-                    result[query[0]].append(latest_value[index])
-
-                index += 1
-
-            yield result
-            new_current = []
-            for value, query in zip(current, managed_query_sets):
-                if value[0] != oldest:
-                    new_current.append(value)
-                else:
-                    try:
-                        new_current.append(query[1].__next__())
-                    except StopIteration:
-                        new_current.append((MAX_DATE,None))
-            current = new_current
-            oldest = min(current, key=lambda x:x[0] )[0]
-            if oldest == MAX_DATE:
-                break
+        return merge_fill(*args)
 
+    @staticmethod
+    def merge_arrays(*args, drop_partial_lines=True, fill_in_data=False):
+        '''
+            args  - one or more results returned from get_query_sets() method
+            drop_partial_lines - whether to drop incomplete sets, missing values are represented by NaN
+            fill_in_data - fill missing values with the last known reading (no effect when dropping)
 
+            returns => {'time': datetime64 array, group: 2-D float64 array (rows x topics)}
+        '''
+        return merge_arrays(*args, drop_partial_lines=drop_partial_lines,
+                            fill_in_data=fill_in_data)
 
+    @staticmethod
+    def select_rows(rows, indices, fetch_size=2000):
+        '''
+            rows - one result list item returned from get_query_sets()
+            indices - increasing indices of the rows to select
+
+            returns => iterator of the rows at indices
+
+        PostgreSQL reads the rows through a server-side cursor, moving
+        past those not selected on the server, so the rows are neither
+        all fetched nor held in memory as iterating the query set would.
+        '''
+        if not isinstance(rows, QuerySet):
+            return (rows[index] for index in indices)
+        if (connections[rows.db].vendor != 'postgresql' or
+                not isinstance(rows, ValuesListQuerySet) or
+                rows.query.extra_select or rows.query.aggregate_select):
+            return _skip_rows(rows.iterator(), indices)
+        return _scroll_rows(rows, indices, fetch_size)
 
     def get_query_sets(self, group_name,
                        order_by='time',
@@ -359,11 +330,26 @@ class DatabaseInput:
 
         returns => {group:result list} if wrap_for_merge is True
         otherwise returns => result list
-        """
-        qs = (x() for _,x in self.data_map[group_name])
 
-        if self.dataset_id is not None:
-            qs = (x.filter(ingest_id=self.dataset_id) for x in qs)
+        Grouped queries of a dataset are answered from the sensors'
+        rollups (see storage.rollups) when the aggregation is derivable
+        from them and no filter other than excluding nulls is given.
+        Other queries read the dataset's snapshot (see storage.snapshot)
+        when it has the sensors and supports the lookups.
+        """
+        rolled = self._get_rollups(group_name, order_by, filter_, exclude,
+                                   group_by, group_by_aggregation)
+        if rolled is not None:
+            if group_by == 'all':
+                return rolled
+            return {group_name:rolled} if wrap_for_merge else rolled
+
+        qs = self._snapshot_data(group_name, order_by, filter_, exclude,
+                                 group_by_aggregation)
+        if qs is None:
+            qs = (x() for _,x in self.data_map[group_name])
+            if self.dataset_id is not None:
+                qs = (x.filter(ingest_id=self.dataset_id) for x in qs)
 
         if filter_ is not None:
             qs = (x.filter(**filter_) for x in qs)
@@ -383,6 +369,40 @@ class DatabaseInput:
 
         return {group_name:result} if wrap_for_merge else result
 
+    def _snapshot_data(self, group_name, order_by, filter_, exclude,
+                       aggregation):
+        '''Return the snapshot data of a group, or None if any sensor
+        is not in the snapshot or the query is not supported.'''
+        if (self.snapshot is None or
+                order_by.lstrip('-') not in ('time', 'value') or
+                not snapshot.supports(aggregation, filter_, exclude)):
+            return None
+        result = []
+        for _, get_queryset in self.data_map[group_name]:
+            data = self.snapshot.data(get_queryset.sensor)
+            if data is None:
+                return None
+            result.append(data)
+        return result
+
+    def _get_rollups(self, group_name, order_by, filter_, exclude,
+                     group_by, group_by_aggregation):
+        '''Return the result of a grouped query from rollups, or None.'''
+        if (group_by is None or group_by_aggregation is None or
+                self.dataset_id is None or filter_ is not None or
+                order_by != 'time' or exclude not in _ROLLUP_EXCLUDES):
+            return None
+        result = []
+        for _, get_queryset in self.data_map[group_name]:
+            series = rollup_series(models.SensorRollup, get_queryset.sensor,
+                                   self.dataset_id, group_by,
+                                   group_by_aggregation,
+                                   exclude_nulls=exclude is not None)
+            if series is None:
+                return None
+            result.append(series)
+        return result
+
 #     def timeseries(self, *, trunc_kind=None, aggregate=None):
 #         '''Return timeseries pairs from the table.
 #
@@ -392,6 +412,42 @@ class DatabaseInput:
 #         aggregation method and grouped by the time.
 #         '''
 
+
+def _skip_rows(rows, indices):
+    wanted = iter(indices)
+    index = next(wanted, None)
+    for i, row in enumerate(rows):
+        if index is None:
+            return
+        if i == index:
+            yield row
+            index = next(wanted, None)
+
+
+def _scroll_rows(rows, indices, fetch_size):
+    db = rows.db
+    connection = connections[db]
+    sql, params = rows.query.get_compiler(db).as_sql()
+    with transaction.atomic(using=db):
+        connection.ensure_connection()
+        cursor = connection.connection.cursor(
+                name='select_{}'.format(id(rows)))
+        cursor.itersize = fetch_size
+        try:
+            cursor.execute(sql, params)
+            position = 0
+            for index in indices:
+                if index > position:
+                    cursor.scroll(index - position)
+                row = cursor.fetchone()
+                if row is None:
+                    return
+                position = index + 1
+                yield row[0] if rows.flat else row
+        finally:
+            cursor.close()
+
+
 if __name__ == '__main__':
 
     args = []
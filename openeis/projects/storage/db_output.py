@@ -69,6 +69,9 @@ import shutil
 import tempfile
 import csv
 from datetime import datetime
+from django.conf import settings
+from django.db import connection, models as dj_models
+from django.utils import timezone
 from openeis.server.settings import DATA_DIR
 import posixpath
 
@@ -90,6 +93,8 @@ class DatabaseOutput:
         '''
         self.analysis_id = analysis.id
         self.table_map = {}
+        self.output_ids = {}
+        self.row_counts = defaultdict(int)
 
         self.batch_store = defaultdict(list)
 
@@ -102,6 +107,7 @@ class DatabaseOutput:
                                                          fields=fields)
             model_klass = app_output.get_data_model()
             self.table_map[table_name] = model_klass
+            self.output_ids[table_name] = app_output.pk
 
         #create the logging table
         logging_fields = {'msg':'string', 'level':'integer', 'datetime':'datetime'}
@@ -110,6 +116,7 @@ class DatabaseOutput:
                                                      fields=logging_fields)
         log_klass = log_output.get_data_model()
         self.table_map[LOG_TABLE_NAME] = log_klass
+        self.output_ids[LOG_TABLE_NAME] = log_output.pk
 
         self.log_level = logging.ERROR
         if analysis.debug:
@@ -121,9 +128,16 @@ class DatabaseOutput:
         klass = self.table_map[table_name]
         instance = klass(**row_data)
         self.batch_store[table_name].append(instance)
+        self.row_counts[table_name] += 1
 
         if len(self.batch_store[table_name]) >= BATCH_SIZE:
-            klass.objects.bulk_create(self.batch_store[table_name])
+            self.write_batch(table_name)
+
+    def write_batch(self, table_name):
+        '''Write the pending rows of a table to the database.'''
+        batch = self.batch_store[table_name]
+        if batch:
+            self.table_map[table_name].objects.bulk_create(batch)
             self.batch_store[table_name] = []
 
     def log(self, msg, level=logging.DEBUG, timestamp=None):
@@ -132,11 +146,40 @@ class DatabaseOutput:
             self.insert_row(LOG_TABLE_NAME, logging_fields)
 
     def close(self):
-        for table_name, batch_list in self.batch_store.items():
-            if batch_list:
-                klass = batch_list[0].__class__
-                klass.objects.bulk_create(batch_list)
-                self.batch_store[table_name] = []
+        for table_name in list(self.batch_store):
+            self.write_batch(table_name)
+        # Cache the row counts for listing outputs
+        for table_name, pk in self.output_ids.items():
+            models.AppOutput.objects.filter(pk=pk).update(
+                row_count=self.row_counts[table_name])
+
+
+def _csv_converter(field):
+    '''Return a function converting values of field as read from the
+    database.'''
+    if isinstance(field, dj_models.DateTimeField):
+        def convert(value):
+            if value is None:
+                return None
+            value = field.to_python(value)
+            if settings.USE_TZ:
+                if timezone.is_naive(value):
+                    value = timezone.make_aware(
+                        value, timezone.get_default_timezone())
+                value = value.astimezone(timezone.utc)
+            return value
+        return convert
+    if (isinstance(field, dj_models.FloatField) and
+            connection.vendor == 'sqlite'):
+        # SQLite stores NaN as NULL.
+        def convert(value):
+            if value is None:
+                return None
+            value = field.to_python(value)
+            return None if value != value else value
+        return convert
+    to_python = field.to_python
+    return lambda value: None if value is None else to_python(value)
 
 
 class DatabaseOutputFile(DatabaseOutput):
@@ -186,8 +229,8 @@ class DatabaseOutputFile(DatabaseOutput):
             if console_output:
                 print("Created results file:", csv_file)
             f = open(csv_file,'w', newline='')
-            self.csv_table_map[table_name] = csv.DictWriter(f, topics.keys())
-            self.csv_table_map[table_name].writeheader()
+            self.csv_table_map[table_name] = csv.writer(f)
+            self.csv_table_map[table_name].writerow(list(topics.keys()))
             self.file_table_map[table_name] = f
 
 
@@ -205,16 +248,27 @@ class DatabaseOutputFile(DatabaseOutput):
         else:
             self._logger.log(level, 'NO TIME GIVEN - {msg}'.format(msg=msg))
 
+    def write_batch(self, table_name):
+        '''Append the pending rows of a table to its CSV file as they are
+        written to the database.
+
+        Values are converted as the database would, so that the file
+        matches the stored output without reading it back.
+        '''
+        batch = self.batch_store[table_name]
+        if batch and table_name in self.output_names:
+            meta = self.table_map[table_name]._meta
+            converters = [(name, _csv_converter(meta.get_field(name)))
+                          for name in self.output_names[table_name]]
+            self.csv_table_map[table_name].writerows(
+                [convert(getattr(obj, name)) for name, convert in converters]
+                for obj in batch)
+        super().write_batch(table_name)
+
     def close(self):
-        super().close()
         self._logger.log(logging.INFO, 'Writing CSV files.')
-        for table_name, fields in self.output_names.items():
-            klass = self.table_map[table_name]
-            dict_writer =  self.csv_table_map[table_name]
-            for k in klass.objects.all():
-                row_data = dict((field, getattr(k, field)) for field in fields)
-                dict_writer.writerow(row_data)
-            fd = self.file_table_map[table_name]
+        super().close()
+        for fd in self.file_table_map.values():
             fd.close()
 
         self._logger.removeHandler(self.file_handler)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Cache of models fit to the readings of an ingest.
+
+Applications which fit a model to a dataset, such as the baseline of
+whole_building_energy_savings, save the fitted arrays with put() under
+a key() describing the fit, and find them with get() in later analyses
+of the same ingest rather than querying and fitting again. Fits are
+saved as .npz files under FIT_CACHE_DIR/<ingest id>/, named for the key
+and the ingest's start time and data version (as the snapshots of
+storage.snapshot are) so that fits of an earlier ingest with the same
+id, or of readings since changed, are never found. A fit begun before a
+change may still be saved after invalidate() removed the fits of the
+ingest, but is saved under the version it was read at.
+'''
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from ..conf import settings as proj_settings
+
+
+__all__ = ['get', 'invalidate', 'key', 'put']
+
+_log = logging.getLogger(__name__)
+
+
+def _path(ingest_id):
+    directory = proj_settings.FIT_CACHE_DIR
+    return directory and os.path.join(directory, str(ingest_id))
+
+
+def _file(ingest, key):
+    return '{}-{}.npz'.format(
+        key, _hash('{}/{}'.format(ingest.start, ingest.version)))
+
+
+def _hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def key(*parts):
+    '''Return a cache key for the JSON-serializable parts describing a
+    fit; other objects, such as datetimes, are described by str().'''
+    return _hash(json.dumps(parts, sort_keys=True, default=str))
+
+
+def get(ingest, key):
+    '''Return the dictionary of arrays saved for an ingest under a key,
+    or None. Zero-dimensional arrays are returned as scalars.'''
+    path = _path(ingest.id)
+    if not path:
+        return None
+    try:
+        with np.load(os.path.join(path, _file(ingest, key))) as data:
+            return {name: data[name][()] if data[name].ndim == 0
+                    else data[name] for name in data.files}
+    except (OSError, ValueError):
+        return None
+
+
+def put(ingest, key, fit):
+    '''Save a dictionary of arrays (or values convertible to arrays) for
+    an ingest under a key. Failures are logged and otherwise ignored.'''
+    path = _path(ingest.id)
+    if not path:
+        return
+    try:
+        os.makedirs(path, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=path, prefix='.', suffix='.npz')
+    except OSError as e:
+        _log.warning('cannot save fit of ingest %s: %s', ingest.id, e)
+        return
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            np.savez(file, **{name: np.asarray(value)
+                              for name, value in fit.items()})
+        os.replace(temp, os.path.join(path, _file(ingest, key)))
+    except OSError as e:
+        _log.warning('cannot save fit of ingest %s: %s', ingest.id, e)
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+
+
+def invalidate(ingest_id):
+    '''Remove the fits saved for an ingest.'''
+    path = _path(ingest_id)
+    if path and os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
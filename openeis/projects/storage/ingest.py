@@ -55,15 +55,20 @@
 
 '''Ingest CSV files and parse them according to a sensor defintion.'''
 
-from collections import namedtuple
+from collections import deque, namedtuple
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import itertools
 import json
 import os
 import sys
+import numpy as np
 import pytz
 import dateutil.parser
 
 from .csvfile import CSVFile
+from .timestamps import TimestampParser, infer_timestamp_format
 
 
 class IngestError(ValueError):
@@ -75,6 +80,10 @@ class IngestError(ValueError):
         if exc is not None:
             self.__cause__ = exc
 
+    def __reduce__(self):
+        # Support pickling, as used by ingest_files_parallel().
+        return self.__class__, (self.value, self.column)
+
     @property
     def column_num(self):
         '''Get the one-based index of the column source(s).'''
@@ -116,6 +125,66 @@ class BaseColumn:
         self.column = column
         self.default = default
 
+    # Type of the values array of parse_block()
+    dtype = object
+
+    def parse_block(self, rows):
+        '''Parse the column of a block of rows.
+
+        Returns a ColumnBlock with the parsed values in an array of type
+        dtype and a mask which is False where the column was blank (and
+        so takes the default value) or could not be parsed. The row
+        indexes of cells which could not be parsed are given in
+        error_rows with the IngestError instances in errors. Parsing is
+        performed cell by cell unless overridden.
+        '''
+        return self._block_from_values([self(row) for row in rows])
+
+    def _block_from_values(self, results):
+        '''Build a ColumnBlock from the results of calling the parser.'''
+        count = len(results)
+        error_rows = [i for i, value in enumerate(results)
+                      if isinstance(value, IngestError)]
+        errors = [results[i] for i in error_rows]
+        mask = np.fromiter((value is not None for value in results),
+                           dtype=bool, count=count)
+        mask[error_rows] = False
+        values = None
+        if self.dtype is not object:
+            values = np.zeros(count, dtype=self.dtype)
+            try:
+                values[mask] = self._to_array(
+                        list(itertools.compress(results, mask)))
+            except OverflowError:
+                # Keep integers too large for the array type as objects.
+                values = None
+        if values is None:
+            values = np.empty(count, dtype=object)
+            values[:] = results
+        return ColumnBlock(values, mask, np.array(error_rows, dtype=np.intp),
+                           errors)
+
+    def _to_array(self, values):
+        return np.array(values, dtype=self.dtype)
+
+    def _to_list(self, values):
+        return values.tolist()
+
+    def expand_block(self, block):
+        '''Return a list of the cell values of a ColumnBlock.
+
+        This is the inverse of parse_block(), returning the same values
+        and IngestError instances as calling the parser for each row.
+        '''
+        values = self._to_list(block.values)
+        if not block.mask.all():
+            default = self.default
+            for i in np.flatnonzero(~block.mask).tolist():
+                values[i] = default
+        for i, error in zip(block.error_rows.tolist(), block.errors):
+            values[i] = error
+        return values
+
     def __repr__(self, *args, **kwargs):
         options = ['']
         if self.default:
@@ -138,17 +207,29 @@ class DateTimeColumn(BaseColumn):
     (separated by sep -- a space by default) before being parsed.
     Multiple formatting strings may be attempted by passing them via the
     formats argument. Final parsing is attempted by dateutil.
+
+    If no formats are given and infer_format is true, the format of the
+    first values parsed by dateutil is inferred and used to parse the
+    following values, which is much faster than dateutil. The inferred
+    format is available as the inferred_format attribute.
     '''
 
     data_type = 'datetime'
+    # Parsed blocks hold UTC times
+    dtype = 'datetime64[us]'
+    # Number of values used to infer a format before giving up
+    infer_limit = 10
 
     def __init__(self, column, *, formats=(), sep=' ', tzinfo=pytz.utc,
-                 time_offset=0, **kwargs):
+                 time_offset=0, infer_format=True, **kwargs):
         super().__init__(column, **kwargs)
         self.formats = formats
         self.sep = sep
         self.tzinfo = tzinfo
         self.time_offset = time_offset
+        self.inferred_format = None
+        self._parsers = [TimestampParser(fmt) for fmt in formats]
+        self._infer_count = 0 if infer_format and not formats else None
 
     def _ensure_tz(self, dt):
         if not dt.tzinfo and self.tzinfo:
@@ -157,21 +238,47 @@ class DateTimeColumn(BaseColumn):
             dt += timedelta(seconds=self.time_offset)
         return dt.astimezone(pytz.utc)
 
+    def _infer(self, raw_value):
+        self._infer_count += 1
+        fmt = infer_timestamp_format([raw_value])
+        if fmt:
+            self.inferred_format = fmt
+            self._parsers.append(TimestampParser(fmt))
+        if fmt or self._infer_count >= self.infer_limit:
+            self._infer_count = None
+
     def __call__(self, row):
         columns = [self.column] if isinstance(self.column, int) else self.column
         raw_value = self.sep.join([row[i].strip() for i in columns])
         if not raw_value.strip():
             return self.default
-        for fmt in self.formats:
+        for parse in self._parsers:
             try:
-                return self._ensure_tz(datetime.strptime(raw_value, fmt))
+                return self._ensure_tz(parse(raw_value))
             except ValueError:
                 pass
         try:
-            return self._ensure_tz(dateutil.parser.parse(raw_value))
+            dt = self._ensure_tz(dateutil.parser.parse(raw_value))
         except (ValueError, TypeError):
-            pass
-        return ParseError(raw_value, self)
+            return ParseError(raw_value, self)
+        if self._infer_count is not None:
+            self._infer(raw_value)
+        return dt
+
+    # Converting through microseconds since the epoch is much faster than
+    # converting datetime objects with NumPy.
+    _epoch = datetime(1970, 1, 1, tzinfo=pytz.utc)
+    _microsecond = timedelta(microseconds=1)
+
+    def _to_array(self, values):
+        epoch, microsecond = self._epoch, self._microsecond
+        return np.array([(value - epoch) // microsecond for value in values],
+                        dtype=np.int64).view(self.dtype)
+
+    def _to_list(self, values):
+        epoch = self._epoch
+        return [epoch + timedelta(microseconds=value)
+                for value in values.view(np.int64).tolist()]
 
     def __repr__(self):
         kwargs = {'sep': self.sep} if self.sep != ' ' else {}
@@ -195,6 +302,7 @@ class IntegerColumn(BaseColumn):
     '''
 
     data_type = 'integer'
+    dtype = np.int64
 
     def __init__(self, column, *,
                  minimum=None, maximum=None, **kwargs):
@@ -224,6 +332,14 @@ class IntegerColumn(BaseColumn):
             return OutOfRangeError(value, self)
         return value
 
+    def parse_block(self, rows):
+        column = self.column
+        cells = [row[column] for row in rows]
+        # Values with a leading zero may be in another base.
+        if any(cell[:1] == '0' and len(cell) > 1 for cell in cells):
+            return super().parse_block(rows)
+        return _parse_numeric_block(self, int, cells, rows)
+
     def __repr__(self):
         return super().__repr__('minimum', 'maximum')
 
@@ -232,6 +348,7 @@ class FloatColumn(BaseColumn):
     '''Parse a float column.'''
 
     data_type = 'float'
+    dtype = np.float64
 
     def __init__(self, column, *, minimum=None, maximum=None, **kwargs):
         super().__init__(column, **kwargs)
@@ -251,6 +368,11 @@ class FloatColumn(BaseColumn):
             return OutOfRangeError(value, self)
         return value
 
+    def parse_block(self, rows):
+        column = self.column
+        return _parse_numeric_block(self, float, [row[column] for row in rows],
+                                    rows)
+
     def __repr__(self):
         return super().__repr__('minimum', 'maximum')
 
@@ -271,6 +393,8 @@ class BooleanColumn(BaseColumn):
         'f': False
     }
 
+    dtype = np.bool_
+
     def __call__(self, row):
         raw_value = row[self.column]
         if not raw_value:
@@ -284,9 +408,64 @@ class BooleanColumn(BaseColumn):
         except KeyError:
             return ParseError(raw_value, self)
 
+    def parse_block(self, rows):
+        # Boolean columns have few distinct values, so parse each once.
+        column = self.column
+        cells, inverse = np.unique(np.array([row[column] for row in rows]),
+                                   return_inverse=True)
+        inverse = inverse.reshape(-1)
+        cells = cells.tolist()
+        block = self._block_from_values([self({column: cell})
+                                         for cell in cells])
+        error_rows = np.flatnonzero(np.isin(inverse, block.error_rows))
+        errors = [ParseError(cells[i], self)
+                  for i in inverse[error_rows].tolist()]
+        return ColumnBlock(block.values[inverse], block.mask[inverse],
+                           error_rows, errors)
+
+
+def _parse_numeric_block(column, parse, cells, rows):
+    '''Parse the cells of a numeric column into a ColumnBlock.
+
+    The non-blank cells are converted together, with parse applied by
+    map(); if any fail, the block is parsed cell by cell to report
+    the errors. Values outside the column's range are reported as
+    OutOfRangeError.
+    '''
+    mask = np.fromiter(map(bool, cells), dtype=bool, count=len(cells))
+    values = np.zeros(len(cells), dtype=column.dtype)
+    try:
+        values[mask] = list(map(parse, itertools.compress(cells, mask)))
+    except (ValueError, OverflowError):
+        return BaseColumn.parse_block(column, rows)
+    out = np.zeros(len(values), dtype=bool)
+    if column.minimum:
+        out |= values < column.minimum
+    if column.maximum:
+        out |= values > column.maximum
+    out &= mask
+    error_rows = np.flatnonzero(out)
+    errors = [OutOfRangeError(value, column)
+              for value in values[error_rows].tolist()]
+    return ColumnBlock(values, mask & ~out, error_rows, errors)
+
 
 Row = namedtuple('Row', 'line_num position columns')
 
+ColumnBlock = namedtuple('ColumnBlock', 'values mask error_rows errors')
+
+
+class Block(namedtuple('Block', 'line_nums positions columns')):
+    '''A block of parsed rows with a ColumnBlock for each column.'''
+
+    def error_indexes(self):
+        '''Return (row, column) index arrays of the cells in error.'''
+        rows = [column.error_rows for column in self.columns]
+        columns = [np.full(len(column.error_rows), i, dtype=np.intp)
+                   for i, column in enumerate(self.columns)]
+        return (np.concatenate(rows) if rows else np.array([], np.intp),
+                np.concatenate(columns) if columns else np.array([], np.intp))
+
 
 def ingest_file(file, columns):
     '''Return a generator to parse a file according to a column map.
@@ -306,6 +485,58 @@ def ingest_file(file, columns):
                 [col(row) for col in columns]) for row in csv_file if row)
 
 
+def _ingest_rows(file, columns, block_size=None):
+    if block_size:
+        return iter_block_rows(ingest_file_blocks(file, columns, block_size),
+                               columns)
+    return ingest_file(file, columns)
+
+
+def ingest_file_blocks(file, columns, block_size=1000):
+    '''Return a generator to parse a file in blocks of rows.
+
+    Like ingest_file(), but each item generated is a Block of up to
+    block_size rows, with the line numbers and file positions of the
+    rows and a ColumnBlock for each of columns, as returned by its
+    parse_block() method.
+    '''
+    csv_file = CSVFile(file)
+    if csv_file.has_header:
+        next(csv_file)
+    return _iter_blocks(csv_file, file, columns, block_size)
+
+
+def _iter_blocks(csv_file, file, columns, block_size):
+    reader = csv_file.reader
+    while True:
+        rows, line_nums, positions = [], [], []
+        for row in csv_file:
+            if not row:
+                continue
+            rows.append(row)
+            line_nums.append(reader.line_num)
+            positions.append(file.tell())
+            if len(rows) >= block_size:
+                break
+        if not rows:
+            return
+        yield Block(line_nums, positions,
+                    [column.parse_block(rows) for column in columns])
+
+
+def iter_block_rows(blocks, columns):
+    '''Generate Row instances from blocks of rows.
+
+    The rows generated are the same as those generated by ingest_file().
+    '''
+    for block in blocks:
+        cells = [column.expand_block(column_block)
+                 for column, column_block in zip(columns, block.columns)]
+        for line_num, position, *row in zip(block.line_nums, block.positions,
+                                            *cells):
+            yield Row(line_num, position, row)
+
+
 def get_sensor_parsers(datamap, files):
     '''Generate a mapping of files and sensor paths to columns.
 
@@ -360,10 +591,13 @@ def get_sensor_parsers(datamap, files):
 IngestFile = namedtuple('IngestFile', 'name size sensors types rows time_zone time_offset')
 
 
-def ingest_files(datamap, files):
+def ingest_files(datamap, files, block_size=None):
     '''Iterate over each file_dict in files to return a file parser iterator.
 
     file_dict is a dictionary with file, time_offset, and time_zone as keys.
+    If block_size is given, columns are parsed in blocks of that many
+    rows (see ingest_file_blocks()), which is faster but produces the
+    same rows.
 
     Creates a generator to iterate over each file in files and yield
     IngestFile objects with the following attributes:
@@ -391,10 +625,141 @@ def ingest_files(datamap, files):
         except AttributeError:
             size = os.stat(file.fileno()).st_size
         names, types, columns = zip(*columnmap[file_id])
-        rows = ingest_file(file, columns)
+        rows = _ingest_rows(file, columns, block_size)
         yield IngestFile(file_id, size, names, types, rows, time_zone, time_offset)
 
 
+# Attributes of csv.Dialect passed to worker processes.
+_DIALECT_ATTRS = ('delimiter', 'doublequote', 'escapechar', 'lineterminator',
+                  'quotechar', 'quoting', 'skipinitialspace')
+
+
+def _split_file(file, size, split_size):
+    '''Return (start, end) byte ranges of file ending at line breaks.'''
+    ranges = []
+    start = 0
+    while start < size:
+        file.seek(min(start + split_size, size))
+        file.readline()
+        end = min(file.tell(), size)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _parse_range(path, columns, dialect, skip_header, start, end,
+                 block_size=None):
+    '''Parse a byte range of a file in a worker process.
+
+    Returns a list of Row instances, with line numbers relative to the
+    start of the range, and the number of lines read.
+    '''
+    dialect = type('dialect', (csv.Dialect,), dialect)
+    with open(path, 'rb') as file:
+        csv_file = CSVFile(file, dialect=dialect, start=start, end=end)
+        if skip_header:
+            next(csv_file, None)
+        if block_size:
+            rows = list(iter_block_rows(_iter_blocks(
+                    csv_file, file, columns, block_size), columns))
+        else:
+            rows = [Row(csv_file.reader.line_num, file.tell(),
+                        [col(row) for col in columns])
+                    for row in csv_file if row]
+        return rows, csv_file.reader.line_num
+
+
+def _map_ordered(func, tasks, processes, lookahead):
+    '''Generate the results of func(*task) for tasks, in order.
+
+    Tasks are run in a pool of processes with no more than lookahead
+    tasks submitted ahead of the result being consumed.
+    '''
+    executor = ProcessPoolExecutor(processes)
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(executor.submit(func, *task))
+            if len(pending) >= lookahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+class _RangeRows:
+    '''Distribute parsed ranges, in order, to the rows of each file.'''
+
+    def __init__(self):
+        self.results = None
+        self.index = 0
+
+    def rows(self, first, count):
+        '''Generate the rows of count ranges starting with range first.'''
+        # Discard the results of files which were skipped.
+        while self.index < first:
+            next(self.results)
+            self.index += 1
+        offset = 0
+        for i in range(count):
+            rows, line_count = next(self.results)
+            self.index += 1
+            if offset:
+                rows = [row._replace(line_num=row.line_num + offset)
+                        for row in rows]
+            yield from rows
+            offset += line_count
+
+
+def ingest_files_parallel(datamap, files, *, processes=None,
+                          split_size=16 * 1024 * 1024, block_size=None):
+    '''Iterate over files like ingest_files(), parsing in parallel.
+
+    Files are split into byte ranges of about split_size bytes, ending
+    on line breaks, which are parsed by a pool of processes (the number
+    of CPUs if processes is None). The rows of each file are generated
+    in order, with the same line numbers and positions as
+    ingest_files(), while later ranges are parsed in the background.
+    Files which cannot be reopened by name in the workers (such as
+    in-memory files) are parsed serially. Quoted values must not span
+    lines. block_size is used as by ingest_files().
+    '''
+    columnmap = get_sensor_parsers(datamap, files)
+    if hasattr(files, 'items'):
+        files = sorted(files.items())
+    processes = processes or os.cpu_count() or 1
+    ingested, tasks = [], []
+    results = _RangeRows()
+    for file_id, file_dict in files:
+        file = file_dict['file']
+        try:
+            size = file.size
+        except AttributeError:
+            size = os.stat(file.fileno()).st_size
+        names, types, columns = zip(*columnmap[file_id])
+        path = getattr(file, 'name', None)
+        if isinstance(path, str) and os.path.isfile(path):
+            csv_file = CSVFile(file)
+            dialect = {name: getattr(csv_file.dialect, name)
+                       for name in _DIALECT_ATTRS}
+            ranges = _split_file(file, size, split_size)
+            rows = results.rows(len(tasks), len(ranges))
+            tasks.extend((path, columns, dialect, csv_file.has_header and
+                          not i, start, end, block_size)
+                         for i, (start, end) in enumerate(ranges))
+        else:
+            rows = _ingest_rows(file, columns, block_size)
+        ingested.append(IngestFile(file_id, size, names, types, rows,
+                                   file_dict['time_zone'],
+                                   file_dict['time_offset']))
+    results.results = _map_ordered(_parse_range, tasks, processes,
+                                   2 * processes)
+    return ingested
+
+
 def iter_rows(file):
     for row in file.rows:
         columns = []
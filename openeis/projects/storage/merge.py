@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Merge time-ordered streams into aligned rows.
+
+Each stream is an iterable of (time, value) pairs ordered by time, such
+as the querysets returned by DatabaseInput.get_query_sets(). Streams are
+grouped by input name and every merged row is a defaultdict(list) with
+the row time under the 'time' key and, for each group, a list holding
+one value per stream in the group.
+
+Pending stream times are kept in a heap so that rows are produced by
+touching only the streams which have a value at the row time, rather
+than scanning every stream for each row.
+
+merge_arrays() performs the same alignment column-wise, returning NumPy
+arrays rather than generating rows.
+'''
+
+from collections import defaultdict
+from heapq import heappop, heappush
+
+import dateutil.parser
+import numpy as np
+import pytz
+
+
+__all__ = ['merge_drop', 'merge_no_drop', 'merge_fill', 'merge_arrays']
+
+
+def _streams(args):
+    '''Flatten merge arguments into iterators and group slices.
+
+    args is a sequence of {group: [stream, ...]} dictionaries. Returns a
+    list of iterators and a list of (group, start, stop) slices into the
+    flattened list. Streams belonging to the same group are kept together
+    in the order given so that each group occupies a contiguous slice.
+    '''
+    groups = {}
+    for arg in args:
+        for group, streams in arg.items():
+            groups.setdefault(group, []).extend(streams)
+    iterators, slices = [], []
+    for group, streams in groups.items():
+        start = len(iterators)
+        iterators.extend(iter(stream) for stream in streams)
+        slices.append((group, start, len(iterators)))
+    return iterators, slices
+
+
+def _row(time, values, slices):
+    result = defaultdict(list)
+    result['time'] = time
+    for group, start, stop in slices:
+        result[group] = values[start:stop]
+    return result
+
+
+def _merge_outer(args, fill):
+    iterators, slices = _streams(args)
+    count = len(iterators)
+    heads = [None] * count
+    # Map each pending time to the streams whose next item has that
+    # time. Only distinct times enter the heap, which stays small when
+    # streams share timestamps.
+    pending = {}
+    times = []
+    indices = range(count)
+    values = [None] * count
+    while True:
+        for index in indices:
+            item = next(iterators[index], None)
+            if item is None:
+                continue
+            time, heads[index] = item
+            try:
+                pending[time].append(index)
+            except KeyError:
+                pending[time] = [index]
+                heappush(times, time)
+        if not times:
+            return
+        oldest = heappop(times)
+        indices = pending.pop(oldest)
+        if not fill:
+            values = [None] * count
+        for index in indices:
+            values[index] = heads[index]
+        yield _row(oldest, values, slices)
+
+
+def merge_no_drop(*args):
+    '''Merge streams, using None for values missing from a row.
+
+    A row is generated for every time found in any stream.
+    '''
+    return _merge_outer(args, False)
+
+
+def merge_fill(*args):
+    '''Merge streams, filling missing values with the last known value.
+
+    Like merge_no_drop() except that a stream without a value at the
+    row time repeats its most recent value, or None if it has not yet
+    produced one.
+    '''
+    return _merge_outer(args, True)
+
+
+def merge_drop(*args):
+    '''Merge streams, dropping rows which are missing any value.
+
+    Only times present in every stream generate a row. Merging stops as
+    soon as any stream is exhausted.
+    '''
+    iterators, slices = _streams(args)
+    if not iterators:
+        return
+    try:
+        times, values = map(list, zip(*[next(it) for it in iterators]))
+    except (StopIteration, ValueError):
+        return
+    count = len(iterators)
+    while True:
+        newest = max(times)
+        # Advance lagging streams until every head is at the newest time.
+        while min(times) != newest:
+            for index in range(count):
+                while times[index] < newest:
+                    item = next(iterators[index], None)
+                    if item is None:
+                        return
+                    times[index], values[index] = item
+                if times[index] > newest:
+                    newest = times[index]
+        yield _row(newest, values, slices)
+        for index, iterator in enumerate(iterators):
+            item = next(iterator, None)
+            if item is None:
+                return
+            times[index], values[index] = item
+
+
+def to_datetime64(times):
+    '''Convert a sequence of times to a datetime64[us] array in UTC.
+
+    Times may be datetime objects, naive or aware, or strings such as
+    those returned by truncated (group_by) queries on SQLite. Naive
+    times are assumed to already be in UTC.
+    '''
+    if len(times) and isinstance(times[0], str):
+        # Let NumPy parse plain ISO 8601 UTC strings in bulk.
+        try:
+            return np.array([time[:-1] if time.endswith('Z') else time
+                             for time in times], dtype='datetime64[us]')
+        except ValueError:
+            pass
+    result = []
+    for time in times:
+        if isinstance(time, str):
+            time = dateutil.parser.parse(time)
+        if time.tzinfo is not None:
+            time = time.astimezone(pytz.utc).replace(tzinfo=None)
+        result.append(time)
+    return np.array(result, dtype='datetime64[us]')
+
+
+def _load(stream):
+    # Chunked and snapshot data provide their arrays directly.
+    arrays = getattr(stream, 'arrays', None)
+    if arrays is not None:
+        result = arrays()
+        if result is not None:
+            return result
+    pairs = list(stream)
+    if not pairs:
+        return np.array([], dtype='datetime64[us]'), np.array([], dtype=float)
+    times, values = zip(*pairs)
+    return to_datetime64(times), np.array(values, dtype=float)
+
+
+def merge_arrays(*args, drop_partial_lines=True, fill_in_data=False):
+    '''Merge streams into aligned NumPy arrays.
+
+    Takes the same arguments as the row merges and returns a dictionary
+    with a datetime64[us] array of UTC times under the 'time' key and,
+    for each group, a two-dimensional float64 array with one row per
+    time and one column per stream in the group. Missing values, and
+    values stored as None, are NaN.
+
+    If drop_partial_lines is True, only times present in every stream
+    are included. Otherwise every time found in any stream is included
+    and, if fill_in_data is True, missing values are filled with the
+    stream's previous value as in merge_fill(). Times are expected to
+    be unique within each stream.
+    '''
+    groups = {}
+    for arg in args:
+        for group, streams in arg.items():
+            groups.setdefault(group, []).extend(streams)
+    loaded = {group: [_load(stream) for stream in streams]
+              for group, streams in groups.items()}
+    columns = [column for group in loaded.values() for column in group]
+    if not columns:
+        axis = np.array([], dtype='datetime64[us]')
+    elif drop_partial_lines:
+        axis = np.unique(columns[0][0])
+        for times, _ in columns[1:]:
+            axis = np.intersect1d(axis, times)
+    else:
+        axis = np.unique(np.concatenate([times for times, _ in columns]))
+    result = {'time': axis}
+    for group, group_columns in loaded.items():
+        array = np.full((len(axis), len(group_columns)), np.nan)
+        for i, (times, values) in enumerate(group_columns):
+            index = np.searchsorted(axis, times)
+            # Times dropped from the axis map to a neighbouring slot.
+            keep = index < len(axis)
+            keep[keep] = axis[index[keep]] == times[keep]
+            index, values = index[keep], values[keep]
+            if fill_in_data and not drop_partial_lines and len(index):
+                # Each row takes the value of the last preceding sample.
+                last = np.full(len(axis), -1)
+                last[index] = np.arange(len(index))
+                last = np.maximum.accumulate(last)
+                present = last >= 0
+                array[present, i] = values[last[present]]
+            else:
+                array[index, i] = values
+        result[group] = array
+    return result
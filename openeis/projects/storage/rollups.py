@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Maintain hourly and daily rollups of numeric sensor readings.
+
+A rollup holds the number of readings and the count, sum, minimum,
+maximum and sum of squares of the non-null values of one sensor and
+ingest within a UTC hour or day, plus a single 'all' rollup covering
+every reading. Averages, sums, extremes, counts and (population)
+variances and standard deviations grouped by hour or day can then be
+answered from the rollups rather than by scanning the readings.
+
+RollupBuilder accumulates rollups as readings are ingested or appended
+and rollup_series() answers grouped queries from them, returning None
+when they cannot be used.
+'''
+
+import math
+
+from django.db import transaction
+import numpy as np
+
+from .chunks import from_microseconds, to_microseconds
+
+
+__all__ = ['RollupBuilder', 'rollup_series', 'PERIODS', 'AGGREGATES']
+
+
+# Bucket width of each rollup period in microseconds.
+PERIODS = {'hour': 3600 * 1000000, 'day': 86400 * 1000000}
+
+# Sensor data types (see Sensor.DATA_TYPE_CHOICES) which are rolled up.
+DATA_TYPES = ('f', 'i')
+
+# Statistics kept per bucket, in order.
+_FIELDS = ('readings', 'count', 'sum', 'minimum', 'maximum', 'sum_squares')
+
+
+def _variance(count, total, squares):
+    mean = total / count
+    return max(squares / count - mean * mean, 0.0)
+
+
+# Aggregation functions derivable from rollups, by name, taking the
+# bucket statistics and returning the value for a non-empty bucket.
+AGGREGATES = {
+    'Avg': lambda count, total, low, high, squares: total / count,
+    'Count': lambda count, total, low, high, squares: count,
+    'Max': lambda count, total, low, high, squares: high,
+    'Min': lambda count, total, low, high, squares: low,
+    'Sum': lambda count, total, low, high, squares: total,
+    'StdDev': lambda count, total, low, high, squares:
+        math.sqrt(_variance(count, total, squares)),
+    'Variance': lambda count, total, low, high, squares:
+        _variance(count, total, squares),
+}
+
+# Aggregations which keep the type of an integer sensor's values.
+_INTEGER_AGGREGATES = {'Max', 'Min', 'Sum'}
+
+
+def _combine(old, new):
+    '''Combine the statistics of two buckets in place.'''
+    old[0] += new[0]
+    old[1] += new[1]
+    old[2] += new[2]
+    if new[3] is not None:
+        old[3] = new[3] if old[3] is None else min(old[3], new[3])
+    if new[4] is not None:
+        old[4] = new[4] if old[4] is None else max(old[4], new[4])
+    old[5] += new[5]
+
+
+class RollupBuilder:
+    '''Accumulate rollups of readings and save them.
+
+    Readings are buffered and aggregated with NumPy every batch_size
+    readings. Hourly and daily buckets are written, combined with any
+    already in the database, whenever more than max_buckets are held
+    and by close(), which also writes the 'all' rollups marking the
+    rollups of each sensor as complete. If update_only is true, only
+    sensors already having complete rollups for the ingest are updated,
+    as when readings are appended to an existing ingest.
+    '''
+
+    def __init__(self, rollup_class, ingest, batch_size=100000,
+                 max_buckets=200000, update_only=False):
+        self.rollup_class = rollup_class
+        self.ingest = ingest
+        self.batch_size = batch_size
+        self.max_buckets = max_buckets
+        self.update_only = update_only
+        self.sensors = {}
+        self.sensor_ids = []
+        self.times = []
+        self.values = []
+        self.buckets = {}
+        self.totals = {}
+
+    def add(self, sensor, time, value):
+        if sensor.data_type not in DATA_TYPES:
+            return
+        if sensor.pk not in self.sensors:
+            self.sensors[sensor.pk] = sensor
+        self.sensor_ids.append(sensor.pk)
+        self.times.append(to_microseconds(time))
+        self.values.append(value)
+        if len(self.times) >= self.batch_size:
+            self._aggregate()
+
+    def _aggregate(self):
+        if not self.times:
+            return
+        sensor_ids = np.array(self.sensor_ids, dtype=np.int64)
+        times = np.array(self.times, dtype=np.int64)
+        values = np.array([np.nan if value is None else value
+                           for value in self.values], dtype=np.float64)
+        self.sensor_ids, self.times, self.values = [], [], []
+        present = ~np.isnan(values)
+        zeroed = np.where(present, values, 0.0)
+        for period, span in PERIODS.items():
+            self._reduce(sensor_ids, times // span * span, present, zeroed,
+                         values, period, self.buckets)
+        self._reduce(sensor_ids, np.zeros_like(times), present, zeroed,
+                     values, 'all', self.totals)
+        if len(self.buckets) > self.max_buckets:
+            self._write(self.buckets)
+            self.buckets = {}
+
+    @staticmethod
+    def _reduce(sensor_ids, starts, present, zeroed, values, period, buckets):
+        order = np.lexsort((starts, sensor_ids))
+        sensor_ids, starts = sensor_ids[order], starts[order]
+        present, zeroed, values = present[order], zeroed[order], values[order]
+        bounds = np.flatnonzero((np.diff(sensor_ids) != 0) |
+                                (np.diff(starts) != 0)) + 1
+        bounds = np.r_[0, bounds]
+        readings = np.diff(np.r_[bounds, len(starts)])
+        counts = np.add.reduceat(present.astype(np.int64), bounds)
+        sums = np.add.reduceat(zeroed, bounds)
+        squares = np.add.reduceat(zeroed * zeroed, bounds)
+        lows = np.fmin.reduceat(values, bounds)
+        highs = np.fmax.reduceat(values, bounds)
+        for i, sensor_id, start in zip(
+                range(len(bounds)), sensor_ids[bounds].tolist(),
+                starts[bounds].tolist()):
+            low, high = lows[i], highs[i]
+            stats = [int(readings[i]), int(counts[i]), float(sums[i]),
+                     None if np.isnan(low) else float(low),
+                     None if np.isnan(high) else float(high),
+                     float(squares[i])]
+            key = sensor_id, period, start
+            try:
+                _combine(buckets[key], stats)
+            except KeyError:
+                buckets[key] = stats
+
+    def _write(self, buckets):
+        '''Save buckets, combining them with those already saved.'''
+        if not buckets:
+            return
+        rollups = self.rollup_class.objects.filter(ingest=self.ingest)
+        sensor_ids = {sensor_id for sensor_id, _, _ in buckets}
+        if self.update_only:
+            sensor_ids &= set(rollups.filter(
+                    period='all', sensor_id__in=sensor_ids).values_list(
+                    'sensor_id', flat=True))
+            if not sensor_ids:
+                return
+        periods = {period for _, period, _ in buckets}
+        starts = [start for _, _, start in buckets]
+        existing = {
+            (rollup.sensor_id, rollup.period, to_microseconds(rollup.start)):
+            rollup for rollup in rollups.filter(
+                sensor_id__in=sensor_ids, period__in=periods,
+                start__range=(from_microseconds(min(starts)),
+                              from_microseconds(max(starts))))}
+        created = []
+        with transaction.atomic():
+            for key, stats in buckets.items():
+                sensor_id, period, start = key
+                if sensor_id not in sensor_ids:
+                    continue
+                rollup = existing.get(key)
+                if rollup is None:
+                    created.append(self.rollup_class(
+                        sensor=self.sensors[sensor_id], ingest=self.ingest,
+                        period=period, start=from_microseconds(start),
+                        **dict(zip(_FIELDS, stats))))
+                    continue
+                _combine(stats, [getattr(rollup, field) for field in _FIELDS])
+                for field, value in zip(_FIELDS, stats):
+                    setattr(rollup, field, value)
+                rollup.save()
+            self.rollup_class.objects.bulk_create(created)
+
+    def close(self):
+        self._aggregate()
+        self._write(self.buckets)
+        self._write(self.totals)
+        self.buckets, self.totals = {}, {}
+
+
+def rollup_series(rollup_class, sensor, ingest_id, period, aggregate,
+                  exclude_nulls=False):
+    '''Answer a grouped query of a sensor's readings from its rollups.
+
+    period is 'hour' or 'day', for which a list of (time, value) pairs
+    ordered by time is returned as SensorDataQuerySet.timeseries() would,
+    or 'all', for which the aggregated value is returned. aggregate is
+    an aggregation class such as django.db.models.Avg. If exclude_nulls
+    is true, null readings are excluded before grouping. Returns None
+    if the query cannot be answered from rollups, either because the
+    aggregation is not derivable from them or because the rollups of
+    the sensor and ingest are incomplete.
+    '''
+    name = getattr(aggregate, '__name__', None)
+    if (sensor.data_type not in DATA_TYPES or name not in AGGREGATES or
+            (period != 'all' and period not in PERIODS)):
+        return None
+    rollups = rollup_class.objects.filter(sensor=sensor, ingest_id=ingest_id)
+    try:
+        total = rollups.get(period='all')
+    except rollup_class.DoesNotExist:
+        return None
+    func = AGGREGATES[name]
+    cast = int if sensor.data_type == 'i' and name in _INTEGER_AGGREGATES \
+        else None
+
+    def value(count, total, low, high, squares):
+        if not count:
+            return 0 if name == 'Count' else None
+        result = func(count, total, low, high, squares)
+        return cast(result) if cast else result
+
+    if period == 'all':
+        return value(total.count, total.sum, total.minimum, total.maximum,
+                     total.sum_squares)
+    rows = rollups.filter(period=period).order_by('start').values_list(
+            'start', 'readings', *_FIELDS[1:])
+    return [(start, value(*stats)) for start, readings, *stats in rows
+            if readings and (stats[0] or not exclude_nulls)]
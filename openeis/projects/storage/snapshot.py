@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Memory-mapped NumPy snapshots of the readings of an ingest.
+
+A snapshot holds, for a boolean, float or integer sensor of an ingest,
+arrays of the microsecond timestamps, the values and a null mask of its
+readings, saved as .npy files under
+DATASET_SNAPSHOT_DIR/<ingest id>/<sensor id>/ with a manifest.json.
+Analyses of the ingest map the arrays read-only rather than querying
+and converting the readings again, so several analyses of one ingest
+share the work and the page cache.
+
+The snapshot of a sensor of a complete ingest is built when an analysis
+first reads the sensor. It records the start and data version of the
+ingest (see SensorIngest.readings_changed()), and is rebuilt if either
+has since changed, so neither a build which raced a change of the
+readings nor one left by a deleted ingest with the same id is used.
+invalidate() removes the snapshots of an ingest.
+Snapshot.data() returns a SnapshotSensorData, which supports the
+QuerySet subset of ChunkedSensorData.
+'''
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from ..conf import settings as proj_settings
+from .chunks import _AGGREGATES, DTYPES, ChunkedSensorData
+from .merge import to_datetime64
+
+
+__all__ = ['Snapshot', 'SnapshotSensorData', 'get', 'invalidate', 'supports']
+
+_log = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+ARRAYS = ('time', 'value', 'null')
+
+# Lookups which SnapshotSensorData evaluates, by field.
+LOOKUPS = {
+    'time': {'exact', 'gt', 'gte', 'lt', 'lte', 'in', 'range', 'isnull',
+             'year', 'month', 'day', 'week_day', 'hour', 'minute'},
+    'value': {'exact', 'gt', 'gte', 'lt', 'lte', 'in', 'range', 'isnull'},
+}
+
+
+def _path(ingest_id, sensor_id=None):
+    directory = proj_settings.DATASET_SNAPSHOT_DIR
+    if not directory:
+        return None
+    path = os.path.join(directory, str(ingest_id))
+    return path if sensor_id is None else os.path.join(path, str(sensor_id))
+
+
+def _key(ingest):
+    '''Return the manifest entries identifying the readings of ingest.'''
+    return {'start': str(ingest.start), 'version': ingest.version}
+
+
+def supports(aggregate, *lookups):
+    '''Return True if snapshots can evaluate the aggregation class (or
+    None) and the filter() or exclude() arguments in each of the given
+    dictionaries.'''
+    if aggregate is not None and aggregate.__name__ not in _AGGREGATES:
+        return False
+    for kwargs in lookups:
+        for key in kwargs or ():
+            field, _, lookup = key.partition('__')
+            if (lookup or 'exact') not in LOOKUPS.get(field, ()):
+                return False
+    return True
+
+
+class SnapshotSensorData(ChunkedSensorData):
+    '''Read-only, QuerySet-like view of the snapshot of a sensor.
+
+    rows and chunks are the sensor's (unevaluated) querysets, used only
+    for the model and to build filters; readings come from the arrays.
+    Only lookups on time and value are evaluated, so the view must only
+    be filtered on the ingest of the snapshot.
+    '''
+
+    def __init__(self, rows, chunks, data_type, arrays):
+        super().__init__(rows, chunks, data_type)
+        self._arrays = arrays
+
+    def _load(self):
+        return self._select(*self._arrays)
+
+
+class Snapshot:
+    '''Snapshots of the sensors of a complete ingest.'''
+
+    def __init__(self, ingest):
+        self.ingest = ingest
+        self._arrays = {}
+
+    def arrays(self, sensor):
+        '''Return memory-mapped (times, values, nulls) arrays of a sensor,
+        building its snapshot if needed, or None if it has none.'''
+        try:
+            return self._arrays[sensor.pk]
+        except KeyError:
+            pass
+        arrays = None
+        if sensor.data_type in DTYPES:
+            arrays = (_open(self.ingest, sensor) or
+                      _build(self.ingest, sensor))
+        self._arrays[sensor.pk] = arrays
+        return arrays
+
+    def data(self, sensor):
+        '''Return a SnapshotSensorData of a sensor, or None.'''
+        arrays = self.arrays(sensor)
+        if arrays is None:
+            return None
+        rows = getattr(sensor, sensor.get_data_type_display() +
+                       'sensordata_set')
+        return SnapshotSensorData(rows.all(), sensor.chunks.none(),
+                                  sensor.data_type, arrays)
+
+
+def _read(sensor, ingest):
+    '''Return sorted (times, values, nulls) arrays of sensor readings.'''
+    data = sensor.data.filter(ingest=ingest)
+    if isinstance(data, ChunkedSensorData):
+        return data._load()
+    readings = list(data.order_by('time').values_list('time', 'value'))
+    dtype = DTYPES[sensor.data_type]
+    if not readings:
+        return (np.array([], dtype=np.int64), np.array([], dtype=dtype),
+                np.array([], dtype=bool))
+    times, values = zip(*readings)
+    nulls = np.array([value is None for value in values], dtype=bool)
+    values = np.array([dtype(0) if value is None else value
+                       for value in values], dtype=dtype)
+    if sensor.data_type == 'f':
+        nulls |= np.isnan(values)
+    return to_datetime64(times).astype(np.int64), values, nulls
+
+
+def _open(ingest, sensor):
+    '''Return the arrays of the snapshot of a sensor, or None if there is
+    none or it was built from other readings, in which case it is
+    removed.'''
+    path = _path(ingest.id, sensor.pk)
+    try:
+        with open(os.path.join(path, MANIFEST)) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if any(manifest.get(name) != value
+           for name, value in _key(ingest).items()):
+        _remove(path)
+        return None
+    try:
+        return tuple(np.load(os.path.join(path, name + '.npy'),
+                             mmap_mode='r') for name in ARRAYS)
+    except (OSError, ValueError):
+        return None
+
+
+def _build(ingest, sensor):
+    '''Build the snapshot of a sensor and return its arrays.
+
+    Returns None if the snapshot cannot be written. The snapshot is
+    written to a temporary directory which is then renamed, so readers
+    never see a partial snapshot and concurrent builds are harmless.
+    '''
+    path = _path(ingest.id, sensor.pk)
+    temp = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = tempfile.mkdtemp(dir=os.path.dirname(path),
+                                prefix='.{}-'.format(sensor.pk))
+        arrays = _read(sensor, ingest)
+        for name, array in zip(ARRAYS, arrays):
+            np.save(os.path.join(temp, name + '.npy'),
+                    np.ascontiguousarray(array))
+        manifest = dict(_key(ingest), data_type=sensor.data_type,
+                        count=len(arrays[0]))
+        with open(os.path.join(temp, MANIFEST), 'w') as file:
+            json.dump(manifest, file)
+        try:
+            os.rename(temp, path)
+        except OSError:
+            # Another process built the snapshot first.
+            pass
+    except OSError as e:
+        _log.warning('cannot snapshot sensor %s of ingest %s: %s',
+                     sensor.pk, ingest.id, e)
+        return None
+    finally:
+        if temp is not None:
+            shutil.rmtree(temp, ignore_errors=True)
+    return _open(ingest, sensor)
+
+
+def get(ingest):
+    '''Return the snapshots of a complete ingest, or None if snapshots
+    are disabled or the ingest is incomplete.
+
+    The snapshot of each sensor is built when it is first read.
+    '''
+    if not _path(ingest.id) or ingest.end is None:
+        return None
+    return Snapshot(ingest)
+
+
+def _remove(path):
+    '''Remove a snapshot directory.'''
+    if not os.path.isdir(path):
+        return
+    # Rename first so that the snapshot disappears at once; open memory
+    # maps remain valid.
+    try:
+        temp = tempfile.mkdtemp(dir=os.path.dirname(path), prefix='.old-')
+        os.rename(path, os.path.join(temp, 'old'))
+    except OSError:
+        return
+    shutil.rmtree(temp, ignore_errors=True)
+
+
+def invalidate(ingest_id):
+    '''Remove the snapshots of an ingest.'''
+    path = _path(ingest_id)
+    if path:
+        _remove(path)
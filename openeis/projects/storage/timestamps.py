@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+#}}}
+
+'''Infer and quickly parse timestamp formats.
+
+dateutil.parser.parse() handles almost any timestamp but is many times
+slower than parsing a known format. infer_timestamp_format() finds a
+format, from a list of common formats, which parses sample timestamps
+exactly as dateutil does, and TimestampParser parses a format with a
+precompiled regular expression, which is faster than strptime().
+'''
+
+import re
+from datetime import datetime
+
+import dateutil.parser
+
+
+__all__ = ['TIMESTAMP_FORMATS', 'TimestampParser', 'infer_timestamp_format']
+
+
+def _formats():
+    # Formats which dateutil may interpret differently, such as two
+    # digit years and day-first dates, are omitted so that a format
+    # matching the samples parses every timestamp as dateutil would.
+    dates = ['%Y-%m-%d', '%m/%d/%Y', '%Y/%m/%d', '%m-%d-%Y', '%d-%b-%Y',
+             '%b %d %Y', '%Y%m%d']
+    times = ['%H:%M', '%H:%M:%S', '%H:%M:%S.%f', '%I:%M %p', '%I:%M:%S %p']
+    formats = []
+    for time in times[:3]:
+        for zone in ['', '%z']:
+            formats.append('%Y-%m-%dT' + time + zone)
+    formats.extend(date + ' ' + time for date in dates for time in times)
+    formats.extend('%Y-%m-%d ' + time + '%z' for time in times[:3])
+    formats.extend(dates)
+    return formats
+
+TIMESTAMP_FORMATS = _formats()
+
+# Patterns of the strptime() directives compiled by TimestampParser, as
+# used by the _strptime module.
+_DIRECTIVES = {
+    'd': r'(3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])',
+    'f': r'([0-9]{1,6})',
+    'H': r'(2[0-3]|[0-1]\d|\d)',
+    'I': r'(1[0-2]|0[1-9]|[1-9])',
+    'm': r'(1[0-2]|0[1-9]|[1-9])',
+    'M': r'([0-5]\d|\d)',
+    'p': r'(am|pm)',
+    'S': r'(6[0-1]|[0-5]\d|\d)',
+    'Y': r'(\d\d\d\d)',
+}
+
+
+class TimestampParser:
+    '''Parse timestamps with a strptime() format.
+
+    Calling the instance with a string returns a datetime, as
+    datetime.strptime(string, format) does, or raises ValueError.
+    Formats using only the %Y, %m, %d, %H, %I, %p, %M, %S and %f
+    directives are compiled into a regular expression; others are
+    passed to strptime().
+    '''
+
+    def __init__(self, format):
+        self.format = format
+        self._regex, self._fields = self._compile(format)
+
+    @staticmethod
+    def _compile(format):
+        pattern, fields = [], []
+        for i, piece in enumerate(re.split(r'(%.)', format)):
+            if i % 2:
+                directive = piece[1]
+                if directive not in _DIRECTIVES or directive in fields:
+                    return None, None
+                pattern.append(_DIRECTIVES[directive])
+                fields.append(directive)
+            else:
+                pattern.append(r'\s+'.join(re.escape(part)
+                                           for part in re.split(r'\s+', piece)))
+        if 'H' in fields and 'I' in fields:
+            return None, None
+        return re.compile(''.join(pattern), re.IGNORECASE), fields
+
+    def __call__(self, value):
+        if self._regex is None:
+            return datetime.strptime(value, self.format)
+        match = self._regex.fullmatch(value)
+        if match is None:
+            raise ValueError('time data {!r} does not match format '
+                             '{!r}'.format(value, self.format))
+        found = dict(zip(self._fields, match.groups()))
+        if 'I' in found:
+            hour = int(found['I'])
+            if found.get('p', '').lower() == 'pm':
+                if hour != 12:
+                    hour += 12
+            elif hour == 12:
+                hour = 0
+        else:
+            hour = int(found.get('H', 0))
+        fraction = found.get('f')
+        return datetime(int(found.get('Y', 1900)), int(found.get('m', 1)),
+                        int(found.get('d', 1)), hour, int(found.get('M', 0)),
+                        int(found.get('S', 0)),
+                        int(fraction.ljust(6, '0')) if fraction else 0)
+
+    def __reduce__(self):
+        return self.__class__, (self.format,)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.format)
+
+
+def infer_timestamp_format(values, formats=TIMESTAMP_FORMATS):
+    '''Return a format parsing values as dateutil does, or None.
+
+    Each of formats is tried in order and the first which parses every
+    value dateutil can parse to the same time is returned. Values
+    dateutil cannot parse are ignored; None is returned if there are no
+    other values or no format matches.
+    '''
+    expected = []
+    for value in values:
+        try:
+            expected.append((value, dateutil.parser.parse(value)))
+        except (ValueError, TypeError, OverflowError):
+            pass
+    if not expected:
+        return None
+    for format in formats:
+        parse = TimestampParser(format)
+        try:
+            if all(parse(value) == time for value, time in expected):
+                return format
+        except (ValueError, TypeError):
+            pass
+    return None
@@ -5,11 +5,20 @@ import os.path
 import pytest
 
 from openeis.projects import models, views
+from openeis.projects.conf import settings as proj_settings
 
 list_view = {'get': 'list', 'post': 'create'}
 detail_view = {'get': 'retrieve', 'post': 'update', 'put': 'update',
                'patch': 'partial_update', 'delete': 'destroy'}
 
+@pytest.fixture(autouse=True)
+def temporary_cache_dirs(monkeypatch, tmpdir):
+    '''Keep the dataset snapshots and fits of the tests out of DATA_DIR.'''
+    monkeypatch.setattr(proj_settings, 'DATASET_SNAPSHOT_DIR',
+                        str(tmpdir.join('snapshots')))
+    monkeypatch.setattr(proj_settings, 'FIT_CACHE_DIR',
+                        str(tmpdir.join('fits')))
+
 @pytest.fixture
 def admin_user():
     '''Creates an administrator user.'''
@@ -2,12 +2,14 @@
 import datetime
 from collections import namedtuple
 
+from django.core.management import call_command
+from django.db.models import Max
 from django.utils.timezone import utc
 import pytest
 from rest_framework.test import force_authenticate, APIRequestFactory, APIClient
 from rest_framework import status
 
-from openeis.projects import views, conf
+from openeis.projects import models, views, conf
 
 from .conftest import detail_view
 
@@ -117,6 +119,69 @@ def test_dataset_merge(mixed_dataset):
     assert summary.last_row == rows[-1]
 
 
+def test_dataset_merge_sql(mixed_dataset):
+    '''Test that the single query merge matches the Python merge.'''
+
+    dataset = mixed_dataset
+    start = datetime.datetime(2012, 2, 9, 0, tzinfo=utc)
+    end = datetime.datetime(2012, 2, 10, 0, tzinfo=utc)
+    for kwargs in [{}, {'as_local_time': True}, {'start': start, 'end': end},
+                   {'start': 100, 'end': 100}, {'include_header': False}]:
+        expected = list(dataset.merge(use_sql=False, **kwargs))
+        assert list(dataset.merge(use_sql=True, **kwargs)) == expected
+
+
+def test_dataset_chunked(mixed_dataset):
+    '''Test that packing readings into chunks preserves queries.'''
+
+    dataset = mixed_dataset
+    sensors = list(dataset.map.sensors.order_by('name'))
+    start = datetime.datetime(2012, 2, 9, 0, tzinfo=utc)
+
+    def query(sensor):
+        data = sensor.data.filter(ingest=dataset)
+        return (list(dataset.merge()),
+                list(data.values_list('time', 'value')),
+                list(data.filter(time__gte=start).exclude(value=None)
+                     .values_list('time', 'value')),
+                list(data.filter(time__hour=12).values_list('time', 'value')),
+                data.count(), data.earliest().time, data.latest().time,
+                data.aggregate(value=Max('value')))
+
+    expected = [query(sensor) for sensor in sensors]
+    call_command('packsensordata', str(dataset.id), verbosity=0)
+    assert models.SensorDataChunk.objects.filter(ingest=dataset).exists()
+    assert [query(sensor) for sensor in sensors] == expected
+
+
+@pytest.mark.parametrize('storage', ['rows', 'chunks'])
+def test_perform_ingestion_bulk(monkeypatch, project, mixed_datamap,
+                                datafile_1month, datafile_1month_offset,
+                                storage):
+    '''Test that the bulk loader ingests the same data as the ORM.'''
+
+    monkeypatch.setattr(conf.settings, 'SENSOR_DATA_STORAGE', storage)
+    merged = []
+    for loader in ['orm', 'bulk']:
+        monkeypatch.setattr(conf.settings, 'INGEST_LOADER', loader)
+        monkeypatch.setattr(conf.settings, 'INGEST_BATCH_SIZE', 500)
+        dataset = models.SensorIngest.objects.create(
+                project=project, name=loader, map=mixed_datamap)
+        for name, file in [('0', datafile_1month),
+                           ('1', datafile_1month_offset)]:
+            models.SensorIngestFile.objects.create(
+                    ingest=dataset, name=name, file=file)
+        views.perform_ingestion(dataset)
+        assert not dataset.logs.filter(level=models.CRITICAL).exists()
+        readings = sum(sensor.data.filter(ingest=dataset).count()
+                       for sensor in mixed_datamap.sensors.all())
+        dataset = models.SensorIngest.objects.get(pk=dataset.pk)
+        assert dataset.rows == readings > 0
+        merged.append(list(dataset.merge()))
+    assert merged[0] == merged[1]
+    assert len(merged[0]) > 1
+
+
 def test_dataset_download_url(active_user, mixed_dataset):
     '''Tests download_url transformation.'''
 
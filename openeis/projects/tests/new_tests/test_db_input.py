@@ -0,0 +1,57 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from openeis.projects.storage.db_input import DatabaseInput
+
+
+pytestmark = pytest.mark.django_db
+
+
+TOPICS = {'load': ['Test/WholeBuildingPower'],
+          'oat': ['Test/OutdoorAirTemperature']}
+
+
+def test_map_and_sensors_fetched_once(dataset):
+    # The map, its sensors and the dataset, for its snapshot.
+    with CaptureQueriesContext(connection) as queries:
+        inp = DatabaseInput(dataset.map.id, TOPICS, dataset.id)
+    assert len(queries) == 3
+    meta = inp.get_topics_meta()['load']['Test/WholeBuildingPower']
+    assert meta['timezone'].zone == 'US/Pacific'
+    assert 'timezone' not in (
+        inp.get_sensormap()['sensors']['Test/WholeBuildingPower'])
+
+
+def test_localize_sensor_times(dataset):
+    inp = DatabaseInput(dataset.map.id, TOPICS, dataset.id)
+    load = inp.get_query_sets('load', exclude={'value': None})
+    times = [time for time, _ in load[0]]
+    topic = 'Test/WholeBuildingPower'
+    expected = [inp.localize_sensor_time(topic, time) for time in times]
+    assert inp.localize_sensor_times(topic, times) == expected
+    arrays = inp.merge_arrays({'load': load})
+    assert inp.localize_sensor_times(topic, arrays['time']) == expected
+
+
+def test_group_of_topics_reads_each_sensor(dataset):
+    topics = ['Test/WholeBuildingPower', 'Test/OutdoorAirTemperature']
+    inp = DatabaseInput(dataset.map.id, {'both': topics}, dataset.id)
+    for (_, get_queryset), topic, data in zip(
+            inp.data_map['both'], topics, inp.get_query_sets('both')):
+        assert get_queryset.sensor.name == topic
+        alone = DatabaseInput(dataset.map.id, {'one': [topic]}, dataset.id)
+        assert list(data) == list(alone.get_query_sets('one')[0])
+    load, oat = inp.get_query_sets('both')
+    assert list(load) != list(oat)
+
+
+def test_select_rows(dataset):
+    inp = DatabaseInput(dataset.map.id, TOPICS, dataset.id)
+    load = inp.get_query_sets('load', order_by='value',
+                              exclude={'value': None})[0]
+    rows = list(load)
+    indices = [0, 1, len(rows) // 2, len(rows) - 1]
+    assert list(inp.select_rows(load, indices)) == [rows[i] for i in indices]
+    assert list(inp.select_rows(rows, indices)) == [rows[i] for i in indices]
+    assert list(inp.select_rows(load, [])) == []
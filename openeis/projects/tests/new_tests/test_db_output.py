@@ -0,0 +1,126 @@
+import csv
+import datetime
+import json
+
+from django.db.models import loading
+import pytest
+import pytz
+from rest_framework.test import APIClient
+
+from openeis.applications import OutputDescriptor
+from openeis.projects import models, views
+from openeis.projects.storage import db_output
+
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def output_models():
+    '''Forget the output models cached by name, as output IDs are reused
+    once a test's transaction is rolled back.'''
+    yield
+    for app_models in loading.cache.app_models.values():
+        for name in [name for name in app_models
+                     if name.startswith('appoutputdata')]:
+            del app_models[name]
+
+@pytest.fixture
+def analysis(project, dataset):
+    return models.Analysis.objects.create(
+        project=project, dataset=dataset, name='output',
+        application='daily_summary',
+        configuration={'inputs': {}, 'parameters': {}}, reports=[])
+
+
+def read_csv(output, table_name):
+    file = output.file_table_map[table_name]
+    if not file.closed:
+        file.flush()
+    with open(file.name, newline='') as file:
+        return list(csv.reader(file))
+
+
+def test_csv_written_with_batches(monkeypatch, analysis):
+    monkeypatch.setattr(db_output, 'BATCH_SIZE', 3)
+    output_map = {'values': {'time': OutputDescriptor('timestamp', 'a/time'),
+                             'value': OutputDescriptor('float', 'a/value'),
+                             'count': OutputDescriptor('integer', 'a/count')}}
+    output = db_output.DatabaseOutputFile(analysis, output_map)
+    tz = pytz.timezone('America/Los_Angeles')
+    start = tz.localize(datetime.datetime(2014, 1, 1))
+    for i in range(7):
+        output.insert_row('values', {
+            'time': start + datetime.timedelta(hours=i),
+            'value': i / 2, 'count': i})
+    # Full batches are on disk before the output is closed.
+    assert len(read_csv(output, 'values')) == 7
+    output.close()
+
+    rows = read_csv(output, 'values')
+    header = rows.pop(0)
+    model = models.AppOutput.objects.get(
+        analysis=analysis, name='values').get_data_model()
+    expected = [[str(getattr(obj, name)) for name in header]
+                for obj in model.objects.all()]
+    assert rows == expected
+    assert rows[0][header.index('time')] == '2014-01-01 08:00:00+00:00'
+
+
+def test_output_api_pagination(monkeypatch, active_user, analysis):
+    monkeypatch.setattr(views.proj_settings, 'OUTPUT_BATCH_SIZE', 4)
+    output = db_output.DatabaseOutput(
+        analysis, {'values': {'value': OutputDescriptor('integer', 'a/value')}})
+    for i in range(10):
+        output.insert_row('values', {'value': i})
+    output.close()
+    assert models.AppOutput.objects.get(name='values').row_count == 10
+
+    client = APIClient()
+    client.force_authenticate(user=active_user)
+    url = '/api/analyses/{}/data'.format(analysis.pk)
+    response = client.get(url)
+    assert response.data == {'values': {'rows': 10}, 'log': {'rows': 0}}
+
+    values, after = [], None
+    while True:
+        params = {'output': 'values', 'count': 3}
+        if after is not None:
+            params['after'] = after
+        response = client.get(url, params)
+        if not response.data:
+            break
+        values.extend(row['value'] for row in response.data)
+        after = response['X-Next-After']
+    assert values == list(range(10))
+
+    response = client.get(url, {'output': 'values', 'start': 8})
+    assert [row['value'] for row in response.data] == [8, 9]
+    response = client.get(url, {'output': 'values', 'start': 20})
+    assert response.data == []
+
+    response = client.get(url, {'output': 'values', 'stream': 'true'})
+    content = b''.join(response.streaming_content).decode('utf-8')
+    assert json.loads(content) == [{'value': i} for i in range(10)]
+
+    response = client.get(url, {'output': 'values', 'format': 'csv'})
+    content = b''.join(response.streaming_content).decode('utf-8')
+    assert content.split() == ['value'] + [str(i) for i in range(10)]
+
+
+def test_row_count_cached_once_ended(analysis):
+    output = db_output.DatabaseOutput(
+        analysis, {'values': {'value': OutputDescriptor('integer', 'a/value')}})
+    app_output = models.AppOutput.objects.get(name='values')
+    output.insert_row('values', {'value': 0})
+    output.write_batch('values')
+    assert app_output.get_row_count() == 1
+    assert models.AppOutput.objects.get(name='values').row_count is None
+
+    output.insert_row('values', {'value': 1})
+    output.write_batch('values')
+    analysis.ended = datetime.datetime.now(pytz.utc)
+    analysis.save()
+    app_output = models.AppOutput.objects.get(name='values')
+    assert app_output.get_row_count() == 2
+    assert models.AppOutput.objects.get(name='values').row_count == 2
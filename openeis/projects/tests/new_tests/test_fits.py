@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from openeis.projects.storage import fits
+
+
+pytestmark = pytest.mark.django_db
+
+
+def test_fit_is_found_for_the_same_readings(dataset):
+    key = fits.key('test', 1)
+    fits.put(dataset, key, {'a': np.arange(3), 'b': 2.0})
+    fit = fits.get(dataset, key)
+    assert list(fit['a']) == [0, 1, 2]
+    assert fit['b'] == 2.0
+    assert fits.get(dataset, fits.key('test', 2)) is None
+
+
+def test_fit_begun_before_a_change_is_not_found(dataset):
+    key = fits.key('test')
+    stale = type(dataset).objects.get(pk=dataset.pk)
+    dataset.readings_changed()
+    # The fit of the earlier readings is saved after the change.
+    fits.put(stale, key, {'a': np.arange(3)})
+    assert fits.get(dataset, key) is None
+    fits.put(dataset, key, {'a': np.arange(4)})
+    assert len(fits.get(dataset, key)['a']) == 4
@@ -0,0 +1,101 @@
+import datetime
+import threading
+import types
+
+from django.utils.timezone import utc
+import pytest
+
+from openeis.projects import jobqueue, models
+
+
+pytestmark = pytest.mark.django_db
+
+Job = models.AnalysisJob
+
+
+@pytest.fixture(autouse=True)
+def no_embedded_pool(monkeypatch):
+    monkeypatch.setattr(jobqueue.proj_settings, 'ANALYSIS_POOL_EMBEDDED', False)
+
+
+def create_analysis(project, dataset, name):
+    return models.Analysis.objects.create(
+        project=project, dataset=dataset, name=name,
+        application='daily_summary',
+        configuration={'inputs': {}, 'parameters': {}}, reports=[])
+
+
+@pytest.fixture
+def other_project(staff_user):
+    return models.Project.objects.create(owner=staff_user, name='Other')
+
+
+def test_claim_order_and_user_limit(project, other_project, dataset):
+    low = jobqueue.enqueue(create_analysis(project, dataset, 'low'))
+    high = jobqueue.enqueue(create_analysis(project, dataset, 'high'), 5)
+    other = jobqueue.enqueue(create_analysis(other_project, dataset, 'other'))
+
+    assert jobqueue.claim('test', user_limit=1).pk == high.pk
+    # The first user is at their limit, so the other user's job is next.
+    assert jobqueue.claim('test', user_limit=1).pk == other.pk
+    assert jobqueue.claim('test', user_limit=1) is None
+    assert jobqueue.claim('test', user_limit=0).pk == low.pk
+    assert set(Job.objects.values_list('state', 'worker')) == {
+        (Job.RUNNING, 'test')}
+
+
+def test_cancel(project, dataset):
+    queued = jobqueue.enqueue(create_analysis(project, dataset, 'queued'))
+    running = jobqueue.enqueue(create_analysis(project, dataset, 'running'), 1)
+    assert jobqueue.claim('test', user_limit=0).pk == running.pk
+
+    assert jobqueue.cancel(queued.analysis)
+    job = Job.objects.get(pk=queued.pk)
+    assert job.state == Job.CANCELED
+    assert job.analysis.ended is not None
+    assert jobqueue.claim('test', user_limit=0) is None
+    assert not jobqueue.cancel(queued.analysis)
+
+    # Running jobs are only flagged; the pool terminates them.
+    assert jobqueue.cancel(running.analysis)
+    job = Job.objects.get(pk=running.pk)
+    assert job.state == Job.RUNNING and job.cancel_requested
+
+
+def test_fail_stale(project, dataset):
+    job = jobqueue.enqueue(create_analysis(project, dataset, 'orphan'))
+    jobqueue.claim('test', user_limit=0)
+    assert jobqueue.fail_stale(timeout=60) == 0
+    Job.objects.filter(pk=job.pk).update(
+        heartbeat=datetime.datetime.utcnow().replace(tzinfo=utc) -
+                  datetime.timedelta(minutes=5))
+    assert jobqueue.fail_stale(timeout=60) == 1
+    job = Job.objects.get(pk=job.pk)
+    assert job.state == Job.FAILED
+    assert job.analysis.ended is not None
+
+
+class _SyncThread:
+    '''Stands in for the pool thread, polling once when started.'''
+
+    def __init__(self, target, **kwargs):
+        self.pool = target.__self__
+
+    def start(self):
+        self.pool.poll()
+
+
+def test_server_start_runs_queued_jobs(monkeypatch, project, dataset):
+    job = jobqueue.enqueue(create_analysis(project, dataset, 'queued'))
+    assert job.state == Job.QUEUED
+    started = []
+    monkeypatch.setattr(jobqueue.WorkerPool, '_start',
+                        lambda self, pk: started.append(pk))
+    monkeypatch.setattr(jobqueue, 'threading', types.SimpleNamespace(
+            Thread=_SyncThread, Event=threading.Event))
+    monkeypatch.setattr(jobqueue, '_embedded_pool', None)
+    assert jobqueue.start_server_pool() is None
+    monkeypatch.setattr(jobqueue.proj_settings, 'ANALYSIS_POOL_EMBEDDED', True)
+    assert jobqueue.start_server_pool() is not None
+    assert started == [job.pk]
+    assert Job.objects.get(pk=job.pk).state == Job.RUNNING
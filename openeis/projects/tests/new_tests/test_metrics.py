@@ -0,0 +1,66 @@
+import pytest
+from django.db import connection
+
+from openeis.projects import models
+from openeis.projects.metrics import Histogram, Metrics
+
+
+pytestmark = pytest.mark.django_db
+
+
+def test_stage_counts_queries_and_rows(project):
+    metrics = Metrics()
+    with metrics.stage('query'):
+        list(models.Project.objects.all())
+        with metrics.stage('query'):
+            list(models.Project.objects.all())
+    with metrics.stage('output', rows=3):
+        pass
+    stages = metrics.as_dict()['stages']
+    assert stages['query']['calls'] == 1
+    assert stages['query']['queries'] == 2
+    assert stages['output']['rows'] == 3
+    assert stages['output']['queries'] == 0
+
+
+def test_merged_counts_rows_as_iterated():
+    metrics = Metrics(count_queries=False)
+    merge = metrics.merged('merge', lambda *args: iter([1, 2, 3]))
+    rows = merge()
+    assert metrics.stages['merge']['rows'] == 0
+    assert list(rows) == [1, 2, 3]
+    assert metrics.stages['merge']['rows'] == 3
+    merge = metrics.merged('merge', lambda *args: {'time': [1, 2]})
+    merge()
+    assert metrics.stages['merge']['rows'] == 5
+
+
+def test_merged_iteration_queries_and_nesting(project):
+    metrics = Metrics()
+    def rows():
+        yield from models.Project.objects.all()
+        yield from models.Project.objects.all()
+    outer = metrics.merged('merge', lambda: (row for row in inner()))
+    inner = metrics.merged('merge', rows)
+    assert len(list(outer())) == 2
+    stats = metrics.stages['merge']
+    assert stats['rows'] == 2
+    assert stats['queries'] == 2
+    assert stats['calls'] == 1
+
+
+def test_close_restores_debug_cursor():
+    use_debug_cursor = connection.use_debug_cursor
+    metrics = Metrics()
+    assert connection.use_debug_cursor
+    metrics.close()
+    assert connection.use_debug_cursor == use_debug_cursor
+
+
+def test_histogram_buckets():
+    histogram = Histogram()
+    for seconds in (0.0, 0.000003, 0.001, 0.0009):
+        histogram.add(seconds)
+    result = histogram.as_dict()
+    assert result['count'] == 4
+    assert result['buckets'] == {'1': 1, '2': 1, '512': 2}
@@ -0,0 +1,59 @@
+import datetime
+
+from django.db import connection
+from django.utils.timezone import utc
+import pytest
+
+from openeis.projects import models
+
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(connection.vendor != 'sqlite',
+                       reason='query plans are checked on SQLite only'),
+]
+
+
+def query_plan(queryset):
+    '''Return the details of SQLite's plan for executing queryset.'''
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    cursor = connection.cursor()
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def assert_indexed(queryset):
+    '''Fail if queryset scans a whole table or sorts the results.'''
+    plan = query_plan(queryset)
+    for detail in plan:
+        assert not (detail.startswith('SCAN') and 'INDEX' not in detail), plan
+        assert 'TEMP B-TREE' not in detail, plan
+
+
+def test_sensor_data_plans(mixed_dataset):
+    '''Test that per-sensor reads use the (sensor, ingest, time) index.'''
+
+    dataset = mixed_dataset
+    start = datetime.datetime(2012, 2, 9, 0, tzinfo=utc)
+    for sensor in dataset.map.sensors.all():
+        data = sensor.data.filter(ingest=dataset)
+        assert_indexed(data)
+        assert_indexed(data.filter(time__gte=start, time__lt=start +
+                                   datetime.timedelta(days=1)))
+        assert_indexed(data.exclude(value=None))
+        assert_indexed(sensor.data_class.objects.filter(
+                sensor=sensor, ingest=dataset).order_by('time'))
+        assert_indexed(models.SensorDataChunk.objects.filter(
+                sensor=sensor, ingest=dataset))
+
+
+def test_output_data_plans(project):
+    '''Test that reading an output uses the (source, id) index.'''
+
+    analysis = models.Analysis.objects.create(project=project)
+    output = models.AppOutput.objects.create(
+            analysis=analysis, name='test',
+            fields={'time': 'timestamp', 'value': 'float'})
+    model = output.get_data_model()
+    assert_indexed(model.objects.order_by('id'))
+    assert_indexed(model.objects.filter(id__gt=100).order_by('id'))
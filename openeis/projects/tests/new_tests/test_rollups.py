@@ -0,0 +1,65 @@
+import pytest
+from django.db.models import Avg, Count, Max, Min, Sum
+
+from openeis.projects import models
+from openeis.projects.storage.db_input import DatabaseInput
+from openeis.projects.storage.rollups import RollupBuilder
+
+
+pytestmark = pytest.mark.django_db
+
+
+def build_rollups(dataset, **kwargs):
+    builder = RollupBuilder(models.SensorRollup, dataset, **kwargs)
+    for obj in models.FloatSensorData.objects.filter(ingest=dataset):
+        builder.add(obj.sensor, obj.time, obj.value)
+    builder.close()
+
+
+def query(dataset, *args, **kwargs):
+    inp = DatabaseInput(dataset.map.id,
+                        {'load': ['Test/WholeBuildingPower']}, dataset.id)
+    return inp.get_query_sets('load', *args, **kwargs)
+
+
+def assert_series_equal(actual, expected):
+    assert len(actual) == len(expected)
+    for (time, value), (expected_time, expected_value) in zip(actual,
+                                                               expected):
+        assert time == expected_time
+        assert value == pytest.approx(expected_value)
+
+
+@pytest.mark.parametrize('group_by', ['hour', 'day'])
+@pytest.mark.parametrize('aggregate', [Avg, Count, Max, Min, Sum])
+def test_rollups_match_readings(dataset, group_by, aggregate):
+    kwargs = {'group_by': group_by, 'group_by_aggregation': aggregate,
+              'exclude': {'value': None}}
+    expected = [list(x) for x in query(dataset, **kwargs)]
+    # Small batches and buckets exercise combining saved rollups.
+    build_rollups(dataset, batch_size=100, max_buckets=50)
+    assert models.SensorRollup.objects.filter(
+            ingest=dataset, period='all').count() == 2
+    actual = query(dataset, **kwargs)
+    assert all(isinstance(x, list) for x in actual)
+    for series, expected_series in zip(actual, expected):
+        assert_series_equal(series, expected_series)
+
+
+def test_rollups_answer_all(dataset):
+    expected = query(dataset, group_by='all', group_by_aggregation=Avg)
+    build_rollups(dataset)
+    assert query(dataset, group_by='all',
+                 group_by_aggregation=Avg) == pytest.approx(expected)
+
+
+def test_incomplete_rollups_are_not_used(dataset):
+    build_rollups(dataset)
+    models.SensorRollup.objects.filter(period='all').delete()
+    result = query(dataset, group_by='hour', group_by_aggregation=Avg)
+    assert not isinstance(result[0], list)
+
+
+def test_update_only_skips_sensors_without_rollups(dataset):
+    build_rollups(dataset, update_only=True)
+    assert not models.SensorRollup.objects.exists()
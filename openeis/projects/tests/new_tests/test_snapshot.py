@@ -0,0 +1,131 @@
+import datetime
+import json
+import os
+import shutil
+
+import pytest
+from django.db.models import Avg
+from django.utils.timezone import utc
+
+from openeis.projects.conf import settings as proj_settings
+from openeis.projects.storage import snapshot
+from openeis.projects.storage.db_input import DatabaseInput
+from openeis.projects.storage.snapshot import SnapshotSensorData
+
+
+pytestmark = pytest.mark.django_db
+
+
+TOPICS = {'load': ['Test/WholeBuildingPower'],
+          'oat': ['Test/OutdoorAirTemperature']}
+
+
+@pytest.fixture
+def snapshot_dir(monkeypatch, tmpdir):
+    monkeypatch.setattr(proj_settings, 'DATASET_SNAPSHOT_DIR', str(tmpdir))
+    return str(tmpdir)
+
+
+@pytest.fixture
+def complete_dataset(dataset):
+    dataset.end = datetime.datetime.utcnow().replace(tzinfo=utc)
+    dataset.save()
+    return dataset
+
+
+QUERIES = [
+    {},
+    {'exclude': {'value': None}},
+    {'filter_': {'time__hour': 3}, 'exclude': {'value__isnull': True}},
+    {'order_by': 'value'},
+    {'group_by': 'day', 'group_by_aggregation': Avg},
+]
+
+
+@pytest.mark.parametrize('kwargs', QUERIES)
+def test_snapshot_matches_database(monkeypatch, snapshot_dir,
+                                   complete_dataset, kwargs):
+    # Keep rollups from answering the grouped query.
+    monkeypatch.setattr(DatabaseInput, '_get_rollups',
+                        lambda self, *args: None)
+    monkeypatch.setattr(proj_settings, 'DATASET_SNAPSHOT_DIR', None)
+    inp = DatabaseInput(complete_dataset.map.id, TOPICS, complete_dataset.id)
+    expected = [list(x) for x in inp.get_query_sets('load', **kwargs)]
+    merged = inp.merge_arrays(inp.get_query_sets('load', wrap_for_merge=True))
+
+    monkeypatch.setattr(proj_settings, 'DATASET_SNAPSHOT_DIR', snapshot_dir)
+    inp = DatabaseInput(complete_dataset.map.id, TOPICS, complete_dataset.id)
+    assert inp.snapshot is not None
+    result = inp.get_query_sets('load', **kwargs)
+    assert all(isinstance(x, SnapshotSensorData) for x in result)
+    if 'group_by' in kwargs:
+        # Averages are summed in a different order than by the database.
+        expected = [[(time, value if value is None else pytest.approx(value))
+                     for time, value in rows] for rows in expected]
+    assert [list(x) for x in result] == expected
+    arrays = inp.merge_arrays(inp.get_query_sets('load', wrap_for_merge=True))
+    assert (arrays['time'] == merged['time']).all()
+    assert (arrays['load'] == merged['load']).all()
+
+
+def test_snapshot_invalidated_on_delete(snapshot_dir, complete_dataset):
+    sensor = complete_dataset.map.sensors.get(name=TOPICS['load'][0])
+    assert snapshot.get(complete_dataset).data(sensor) is not None
+    path = os.path.join(snapshot_dir, str(complete_dataset.id))
+    assert os.path.isdir(os.path.join(path, str(sensor.pk)))
+    complete_dataset.delete()
+    assert not os.path.exists(path)
+
+
+def test_incomplete_dataset_has_no_snapshot(snapshot_dir, dataset):
+    assert snapshot.get(dataset) is None
+
+
+def test_only_sensors_read_are_snapshot(snapshot_dir, complete_dataset):
+    inp = DatabaseInput(complete_dataset.map.id, TOPICS, complete_dataset.id)
+    inp.get_query_sets('load')
+    load, oat = (complete_dataset.map.sensors.get(name=TOPICS[name][0])
+                 for name in ('load', 'oat'))
+    path = os.path.join(snapshot_dir, str(complete_dataset.id))
+    assert os.listdir(path) == [str(load.pk)]
+
+
+def test_snapshot_of_reused_id_is_replaced(snapshot_dir, complete_dataset):
+    sensor = complete_dataset.map.sensors.get(name=TOPICS['load'][0])
+    snapshot.get(complete_dataset).arrays(sensor)
+    complete_dataset.start = complete_dataset.start - datetime.timedelta(1)
+    assert snapshot.get(complete_dataset).arrays(sensor) is not None
+    path = os.path.join(snapshot_dir, str(complete_dataset.id),
+                        str(sensor.pk), snapshot.MANIFEST)
+    with open(path) as file:
+        assert json.load(file)['start'] == str(complete_dataset.start)
+
+
+def test_snapshot_built_before_a_change_is_rebuilt(snapshot_dir,
+                                                   complete_dataset):
+    sensor = complete_dataset.map.sensors.get(name=TOPICS['load'][0])
+    times, _, _ = snapshot.get(complete_dataset).arrays(sensor)
+    path = os.path.join(snapshot_dir, str(complete_dataset.id))
+    stale = os.path.join(snapshot_dir, 'stale')
+    shutil.copytree(path, stale)
+    latest = sensor.data.filter(ingest=complete_dataset).latest()
+    sensor.data_class.objects.create(
+        ingest=complete_dataset, sensor=sensor,
+        time=latest.time + datetime.timedelta(hours=1), value=1.0)
+    complete_dataset.readings_changed()
+    # A build which started before the change finishes after it.
+    os.rename(stale, path)
+    rebuilt, _, _ = snapshot.get(complete_dataset).arrays(sensor)
+    assert len(rebuilt) == len(times) + 1
+
+
+def test_snapshot_write_errors_fall_back_to_database(
+        monkeypatch, snapshot_dir, complete_dataset):
+    def save(*args, **kwargs):
+        raise OSError('No space left on device')
+    monkeypatch.setattr(snapshot.np, 'save', save)
+    inp = DatabaseInput(complete_dataset.map.id, TOPICS, complete_dataset.id)
+    result = inp.get_query_sets('load')
+    assert not any(isinstance(x, SnapshotSensorData) for x in result)
+    assert os.listdir(os.path.join(snapshot_dir,
+                                   str(complete_dataset.id))) == []
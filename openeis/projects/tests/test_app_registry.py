@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+
+import json
+import sys
+
+import pytest
+
+from openeis.applications import ApplicationRegistry
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    package = tmp_path / 'registry_apps'
+    package.mkdir()
+    (package / '__init__.py').write_text('')
+    (package / 'good.py').write_text(
+        'import registry_apps.helper\n\n'
+        'class Application:\n    name = "good"\n')
+    (package / 'broken.py').write_text(
+        'raise ImportError("missing")\n\nclass Application:\n    pass\n')
+    (package / 'helper.py').write_text('LOADED = True\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield ApplicationRegistry('registry_apps', [str(package)])
+    for name in list(sys.modules):
+        if name.startswith('registry_apps'):
+            del sys.modules[name]
+
+
+def test_lazy_import(registry):
+    assert registry.names == ['broken', 'good']
+    assert 'registry_apps.good' not in sys.modules
+    assert registry.get('good').name == 'good'
+    assert 'registry_apps.good' in sys.modules
+    assert registry.get('broken') is None
+    assert registry.get('helper') is None
+    assert list(registry) == ['good']
+
+
+def test_describe_manifest(registry, tmp_path):
+    cache = str(tmp_path / 'manifest.json')
+    describe = lambda klass: {'name': klass.name}
+    assert registry.describe(describe, cache=cache) == {
+        'good': {'name': 'good'}}
+    assert set(json.load(open(cache))['applications']) == {'good'}
+
+    sys.modules.pop('registry_apps.good')
+    fresh = ApplicationRegistry('registry_apps', registry._path)
+    assert fresh.describe(describe, cache=cache) == {'good': {'name': 'good'}}
+    # The description came from the manifest without importing the module.
+    assert 'registry_apps.good' not in sys.modules
+
+
+
+def test_describe_manifest_depends_on_bases_and_version(registry, tmp_path):
+    package = tmp_path / 'registry_apps'
+    (package / 'base.py').write_text('class Base:\n    name = "base"\n')
+    (package / 'derived.py').write_text(
+        'from registry_apps.base import Base\n\n'
+        'class Application(Base):\n    pass\n')
+    cache = str(tmp_path / 'manifest.json')
+    describe = lambda klass: {'name': klass.name}
+    assert registry.describe(describe, cache=cache, version='1')[
+        'derived'] == {'name': 'base'}
+
+    # A change of the base class is seen although derived.py is unchanged.
+    (package / 'base.py').write_text('class Base:\n    name = "changed"\n')
+    for name in ['registry_apps.base', 'registry_apps.derived']:
+        sys.modules.pop(name)
+    fresh = ApplicationRegistry('registry_apps', registry._path)
+    assert fresh.describe(describe, cache=cache, version='1')[
+        'derived'] == {'name': 'changed'}
+
+    sys.modules.pop('registry_apps.good')
+    fresh = ApplicationRegistry('registry_apps', registry._path)
+    fresh.describe(describe, cache=cache, version='2')
+    assert 'registry_apps.good' in sys.modules
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+import random
+
+import numpy as np
+import pytest
+import pytz
+
+from openeis.projects.storage import chunks
+
+
+Chunk = namedtuple('Chunk', 'time_data value_data null_data')
+
+START = datetime(2014, 3, 1, tzinfo=pytz.utc)
+
+
+def make_readings(data_type, count=500, null_rate=0.1):
+    rand = random.Random(count)
+    make = {'f': rand.random, 'i': lambda: rand.randint(-10**12, 10**12),
+            'b': lambda: rand.random() < 0.5}[data_type]
+    times = [START + timedelta(seconds=i * 60 + rand.randint(0, 59))
+             for i in range(count)]
+    values = [None if rand.random() < null_rate else make()
+              for i in range(count)]
+    return times, values
+
+
+@pytest.mark.parametrize('data_type', ['f', 'i', 'b'])
+@pytest.mark.parametrize('null_rate', [0, 0.1])
+def test_pack_unpack(data_type, null_rate):
+    times, values = make_readings(data_type, null_rate=null_rate)
+    # Packing sorts the readings by time.
+    order = list(range(len(times)))
+    random.Random(0).shuffle(order)
+    fields = chunks.pack([chunks.to_microseconds(times[i]) for i in order],
+                         [values[i] for i in order], data_type)
+    assert fields['start'] == times[0]
+    assert fields['end'] == times[-1]
+    assert fields['count'] == len(times)
+    present = [value for value in values if value is not None]
+    assert fields['minimum'] == min(present)
+    assert fields['maximum'] == max(present)
+    assert bool(fields['null_data']) == (None in values)
+    chunk = Chunk(fields['time_data'], fields['value_data'],
+                  fields['null_data'])
+    unpacked_times, unpacked_values, nulls = chunks.unpack(chunk, data_type)
+    assert [chunks.from_microseconds(time)
+            for time in unpacked_times.tolist()] == times
+    assert [None if null else value for value, null in
+            zip(unpacked_values.tolist(), nulls.tolist())] == values
+
+
+def test_local_fields():
+    zone = pytz.timezone('America/Los_Angeles')
+    # Span the start of daylight saving time on 2014-03-09.
+    times = [START + timedelta(minutes=37 * i) for i in range(1000)]
+    extract = chunks.local_fields(
+            np.array([chunks.to_microseconds(time) for time in times]), zone)
+    local = [time.astimezone(zone) for time in times]
+    assert extract('year').tolist() == [time.year for time in local]
+    assert extract('month').tolist() == [time.month for time in local]
+    assert extract('day').tolist() == [time.day for time in local]
+    assert extract('hour').tolist() == [time.hour for time in local]
+    assert extract('minute').tolist() == [time.minute for time in local]
+    assert extract('week_day').tolist() == [
+            time.isoweekday() % 7 + 1 for time in local]
+
+
+def test_match_in():
+    times = np.array([chunks.to_microseconds(START + timedelta(minutes=i))
+                      for i in range(4)])
+    values = np.array([1.0, 2.0, 3.0, 2.0])
+    nulls = np.array([False, False, False, True])
+    def match(field, value):
+        return chunks.ChunkedSensorData._match(
+                None, times, values, nulls, field, 'in', value).tolist()
+    # Null readings never match.
+    assert match('value', [2.0, 3.0]) == [False, True, True, False]
+    assert match('time', [START, START + timedelta(minutes=2)]) == [
+            True, False, True, False]
@@ -87,6 +87,8 @@ class TestDynamicModelCreation(TestCase):
 
     def tearDown(self):
         models.Analysis = self._Analysis
+        loading.cache.app_models[self._Analysis._meta.app_label][
+            self._Analysis._meta.model_name] = self._Analysis
 
     def test_table_naming(self):
         '''Test that table and fields are properly named and ordered.
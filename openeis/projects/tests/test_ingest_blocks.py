@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+
+import io
+import random
+
+import numpy as np
+import pytest
+import pytz
+
+from openeis.projects.storage.ingest import (
+    BooleanColumn, DateTimeColumn, FloatColumn, IntegerColumn, StringColumn,
+    IngestError, ingest_file, ingest_file_blocks, iter_block_rows)
+
+
+COLUMNS = [
+    DateTimeColumn(0, formats=['%m/%d/%Y %H:%M'],
+                   tzinfo=pytz.timezone('America/Los_Angeles')),
+    FloatColumn(1, minimum=-10, maximum=100),
+    FloatColumn(2),
+    IntegerColumn(3, minimum=1),
+    BooleanColumn(4),
+    StringColumn(5),
+]
+
+CELLS = [
+    ['1/1/2014 0:00', '3/9/2014 2:30', '2014-06-01T12:00:00Z', '', 'bad'],
+    ['1.5', '-11', '150', ' 2 ', '', 'x', 'nan', '1e3'],
+    ['0.25', '-1', '', '1_000', 'inf'],
+    ['7', '0x1f', '010', '', '0', '99999999999999999999', '1.5', '-3'],
+    ['1', '0', 'yes', 'F', '', 'maybe', '2.5', 'TRUE'],
+    ['a', '', 'b'],
+]
+
+
+def make_file(rows, seed, clean=False):
+    rand = random.Random(seed)
+    lines = ['Date,A,B,C,D,E']
+    for i in range(rows):
+        if clean:
+            day, hour = divmod(i, 24)
+            line = ['1/{}/2014 {}:00'.format(day % 28 + 1, hour),
+                    str(rand.uniform(0, 50)), str(rand.random()),
+                    str(rand.randint(1, 100)), rand.choice(['0', '1']),
+                    'x']
+        else:
+            line = [rand.choice(cells) for cells in CELLS]
+        lines.append(','.join(line))
+    data = io.BytesIO('\n'.join(lines).encode())
+    data.size = len(data.getvalue())
+    return data
+
+
+def summarize(rows):
+    def cell(col):
+        # Compare errors by type and message and NaN by name.
+        if isinstance(col, IngestError):
+            return type(col), str(col)
+        if isinstance(col, float) and col != col:
+            return 'nan'
+        return col
+    return [(row.line_num, row.position, [cell(col) for col in row.columns])
+            for row in rows]
+
+
+@pytest.mark.parametrize('clean', [False, True])
+@pytest.mark.parametrize('block_size', [1, 7, 1000])
+def test_block_rows(block_size, clean):
+    '''Test that block parsing produces the same rows as cell parsing.'''
+    expected = summarize(ingest_file(make_file(500, 1, clean), COLUMNS))
+    blocks = ingest_file_blocks(make_file(500, 1, clean), COLUMNS, block_size)
+    result = summarize(iter_block_rows(blocks, COLUMNS))
+    assert result == expected
+    # Compare exact types too (e.g. float and not numpy.float64).
+    assert [[type(col) for col in columns] for *_, columns in result] == \
+           [[type(col) for col in columns] for *_, columns in expected]
+
+
+def test_block_arrays():
+    '''Test the typed arrays and error indexes of a block.'''
+    [block] = ingest_file_blocks(make_file(300, 2), COLUMNS, 1000)
+    assert block.columns[0].values.dtype == np.dtype('datetime64[us]')
+    assert block.columns[1].values.dtype == np.float64
+    assert block.columns[4].values.dtype == np.bool_
+    rows = list(ingest_file(make_file(300, 2), COLUMNS))
+    error_rows, error_columns = block.error_indexes()
+    expected = sorted((i, j) for i, row in enumerate(rows)
+                      for j, col in enumerate(row.columns)
+                      if isinstance(col, IngestError))
+    assert sorted(zip(error_rows.tolist(), error_columns.tolist())) == expected
+    for column in block.columns:
+        assert not column.mask[column.error_rows].any()
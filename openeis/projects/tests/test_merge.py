@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+
+from datetime import datetime, timedelta
+import random
+
+import numpy as np
+import pytest
+import pytz
+
+from openeis.projects.storage import merge
+
+
+def t(hour):
+    return datetime(2000, 1, 1, 8) + timedelta(hours=hour)
+
+
+OAT = [[(t(0), 50.0), (t(1), 51.0), (t(2), 52.0)],
+       [(t(0), 50.0), (t(1), 50.0), (t(2), 52.0)]]
+
+
+def rows(generator):
+    return [list(row.items()) for row in generator]
+
+
+def test_complete_streams():
+    energy = [[(t(0), 100), (t(1), 100), (t(2), 100)]]
+    expect = [[('time', t(i)), ('OAT', [OAT[0][i][1], OAT[1][i][1]]),
+               ('Energy', [100])] for i in range(3)]
+    for func in [merge.merge_drop, merge.merge_no_drop, merge.merge_fill]:
+        assert rows(func({'OAT': OAT}, {'Energy': energy})) == expect
+
+
+@pytest.mark.parametrize('energy,drop,no_drop,fill', [
+    # Missing timestamp in middle
+    ([(t(0), 100), (t(2), 101)],
+     [[100], [101]], [[100], [None], [101]], [[100], [100], [101]]),
+    # Missing first timestamp
+    ([(t(1), 100), (t(2), 101)],
+     [[100], [101]], [[None], [100], [101]], [[None], [100], [101]]),
+    # Missing last timestamp
+    ([(t(0), 100), (t(1), 101)],
+     [[100], [101]], [[100], [101], [None]], [[100], [101], [101]]),
+    # Empty stream
+    ([], [], [[None]] * 3, [[None]] * 3),
+])
+def test_partial_streams(energy, drop, no_drop, fill):
+    for func, expect in [(merge.merge_drop, drop),
+                         (merge.merge_no_drop, no_drop),
+                         (merge.merge_fill, fill)]:
+        result = list(func({'OAT': OAT}, {'Energy': [energy]}))
+        assert [row['Energy'] for row in result] == expect
+        assert all(list(row) == ['time', 'OAT', 'Energy'] for row in result)
+
+
+def test_group_spread_over_arguments():
+    '''Streams for a group given in separate arguments stay together.'''
+    a = [(t(0), 1)]
+    b = [(t(0), 2)]
+    c = [(t(0), 3)]
+    result = list(merge.merge_drop({'x': [a]}, {'y': [b]}, {'x': [c]}))
+    assert list(result[0].items()) == [('time', t(0)), ('x', [1, 3]),
+                                       ('y', [2])]
+
+
+def reference(streams, mode):
+    '''Straightforward merge of unique, time-ordered streams.'''
+    maps = [dict(stream) for stream in streams]
+    times = set().union(*maps)
+    if mode == 'drop':
+        times = times.intersection(*maps)
+    result, latest = [], [None] * len(maps)
+    for time in sorted(times):
+        values = [m.get(time) for m in maps]
+        if mode == 'fill':
+            latest = [m[time] if time in m else last
+                      for m, last in zip(maps, latest)]
+            values = list(latest)
+        result.append((time, values))
+    return result
+
+
+@pytest.mark.parametrize('mode,func', [('drop', merge.merge_drop),
+                                       ('no_drop', merge.merge_no_drop),
+                                       ('fill', merge.merge_fill)])
+def test_random_streams(mode, func):
+    rand = random.Random(42)
+    for _ in range(50):
+        streams = [[(t(hour), rand.random())
+                    for hour in range(200) if rand.random() < 0.9]
+                   for _ in range(rand.randint(1, 12))]
+        expect = reference(streams, mode)
+        result = [(row['time'], row['a'] + row['b'])
+                  for row in func({'a': streams[:1]}, {'b': streams[1:]})]
+        assert result == expect
+
+
+@pytest.mark.parametrize('drop,fill,func', [
+    (True, False, merge.merge_drop),
+    (False, False, merge.merge_no_drop),
+    (False, True, merge.merge_fill)])
+def test_merge_arrays(drop, fill, func):
+    rand = random.Random(7)
+    streams = [[(t(hour), rand.choice([rand.random(), None]))
+                for hour in range(100) if rand.random() < 0.9]
+               for _ in range(5)]
+    args = [{'a': streams[:2]}, {'b': streams[2:]}, {'c': []}]
+    rows = list(func(*args))
+    result = merge.merge_arrays(*args, drop_partial_lines=drop,
+                                fill_in_data=fill)
+    assert list(result) == ['time', 'a', 'b', 'c']
+    assert result['time'].dtype == np.dtype('datetime64[us]')
+    assert result['time'].tolist() == [row['time'] for row in rows]
+    for group, width in [('a', 2), ('b', 3), ('c', 0)]:
+        assert result[group].shape == (len(rows), width)
+        expect = np.array([row[group] for row in rows], dtype=float)
+        np.testing.assert_array_equal(result[group].reshape(expect.shape),
+                                      expect)
+
+
+def test_merge_arrays_aware_and_string_times():
+    eastern = pytz.timezone('US/Eastern')
+    aware = [(eastern.localize(t(0)), 1.0), (eastern.localize(t(1)), 2.0)]
+    strings = [('2000-01-01 13:00:00Z', 3.0), ('2000-01-01 14:00:00Z', 4.0)]
+    result = merge.merge_arrays({'a': [aware], 'b': [strings]})
+    assert result['time'].tolist() == [datetime(2000, 1, 1, 13),
+                                       datetime(2000, 1, 1, 14)]
+    assert result['a'][:, 0].tolist() == [1.0, 2.0]
+    assert result['b'][:, 0].tolist() == [3.0, 4.0]
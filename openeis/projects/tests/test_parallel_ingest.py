@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+
+import io
+import random
+
+import pytest
+
+from openeis.projects.storage.ingest import (ingest_files,
+                                             ingest_files_parallel,
+                                             IngestError)
+
+
+DATAMAP = {
+    'version': 1,
+    'files': {
+        name: {
+            'signature': {'headers': ['Date', 'OAT', 'Power']},
+            'timestamp': {'columns': ['Date'], 'format': '%m/%d/%Y %H:%M'},
+        } for name in ['0', '1']
+    },
+    'sensors': {
+        'Site/OAT': {'type': 'OutdoorAirTemperature', 'unit': 'fahrenheit',
+                     'file': '0', 'column': 'OAT'},
+        'Site/Power': {'type': 'WholeBuildingPower', 'unit': 'kilowatt',
+                       'file': '1', 'column': 'Power'},
+    },
+}
+
+
+def write_data(path, rows, seed):
+    rand = random.Random(seed)
+    lines = ['Date,OAT,Power']
+    for i in range(rows):
+        day, hour = divmod(i, 24)
+        lines.append('{}/{}/2014 {}:00,{},{}'.format(
+            day // 28 % 12 + 1, day % 28 + 1, hour,
+            # Include some values which fail to parse.
+            'bad' if rand.random() < 0.01 else round(rand.uniform(0, 100), 2),
+            round(rand.uniform(100, 500), 2)))
+    path.write_text('\n'.join(lines) + '\n')
+
+
+def summarize(ingested):
+    result = []
+    for file in ingested:
+        rows = [(row.line_num, row.position,
+                 [str(col) if isinstance(col, IngestError) else col
+                  for col in row.columns]) for row in file.rows]
+        result.append((file.name, file.size, file.sensors, file.types, rows))
+    return result
+
+
+@pytest.mark.parametrize('split_size', [1000, 10**6])
+def test_ingest_files_parallel(tmp_path, split_size):
+    '''Test that parallel parsing matches serial parsing.'''
+    paths = [tmp_path / '0.csv', tmp_path / '1.csv']
+    for i, path in enumerate(paths):
+        write_data(path, 2000, i)
+
+    def files():
+        return {name: {'file': open(str(path), 'rb'), 'time_zone': None,
+                       'time_offset': 0} for name, path in zip('01', paths)}
+
+    expected = summarize(ingest_files(DATAMAP, files()))
+    assert any(isinstance(col, str) for *_, rows in expected
+               for row in rows for col in row[2])
+    result = summarize(ingest_files_parallel(
+            DATAMAP, files(), processes=2, split_size=split_size))
+    assert result == expected
+
+
+def test_ingest_files_parallel_skip(tmp_path):
+    '''Test that files may be skipped or partially read.'''
+    paths = [tmp_path / '0.csv', tmp_path / '1.csv']
+    for i, path in enumerate(paths):
+        write_data(path, 500, i)
+    files = {name: {'file': open(str(path), 'rb'), 'time_zone': None,
+                    'time_offset': 0} for name, path in zip('01', paths)}
+    expected = summarize(ingest_files(DATAMAP, files))[1]
+    ingested = ingest_files_parallel(DATAMAP, files, processes=2,
+                                     split_size=1000)
+    next(ingested[0].rows)
+    assert summarize(ingested[1:])[0] == expected
+
+
+def test_ingest_files_parallel_memory_file():
+    '''Test that files without a path are parsed serially.'''
+    files = {}
+    for name in '01':
+        data = io.BytesIO(b'Date,OAT,Power\n1/1/2014 0:00,1.5,2.5\n')
+        data.size = len(data.getvalue())
+        files[name] = {'file': data, 'time_zone': None, 'time_offset': 0}
+    ingested = ingest_files_parallel(DATAMAP, files, processes=2)
+    assert [[row.columns[1:] for row in file.rows]
+            for file in ingested] == [[[1.5]], [[2.5]]]
@@ -134,6 +134,7 @@ class TestRestApi(OpenEISTestBase):
         response = client.get('/api/files/{}/timestamps'.format(file_id), {'columns': '0,1'})
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual('9/29/2009 15:00', response.data[0][0], 'Invalid data returned')
+        self.assertEqual('%m/%d/%Y %H:%M', response['X-Timestamp-Format'])
 
     def test_eis159_store_timestamp_with_file(self):
         response = self.upload_temp_file_data(1)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+#
+# Copyright (c) 2014, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+#
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization
+# that has cooperated in the development of these materials, makes
+# any warranty, express or implied, or assumes any legal liability
+# or responsibility for the accuracy, completeness, or usefulness or
+# any information, apparatus, product, software, or process disclosed,
+# or represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does
+# not necessarily constitute or imply its endorsement, recommendation,
+# or favoring by the United States Government or any agency thereof,
+# or Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#
+
+import pickle
+from datetime import datetime
+
+import dateutil.parser
+import pytest
+import pytz
+
+from openeis.projects.storage.ingest import DateTimeColumn, ParseError
+from openeis.projects.storage.timestamps import (
+    TIMESTAMP_FORMATS, TimestampParser, infer_timestamp_format)
+
+
+@pytest.mark.parametrize('value,format', [
+    ('9/29/2009 15:00', '%m/%d/%Y %H:%M'),
+    ('2014-01-02T03:04:05', '%Y-%m-%dT%H:%M:%S'),
+    ('2014-01-02T03:04:05+0100', '%Y-%m-%dT%H:%M:%S%z'),
+    ('2014-01-02 03:04:05.25', '%Y-%m-%d %H:%M:%S.%f'),
+    ('01-Feb-2014 1:02 PM', '%d-%b-%Y %I:%M %p'),
+    ('2014/01/02', '%Y/%m/%d'),
+    ('20140102', '%Y%m%d'),
+])
+def test_infer_timestamp_format(value, format):
+    assert infer_timestamp_format([value]) == format
+
+
+def test_infer_timestamp_format_ambiguous():
+    # Day-first and two-digit year formats are never inferred.
+    assert infer_timestamp_format(['13/01/2014 10:00']) is None
+    assert infer_timestamp_format(['1/2/14 10:00']) is None
+    assert infer_timestamp_format(['garbage', '']) is None
+    # Unparsable values are ignored.
+    assert infer_timestamp_format(['1/2/2014', 'n/a']) == '%m/%d/%Y'
+
+
+@pytest.mark.parametrize('format', TIMESTAMP_FORMATS + ['%d.%m.%Y %H%M'])
+def test_timestamp_parser_matches_strptime(format):
+    parse = TimestampParser(format)
+    for dt in [datetime(2014, 1, 2, 0, 4, 5, 250000),
+               datetime(2009, 12, 29, 12, 30),
+               datetime(2010, 7, 4, 23, 59, 59, 1)]:
+        if '%z' in format:
+            dt = dt.replace(tzinfo=pytz.utc)
+        value = dt.strftime(format)
+        assert parse(value) == datetime.strptime(value, format)
+    with pytest.raises(ValueError):
+        parse('2014-01-02 03:04:05 trailing')
+
+
+def test_timestamp_parser_variants():
+    parse = TimestampParser('%m/%d/%Y %I:%M:%S %p')
+    assert parse('1/2/2014  12:00:01 am') == datetime(2014, 1, 2, 0, 0, 1)
+    assert parse('01/02/2014 12:00:01 PM') == datetime(2014, 1, 2, 12, 0, 1)
+    assert parse('1/ 2/2014 1:02:03 pm') == datetime(2014, 1, 2, 13, 2, 3)
+    with pytest.raises(ValueError):
+        parse('1/32/2014 1:00:00 pm')
+    parse = TimestampParser('%Y-%m-%d %H:%M:%S.%f')
+    assert parse('2014-01-02 03:04:05.5') == datetime(2014, 1, 2, 3, 4, 5, 500000)
+    assert pickle.loads(pickle.dumps(parse))('2014-01-02 03:04:05.5') == \
+        datetime(2014, 1, 2, 3, 4, 5, 500000)
+
+
+def test_datetime_column_inference():
+    tz = pytz.timezone('America/Los_Angeles')
+    column = DateTimeColumn(0, tzinfo=tz)
+    values = ['n/a', '9/29/2009 15:00', '9/29/2009 16:00', 'Sep 30 2009 1am']
+    results = [column([value]) for value in values]
+    assert column.inferred_format == '%m/%d/%Y %H:%M'
+    assert isinstance(results[0], ParseError)
+    assert results[1:] == [tz.localize(dateutil.parser.parse(value))
+                           .astimezone(pytz.utc) for value in values[1:]]
+
+    column = DateTimeColumn(0, formats=['%Y-%m-%d %H:%M'])
+    assert column(['9/29/2009 15:00']) == datetime(2009, 9, 29, 15, tzinfo=pytz.utc)
+    assert column.inferred_format is None
+
+    column = DateTimeColumn(0, infer_format=False)
+    column(['9/29/2009 15:00'])
+    assert column.inferred_format is None
@@ -57,12 +57,12 @@ from contextlib import closing
 from pytz import timezone
 from pprint import pprint
 import datetime
+import functools
 import itertools
 import json
 import logging
 import posixpath
 import threading
-import traceback
 
 import dateutil
 
@@ -72,9 +72,11 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.db.models import Q
-from django.http import HttpResponseRedirect, HttpResponse, Http404
+from django.http import (HttpResponseRedirect, HttpResponse, Http404,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
-from django.utils.timezone import utc, get_current_timezone
+from django.utils.timezone import (utc, get_current_timezone,
+                                   get_default_timezone, is_naive, make_aware)
 
 from rest_framework import filters, mixins, permissions, status, viewsets
 from rest_framework.decorators import action, link
@@ -82,16 +84,21 @@ from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework import exceptions as rest_exceptions
 from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
 
-from . import models, renderers, serializers, version
+from . import jobqueue, models, renderers, serializers, version
 from .models import INFO, WARNING, ERROR, CRITICAL
 from .protectedmedia import protected_media, ProtectedMediaResponse
 from .conf import settings as proj_settings
+from .storage.bulkload import BulkLoader
+from .storage.chunks import ChunkWriter
+from .storage.rollups import RollupBuilder
 from .storage.clone import CloneProject
-from .storage.ingest import ingest_files, iter_rows, IngestError
+from .storage.ingest import (ingest_files, ingest_files_parallel, iter_rows,
+                             IngestError)
+from .storage.timestamps import TimestampParser, infer_timestamp_format
 from .storage.sensormap import Schema as Schema
-from .storage.db_input import DatabaseInput
-from .storage.db_output import DatabaseOutput, DatabaseOutputZip
+from openeis import applications
 from openeis.applications import get_algorithm_class
 from openeis.applications import _applicationDict as apps
 from openeis.filters.apply_filter import apply_filter_config
@@ -249,7 +256,9 @@ class FileViewSet(mixins.ListModelMixin,
         separating each, and used as the timestamp to be parsed.  If no
         column is given, the first column is used. If datefmt is given,
         it is used to parse the time instead of performing automatic
-        parsing.
+        parsing. Otherwise, the format of the timestamps is inferred,
+        if possible, and returned in the X-Timestamp-Format header so
+        that it may be used as the timestamp format in the data map.
         '''
         columns = request.QUERY_PARAMS.get('columns', '0').split(',')
         fmt = request.QUERY_PARAMS.get('datefmt')
@@ -278,11 +287,16 @@ class FileViewSet(mixins.ListModelMixin,
                     {'columns': ['invalid column: {!r}'.format(columns[i])]},
                     status=status.HTTP_400_BAD_REQUEST)
             columns[i] = column
-        parse = ((lambda s: datetime.datetime.strptime(s, fmt))
-                 if fmt else dateutil.parser.parse)
+        stamps = [' '.join(row[i] for i in columns) for row in rows]
+        response_headers = {}
+        if not fmt:
+            # The inferred format parses every timestamp dateutil can.
+            fmt = infer_timestamp_format(stamps)
+            if fmt:
+                response_headers['X-Timestamp-Format'] = fmt
+        parse = TimestampParser(fmt) if fmt else dateutil.parser.parse
         times = []
-        for row in rows:
-            ts = ' '.join(row[i] for i in columns)
+        for ts in stamps:
             try:
                 dt = parse(ts)
             except (ValueError, TypeError):
@@ -294,7 +308,7 @@ class FileViewSet(mixins.ListModelMixin,
                     dt = tzinfo.localize(dt)
                 parsed = dt.isoformat()
             times.append([ts, parsed])
-        return Response(times)
+        return Response(times, headers=response_headers)
 
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
@@ -501,8 +515,13 @@ class DataMapViewSet(viewsets.ModelViewSet):
 
 _ingest_processes = {}
 
-def iter_ingest(ingest):
-    '''Ingest into the common schema tables from the DataFiles.'''
+def iter_ingest(ingest, raw=False):
+    '''Ingest into the common schema tables from the DataFiles.
+
+    Files are parsed in a pool of INGEST_PROCESSES processes unless
+    the setting is 1. If raw is True, readings are generated as
+    (data class, sensor, time, value) tuples rather than model objects.
+    '''
     datamap = ingest.map.map
     files = {f.name: {'file': f.file.file.file,
                       'time_offset':f.file.time_offset,
@@ -510,7 +529,14 @@ def iter_ingest(ingest):
              for f in ingest.files.all()}
     ingest_file = None
     try:
-        ingested = list(ingest_files(datamap, files))
+        block_size = proj_settings.INGEST_BLOCK_SIZE
+        if proj_settings.INGEST_PROCESSES == 1:
+            ingested = list(ingest_files(datamap, files, block_size))
+        else:
+            ingested = ingest_files_parallel(
+                    datamap, files, processes=proj_settings.INGEST_PROCESSES,
+                    split_size=proj_settings.INGEST_SPLIT_SIZE,
+                    block_size=block_size)
         total_bytes = sum(file.size for file in ingested)
         processed_bytes = 0.0
         for file in ingested:
@@ -543,6 +569,8 @@ def iter_ingest(ingest):
                                     row=row.line_num, column=column.column_num,
                                     level=models.ERROR,
                                     message=str(column))
+                        elif raw:
+                            obj = cls, sensor, time, column
                         else:
                             obj = cls(ingest=ingest, sensor=sensor, time=time,
                                       value=column)
@@ -559,49 +587,84 @@ def iter_ingest(ingest):
         raise
 
 
-def _update_ingest_progress(ingest_id, file_id, pos, size, processed, total):
+def _update_ingest_progress(ingest_id, file_id, pos, size, processed, total,
+                            rows=0, started=None):
+    elapsed = ((datetime.datetime.utcnow() - started).total_seconds()
+               if started else 0)
     _ingest_processes[ingest_id] = {
         'id': ingest_id,
         'status': 'processing',
         'percent': processed * 100.0 / total if total else 0.0,
         'current_file_percent': pos * 100.0 / size if size else 0.0,
         'current_file': file_id,
+        'rows': rows,
+        'rows_per_second': rows / elapsed if elapsed else 0.0,
     }
 
 
 def perform_ingestion(ingest, batch_size=999, report_interval=1000):
-    '''Iterate over ingested objects, saving in batches.
-
-    Once batch_size objects are cached, they are sorted according to
-    class type and inserted using bulk_create. Progress information
-    is updated every report_interval objects.
+    '''Iterate over ingested readings, saving them in bulk.
+
+    Readings are written by a BulkLoader in batches of
+    INGEST_BATCH_SIZE, using the fastest path of the database unless
+    INGEST_LOADER is 'orm'. If the SENSOR_DATA_STORAGE setting is
+    'chunks', numeric and boolean readings are instead packed into
+    SensorDataChunk objects. Hourly and daily SensorRollup objects are
+    built from numeric readings unless SENSOR_DATA_ROLLUPS is false.
+    Parse errors are logged in batches of batch_size. Progress
+    information, including the readings ingested per second, is updated
+    every report_interval bytes.
     '''
     beforeIteration = True
+    writer = None
+    rollups = None
+    started = datetime.datetime.utcnow()
+    rows = 0
     try:
         last_file_id, next_pos = None, 0
-        keyfunc = lambda obj: obj.__class__.__name__
-        it = iter_ingest(ingest)
+        loader = BulkLoader(ingest, batch_size=proj_settings.INGEST_BATCH_SIZE,
+                            method=proj_settings.INGEST_LOADER)
+        if proj_settings.SENSOR_DATA_STORAGE == 'chunks':
+            writer = ChunkWriter(models.SensorDataChunk,
+                                 span=proj_settings.SENSOR_DATA_CHUNK_SPAN)
+        if proj_settings.SENSOR_DATA_ROLLUPS:
+            rollups = RollupBuilder(models.SensorRollup, ingest)
+        logs = []
+        it = iter_ingest(ingest, raw=True)
         beforeIteration = False
-        while True:
-            batch = []
-            for objects, *args in it:
-                batch.extend(objects)
-                file_id, pos, *_ = args
-                if file_id != last_file_id:
-                    _update_ingest_progress(ingest.id, *args)
-                    last_file_id, next_pos = file_id, report_interval
-                elif pos >= next_pos:
-                    _update_ingest_progress(ingest.id, *args)
-                    next_pos = pos + report_interval
-                if len(batch) >= batch_size:
-                    break
-            if not batch:
-                break
-            batch.sort(key=keyfunc)
-            for class_name, group in itertools.groupby(batch, keyfunc):
-                objects = list(group)
-                cls = objects[0].__class__
-                cls.objects.bulk_create(objects)
+        for objects, *args in it:
+            for obj in objects:
+                if obj.__class__ is not tuple:
+                    logs.append(obj)
+                    if len(logs) >= batch_size:
+                        models.SensorIngestLog.objects.bulk_create(logs)
+                        logs = []
+                    continue
+                if writer is None or obj[0] is models.StringSensorData:
+                    loader.add(*obj)
+                else:
+                    writer.add(obj[1], ingest, obj[2], obj[3])
+                if rollups is not None:
+                    rollups.add(obj[1], obj[2], obj[3])
+                rows += 1
+            file_id, pos, *_ = args
+            if file_id != last_file_id:
+                _update_ingest_progress(ingest.id, *args, rows=rows,
+                                        started=started)
+                last_file_id, next_pos = file_id, report_interval
+            elif pos >= next_pos:
+                _update_ingest_progress(ingest.id, *args, rows=rows,
+                                        started=started)
+                next_pos = pos + report_interval
+        models.SensorIngestLog.objects.bulk_create(logs)
+        loader.close()
+        if writer is not None:
+            writer.close()
+        if rollups is not None:
+            rollups.close()
+        elapsed = (datetime.datetime.utcnow() - started).total_seconds()
+        ingest.rows = rows
+        ingest.rows_per_second = rows / elapsed if elapsed else 0.0
     except Exception as e:
         if beforeIteration:
             models.SensorIngestLog(level=CRITICAL, dataset=ingest, message='an unhandled exception occurred during sensor '
@@ -615,6 +678,14 @@ def perform_ingestion(ingest, batch_size=999, report_interval=1000):
         ingest.save()
         _ingest_processes.pop(ingest.id, None)
 
+def _reading(obj):
+    '''Return the (time, value) of sensor data as it was saved.'''
+    time = obj._meta.get_field('time').to_python(obj.time)
+    if is_naive(time):
+        time = make_aware(time, get_default_timezone())
+    return time, obj._meta.get_field('value').to_python(obj.value)
+
+
 class DataSetAppendViewSet(viewsets.ViewSet):
     def append(self, request):
         print(request.DATA)
@@ -630,6 +701,9 @@ class DataSetAppendViewSet(viewsets.ViewSet):
             sensors.append((sensor, sensor.data_class))
         
         
+        # Rollups are only updated for sensors whose rollups are complete.
+        rollups = RollupBuilder(models.SensorRollup, ds, update_only=True)
+
         # NOTE: sensors are tuples with the sensor object at sensor[0] and the datatype
         #       as sensor[1]
         for sensor_tuple in sensors:
@@ -644,6 +718,9 @@ class DataSetAppendViewSet(viewsets.ViewSet):
                         #obj = models.FloatSensorData(ingest=ds, sensor=sensor, 
                         #                             time=realdata[0], value=realdata[1])                        
                         obj.save()
+                        rollups.add(sensor, *_reading(obj))
+        rollups.close()
+        ds.readings_changed()
 
         return Response(request.DATA)
 
@@ -676,6 +753,9 @@ class DataSetViewSet(viewsets.ModelViewSet):
                 'current_file_percent': 0.0,
                 'current_file': None
             }
+            if ingest.rows is not None:
+                process['rows'] = ingest.rows
+                process['rows_per_second'] = ingest.rows_per_second
         return Response(process)
 
     @link()
@@ -964,25 +1044,38 @@ class DataSetPreviewViewSet(viewsets.GenericViewSet):
 class ApplicationViewSet(viewsets.ViewSet):
     permission_classes = (permissions.IsAuthenticated,)
 
+    @staticmethod
+    def _describe(app):
+        data = serializers.ApplicationSerializer(app).data
+        if app.get_self_descriptor():
+            data['name'] = app.get_self_descriptor().name
+            data['description'] = app.get_self_descriptor().description
+            data['note'] = app.get_self_descriptor().note
+        return data
+
     def list(self, request, *args, **kw):
         '''Return list of applications with inputs and parameters.'''
+        # Descriptions are cached in a manifest so that listing does not
+        # import every application.
+        descriptions = apps.describe(
+            self._describe, cache=proj_settings.APPLICATION_MANIFEST,
+            depends=[__file__, serializers.__file__, applications.__file__],
+            version=version.product_version())
         app_list = []
-        for app_id, app in apps.items():
-            data = serializers.ApplicationSerializer(app).data
-            app_list.append(data)
+        for app_id, description in descriptions.items():
+            data = dict(description)
             data['id'] = app_id
-            if app.get_self_descriptor():
-                data['name'] = app.get_self_descriptor().name
-                data['description'] = app.get_self_descriptor().description
-                data['note'] = app.get_self_descriptor().note
+            app_list.append(data)
         return Response(app_list)
 
 
 class FilterViewSet(viewsets.ViewSet):
     permission_classes = (permissions.IsAuthenticated,)
 
-    def list(self, request, *args, **kargs):
-        '''Return list of filters with parameters.'''
+    @staticmethod
+    @functools.lru_cache()
+    def _descriptors():
+        '''Return the filter descriptions, built once per process.'''
         filter_list = []
         for filter_id, filter_ in column_modifiers.items():
             # Filter has __iter__ method, many has to be set as False otherwise it will crash
@@ -994,7 +1087,11 @@ class FilterViewSet(viewsets.ViewSet):
                 data['name'] = filter_.get_self_descriptor().name
                 data['description'] = filter_.get_self_descriptor().description
                 data['note'] = filter_.get_self_descriptor().note
-        return Response(filter_list)
+        return filter_list
+
+    def list(self, request, *args, **kargs):
+        '''Return list of filters with parameters.'''
+        return Response(self._descriptors())
 
 
 class VersionViewSet(viewsets.ViewSet):
@@ -1003,72 +1100,100 @@ class VersionViewSet(viewsets.ViewSet):
         return Response(version.get_version_info())
 
 
-_analysis_processes = set()
+def _iter_output_rows(data_model, fields, after=None, limit=None):
+    '''Yield the ID and field values of output rows following after.
 
-def _perform_analysis(analysis):
-    '''Create thread for individual runs of an applicaton.'''
-    try:
-        analysis.started = datetime.datetime.utcnow().replace(tzinfo=utc)
-        analysis.save()
-        try:
-            db_input = DatabaseInput(analysis.dataset.map.id,
-                    analysis.configuration["inputs"], analysis.dataset.id)
-            klass = get_algorithm_class(analysis.application)
-            output_format = klass.output_format(db_input)
-            kwargs = analysis.configuration['parameters']
-            #if analysis.debug:
-            db_output = DatabaseOutputZip(analysis, output_format, analysis.configuration)
-            #else:
-            #    db_output = DatabaseOutput(analysis, output_format)
+    Rows are fetched in ID order in batches, each selected by the ID
+    of the last row of the previous batch, so each query seeks the
+    (source, id) index rather than skipping over earlier rows.
+    '''
+    queryset = data_model.objects.order_by('id')
+    batch_size = proj_settings.OUTPUT_BATCH_SIZE
+    while limit is None or limit > 0:
+        size = batch_size if limit is None else min(batch_size, limit)
+        batch = queryset if after is None else queryset.filter(id__gt=after)
+        rows = list(batch.values_list('id', *fields)[:size])
+        for row in rows:
+            yield row
+        if len(rows) < size:
+            break
+        after = rows[-1][0]
+        if limit is not None:
+            limit -= len(rows)
 
-            try:
-                app = klass(db_input, db_output, **kwargs)
-                app.run_application()
-                analysis.reports = [serializers.ReportSerializer(report).data
-                                    for report in klass.reports(output_format)]
-            except Exception:
-                db_output.appenFileToZip("stackTrace.txt", traceback.format_exc())
-        finally:
-            analysis.ended = datetime.datetime.utcnow().replace(tzinfo=utc)
-            analysis.save()
-    except Exception:
-        # TODO: log errors
-        print(traceback.format_exc())
-    finally:
-        _analysis_processes.discard(analysis.id)
+
+def _stream_json(rows):
+    '''Generate a JSON array of rows.'''
+    encoder = JSONEncoder()
+    yield '['
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + encoder.encode(row)
+    yield ']'
 
 
 def _get_output_data(request, analysis):
+    '''Return the output of an analysis.
+
+    If no output is given, the names of the outputs are returned with
+    their row counts. Otherwise, rows of the named output are returned.
+
+    output -- name of the output table.
+    after -- return rows following the row with this ID; the ID of the
+             last row returned is given in the X-Next-After header.
+    start -- number of rows to skip; after is faster for later pages.
+    count -- maximum number of rows to return.
+    stream -- if true, stream the JSON rows instead of rendering them at
+              once. Rows are always streamed when format is csv.
+    '''
     output_name = request.QUERY_PARAMS.get('output', False)
+    try:
+        after = int(request.QUERY_PARAMS['after'])
+    except (KeyError, ValueError):
+        after = None
     start = max(int(request.QUERY_PARAMS.get('start', 0)), 0)
     try:
-        end = start + int(request.QUERY_PARAMS['count'])
+        count = max(int(request.QUERY_PARAMS['count']), 0)
     except (KeyError, ValueError):
-        end = None
+        count = None
 
     if not output_name:
         outputs = {}
 
         for output in models.AppOutput.objects.filter(analysis=analysis):
-            data_model = output.get_data_model()
             outputs[output.name] = {
-                'rows': data_model.objects.count()
+                'rows': output.get_row_count()
             }
 
         return Response(outputs)
 
     output = models.AppOutput.objects.get(analysis=analysis, name=output_name)
     data_model = output.get_data_model()
-
-    start = max(start, 0)
-    rows = data_model.objects.all()[start:end]
-
-    # TODO: return JSON or CSV file as StreamingHTTPResponse instead
-    data_response = []
-    for row in rows:
-        data_response.append({field: getattr(row, field) for field in output.fields})
-
-    return Response(data_response)
+    fields = list(output.fields)
+
+    if start and after is None:
+        # Find the ID preceding the first row by scanning only the index.
+        ids = data_model.objects.order_by('id').values_list('id', flat=True)
+        after = next(iter(ids[start - 1:start]), None)
+        if after is None:
+            count = 0
+
+    rows = _iter_output_rows(data_model, fields, after, count)
+    if request.accepted_renderer.format == 'csv':
+        response = renderers.StreamingCSVResponse(itertools.chain(
+            [fields], (row[1:] for row in rows)))
+        response['Content-Type'] = 'text/csv; name="{}.csv"'.format(output_name)
+        response['Content-Disposition'] = (
+            'attachment; filename="{}.csv"'.format(output_name))
+        return response
+    if request.QUERY_PARAMS.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return StreamingHttpResponse(
+            _stream_json(dict(zip(fields, row[1:])) for row in rows),
+            content_type='application/json')
+    rows = list(rows)
+    response = Response([dict(zip(fields, row[1:])) for row in rows])
+    if rows:
+        response['X-Next-After'] = str(rows[-1][0])
+    return response
 
 
 class AnalysisViewSet(viewsets.ModelViewSet):
@@ -1082,10 +1207,15 @@ class AnalysisViewSet(viewsets.ModelViewSet):
             return serializers.AnalysisUpdateSerializer
         return serializers.AnalysisSerializer
 
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context['is_alive'] = lambda obj_id: obj_id in _analysis_processes
-        return context
+    def _get_priority(self):
+        '''Return the requested job priority; only staff may raise it.'''
+        try:
+            priority = int(self.request.DATA.get('priority', 0))
+        except (TypeError, ValueError):
+            raise rest_exceptions.ParseError('priority must be an integer')
+        if not self.request.user.is_staff:
+            priority = min(priority, 0)
+        return max(-100, min(priority, 100))
 
     def pre_save(self, obj):
         '''Check dataset ownership and application existence.'''
@@ -1095,22 +1225,22 @@ class AnalysisViewSet(viewsets.ModelViewSet):
                         "Invalid project pk '{}' - "
                         'permission denied.'.format(obj.project.pk))
             obj.project = obj.dataset.project
+            self._priority = self._get_priority()
         if not get_algorithm_class(obj.application):
             raise rest_exceptions.ParseError(
                 "Application '{}' not found.".format(obj.application))
         # TODO: validate dataset and application compatibility
 
     def post_save(self, obj, created):
-        '''Start application run after Analysis object has been saved.'''
+        '''Queue application run after Analysis object has been saved.'''
         if created:
-            _analysis_processes.add(obj.id)
-            threading.Thread(
-                    target=_perform_analysis, args=(obj,), daemon=True).start()
+            jobqueue.enqueue(obj, priority=self._priority)
 
     def get_queryset(self):
         '''Only show user analyses associated with projects they own,
         optionally filtered by project ID.'''
-        queryset = models.Analysis.objects.filter(project__owner=self.request.user)
+        queryset = models.Analysis.objects.filter(
+            project__owner=self.request.user).select_related('job')
         try:
             project = int(self.request.QUERY_PARAMS['project'])
         except KeyError:
@@ -1119,10 +1249,21 @@ class AnalysisViewSet(viewsets.ModelViewSet):
             return []
         return queryset.filter(project=project)
 
-    @link()
+    @link(renderer_classes=(api_settings.DEFAULT_RENDERER_CLASSES +
+                            [renderers.CSVRenderer]))
     def data(self, request, *args, **kw):
         return _get_output_data(request, self.get_object())
 
+    @action(methods=['POST'])
+    def cancel(self, request, *args, **kwargs):
+        '''Cancel the analysis if it is queued or running.'''
+        analysis = self.get_object()
+        if not jobqueue.cancel(analysis):
+            return Response({'detail': 'Analysis is not queued or running.'},
+                            status=status.HTTP_409_CONFLICT)
+        analysis = models.Analysis.objects.get(pk=analysis.pk)
+        return Response(self.get_serializer(analysis).data)
+
     @link()
     def download(self, request, *args, **kwargs):
         '''Retrieve the debug zip file.'''
@@ -1171,6 +1312,7 @@ class SharedAnalysisViewSet(mixins.CreateModelMixin,
                     "Invalid analysis pk '{}' - "
                     'permission denied.'.format(obj.analysis.pk))
 
-    @link()
+    @link(renderer_classes=(api_settings.DEFAULT_RENDERER_CLASSES +
+                            [renderers.CSVRenderer]))
     def data(self, request, *args, **kw):
         return _get_output_data(request, self.get_object().analysis)
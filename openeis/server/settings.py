@@ -121,6 +121,9 @@ MIDDLEWARE_CLASSES = (
 
 ROOT_URLCONF = 'openeis.server.urls'
 
+# Also used by runserver, so that it starts the embedded analysis pool.
+WSGI_APPLICATION = 'openeis.server.wsgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/1.6/ref/settings/#databases
@@ -57,3 +57,6 @@ import os
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", 'openeis.server._settings')
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
+
+from openeis.projects import jobqueue
+jobqueue.start_server_pool()